@@ -0,0 +1,153 @@
+from datetime import datetime
+
+
+class AlertEpisodes:
+    """
+    Coalesces per-frame alert signals into episodes.
+
+    Detection code calls observe() for every alert condition seen in an
+    analyzed frame and end_frame() once the frame is done. The first frame
+    with a condition opens an episode of that type; it closes after
+    ``gap_frames`` consecutive analyzed frames without the condition. Each
+    episode is passed to ``emit`` twice: when it opens (``status`` "open",
+    ``end_time`` None) and once more when it closes, with its end time, peak
+    confidence and frame count. Both messages carry the same ``episode_id``.
+    """
+
+    def __init__(self, gap_frames=5, emit=None):
+        """
+        Args:
+            gap_frames: Analyzed frames without a condition that close its episode
+            emit: Callable receiving a copy of each opened and closed episode
+        """
+        self.gap_frames = gap_frames
+        self.emit = emit
+        self.next_id = 1
+        self.reset()
+
+    def reset(self):
+        """Forget all episodes (without emitting); episode ids keep increasing"""
+        self.episodes = []      # every episode of the session, in opening order
+        self.open = {}          # alert type -> open episode
+        self.missed = {}        # alert type -> analyzed frames since last seen
+        self.last_seen = {}     # alert type -> ISO time of the last frame with it
+        self.frame_signals = {}
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def observe(self, alert_type, confidence=None, details=""):
+        """
+        Record an alert condition in the current frame
+
+        Args:
+            alert_type: Alert type, e.g. "Mobile Phone"
+            confidence: Detection confidence, None for conditions without one
+            details: Human readable details; those of the most confident
+                observation are kept
+        """
+        # Episodes are sent as JSON/msgpack and stored as BSON, which reject numpy scalars
+        if confidence is not None:
+            confidence = float(confidence)
+        current = self.frame_signals.get(alert_type)
+        if current is None or confidence is None or current[0] is None or confidence >= current[0]:
+            self.frame_signals[alert_type] = (confidence, details)
+
+    def end_frame(self):
+        """Open, extend or close episodes with the signals of the analyzed frame"""
+        now = datetime.now().isoformat()
+
+        for alert_type, (confidence, details) in self.frame_signals.items():
+            self.missed[alert_type] = 0
+            self.last_seen[alert_type] = now
+            episode = self.open.get(alert_type)
+
+            if episode is None:
+                episode = {
+                    'episode_id': self.next_id,
+                    'type': alert_type,
+                    'details': details,
+                    'timestamp': now,
+                    'start_time': now,
+                    'end_time': None,
+                    'peak_confidence': confidence,
+                    'frame_count': 1,
+                    'status': 'open'
+                }
+                self.next_id += 1
+                self.open[alert_type] = episode
+                self.episodes.append(episode)
+                self.send(episode)
+                continue
+
+            episode['frame_count'] += 1
+            peak = episode['peak_confidence']
+            if confidence is None or peak is None or confidence >= peak:
+                episode['details'] = details
+                if confidence is not None:
+                    episode['peak_confidence'] = confidence
+
+        for alert_type in list(self.open):
+            if alert_type in self.frame_signals:
+                continue
+            self.missed[alert_type] = self.missed.get(alert_type, 0) + 1
+            if self.missed[alert_type] >= self.gap_frames:
+                self.close(alert_type)
+
+        self.frame_signals = {}
+
+    def close(self, alert_type):
+        # A session ending can close episodes while its last frame is analyzed
+        episode = self.open.pop(alert_type, None)
+        if episode is None:
+            return
+        episode['end_time'] = self.last_seen.pop(alert_type, episode['start_time'])
+        episode['status'] = 'closed'
+        self.missed.pop(alert_type, None)
+        self.send(episode)
+
+    def close_all(self):
+        """Close every open episode, e.g. when the session ends"""
+        for alert_type in list(self.open):
+            self.close(alert_type)
+
+    def send(self, episode):
+        if self.emit is not None:
+            self.emit(dict(episode))
+
+    def snapshot(self):
+        """Copies of all episodes"""
+        return [dict(episode) for episode in self.episodes]
+
+    def summary(self):
+        """Episode counts, in total and per alert type"""
+        alert_types = {}
+        for episode in self.episodes:
+            alert_types[episode['type']] = alert_types.get(episode['type'], 0) + 1
+        return {'total_alerts': len(self.episodes), 'alert_types': alert_types}
+
+
+def merge_alert_episodes(alerts, updates, limit=None):
+    """
+    Apply alert messages to a list of episodes
+
+    Args:
+        alerts: Known episodes, oldest first
+        updates: New alert messages; one with the episode_id of a known
+            episode replaces it, any other is appended
+        limit: Keep only the newest ``limit`` episodes
+
+    Returns:
+        New list of episodes
+    """
+    merged = list(alerts)
+    positions = {alert['episode_id']: i for i, alert in enumerate(merged) if 'episode_id' in alert}
+    for alert in updates:
+        position = positions.get(alert.get('episode_id'))
+        if position is None:
+            if 'episode_id' in alert:
+                positions[alert['episode_id']] = len(merged)
+            merged.append(alert)
+        else:
+            merged[position] = alert
+    return merged[-limit:] if limit else merged
@@ -0,0 +1,146 @@
+import os
+import sys
+import asyncio
+import argparse
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from database import collection, alert_buckets_collection
+from report_stats import counter_key
+
+
+def alert_time(alert: dict) -> datetime:
+    """Start time of an alert episode (older alerts only have a timestamp)"""
+    value = alert.get("start_time") or alert.get("timestamp")
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.min
+
+
+class AlertStore:
+    """
+    Alerts of stored reports, kept in the alert_buckets collection.
+
+    A report's alerts are stored once, split into buckets per session and time
+    window (``bucket_seconds`` wide, at most ``max_bucket_alerts`` alerts each).
+    Every bucket carries its window start, per-type counts and the alerts
+    themselves, and is indexed by report, session, alert type and time. The
+    report document itself only keeps the counts (``alert_summary``).
+    """
+
+    def __init__(self, bucket_seconds: int = 600, max_bucket_alerts: int = 500):
+        self.bucket_seconds = bucket_seconds
+        self.max_bucket_alerts = max_bucket_alerts
+
+    def build_buckets(self, report_id, session_id: str, alerts: list) -> list:
+        """Bucket documents of a report's alerts, oldest first"""
+        windows = {}
+        for alert in sorted(alerts, key=alert_time):
+            started = alert_time(alert)
+            window = started if started == datetime.min else datetime.fromtimestamp(
+                int(started.timestamp()) // self.bucket_seconds * self.bucket_seconds)
+            windows.setdefault(window, []).append(alert)
+
+        buckets = []
+        for window, window_alerts in windows.items():
+            for first in range(0, len(window_alerts), self.max_bucket_alerts):
+                chunk = window_alerts[first:first + self.max_bucket_alerts]
+                types = {}
+                for alert in chunk:
+                    key = counter_key(alert.get("type"))
+                    types[key] = types.get(key, 0) + 1
+                buckets.append({
+                    "report_id": report_id,
+                    "session_id": session_id,
+                    "bucket_start": window,
+                    "bucket_seconds": self.bucket_seconds,
+                    "count": len(chunk),
+                    "types": types,
+                    "alerts": chunk
+                })
+        return buckets
+
+    async def save(self, report_id, session_id: str, alerts: list) -> int:
+        """Store a report's alerts; returns the number of buckets written"""
+        buckets = self.build_buckets(report_id, session_id, alerts)
+        if buckets:
+            await alert_buckets_collection.insert_many(buckets)
+        return len(buckets)
+
+    async def load(self, report_id) -> list:
+        """All alerts of a report, oldest first"""
+        alerts = []
+        cursor = alert_buckets_collection.find(
+            {"report_id": report_id}, {"alerts": 1}
+        ).sort([("bucket_start", 1), ("_id", 1)])
+        async for bucket in cursor:
+            alerts.extend(bucket.get("alerts", []))
+        return alerts
+
+    async def delete(self, report_id) -> int:
+        result = await alert_buckets_collection.delete_many({"report_id": report_id})
+        return result.deleted_count
+
+    async def migrate(self, batch_size: int = 500) -> dict:
+        """
+        Move the alerts embedded in older report documents into buckets
+
+        Reports are processed in batches; each gets its buckets, an
+        alert_summary counted from its alerts if it had none, and its embedded
+        ``alerts``/``detection_report.alerts`` removed.
+        """
+        migrated = 0
+        buckets_written = 0
+        query = {"$or": [{"alerts": {"$exists": True}}, {"detection_report.alerts": {"$exists": True}}]}
+
+        while True:
+            docs = await collection.find(
+                query, {"session_id": 1, "alerts": 1, "detection_report.alerts": 1, "alert_summary": 1}
+            ).limit(batch_size).to_list(length=batch_size)
+            if not docs:
+                break
+
+            updates = []
+            for doc in docs:
+                alerts = doc.get("alerts")
+                if alerts is None:
+                    alerts = (doc.get("detection_report") or {}).get("alerts") or []
+                # Buckets left by an interrupted earlier run are replaced
+                await self.delete(doc["_id"])
+                buckets_written += await self.save(doc["_id"], doc.get("session_id", ""), alerts)
+
+                update = {"$unset": {"alerts": "", "detection_report.alerts": ""}}
+                if not doc.get("alert_summary"):
+                    alert_types = {}
+                    for alert in alerts:
+                        alert_type = alert.get("type", "Unknown")
+                        alert_types[alert_type] = alert_types.get(alert_type, 0) + 1
+                    update["$set"] = {"alert_summary": {"total_alerts": len(alerts), "alert_types": alert_types}}
+                updates.append(UpdateOne({"_id": doc["_id"]}, update))
+
+            await collection.bulk_write(updates, ordered=False)
+            migrated += len(docs)
+            print(f"Migrated {migrated} reports ({buckets_written} alert buckets)")
+
+        return {"reports": migrated, "buckets": buckets_written}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the bucketed alert storage")
+    parser.add_argument("command", choices=["migrate"],
+                        help="migrate: move alerts embedded in report documents into alert buckets")
+    parser.add_argument("--batch-size", type=int, default=500, help="Reports per batch")
+    args = parser.parse_args()
+
+    store = AlertStore(bucket_seconds=int(os.environ.get("ALERT_BUCKET_SECONDS", "600")))
+    result = asyncio.run(store.migrate(batch_size=args.batch_size))
+    print(f"Moved the alerts of {result['reports']} reports into {result['buckets']} buckets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+import os
+import sys
+import zlib
+import asyncio
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from bson import json_util
+
+from database import collection, alert_buckets_collection
+from alert_store import AlertStore
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Fields kept in the hot collection for an archived report, enough for
+# listings, exports of the summary fields and the summary counters
+STUB_FIELDS = (
+    "session_id",
+    "candidate_name",
+    "exam_name",
+    "start_time",
+    "end_time",
+    "status",
+    "created_at",
+    "duration_seconds",
+    "integrity_score",
+    "stats",
+    "alert_summary",
+)
+
+CODEC_EXTENSIONS = {"zstd": "zst", "zlib": "zz"}
+
+
+def default_codec():
+    """zstd when the zstandard package is installed, zlib otherwise"""
+    return "zstd" if zstandard is not None else "zlib"
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd archives needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def partition_path(created_at: datetime, codec: str) -> str:
+    """Archive file of a creation day, relative to the archive directory"""
+    return os.path.join(created_at.strftime("%Y"), created_at.strftime("%m"),
+                        f"{created_at.strftime('%Y-%m-%d')}.ndjson.{CODEC_EXTENSIONS[codec]}")
+
+
+class ReportArchive:
+    """
+    Cold storage of old reports in compressed, date-partitioned NDJSON files.
+
+    Each creation day has one append-only file made of independently
+    compressed blocks of up to ``block_reports`` reports (one JSON document
+    per line, in MongoDB extended JSON so dates and ids round-trip). The hot
+    collection keeps a stub per archived report with the STUB_FIELDS and the
+    location of its block (``archive``), so a report is read back by
+    decompressing that single block. Recently read blocks are kept in an LRU
+    cache of ``cache_blocks`` entries. Deleting an archived report rewrites
+    its block without it (see delete_report).
+    """
+
+    def __init__(self, directory="archive", block_reports=200, cache_blocks=32, codec=None):
+        """
+        Args:
+            directory: Root directory of the archive files
+            block_reports: Reports per compressed block
+            cache_blocks: Decompressed blocks kept in memory
+            codec: "zstd" or "zlib", default zstd if available
+        """
+        self.directory = directory
+        self.block_reports = block_reports
+        self.cache_blocks = cache_blocks
+        self.codec = codec or default_codec()
+        self._blocks = OrderedDict()  # (file, offset) -> {report id: JSON line}
+        self._lock = threading.Lock()
+        self._delete_lock = asyncio.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def write_block(self, created_at: datetime, docs: list) -> dict:
+        """
+        Append one compressed block of reports to their day's file
+
+        Returns:
+            Location of the block, as stored in the stubs
+        """
+        lines = [json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS) for doc in docs]
+        return self.append_block(partition_path(created_at, self.codec), lines, self.codec)
+
+    def append_block(self, relative: str, lines: list, codec: str) -> dict:
+        """Compress JSON lines into one block at the end of an archive file"""
+        path = os.path.join(self.directory, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        block = compress("\n".join(lines).encode(), codec)
+
+        with open(path, "ab") as f:
+            offset = f.tell()
+            f.write(block)
+            f.flush()
+            # The stubs pointing here are only written once the block is on disk
+            os.fsync(f.fileno())
+
+        return {"file": relative, "offset": offset, "length": len(block), "codec": codec}
+
+    def wipe_block(self, location: dict):
+        """Overwrite a block that no stub points to anymore with zeros"""
+        with open(os.path.join(self.directory, location["file"]), "r+b") as f:
+            f.seek(location["offset"])
+            f.write(bytes(location["length"]))
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self._blocks.pop((location["file"], location["offset"]), None)
+
+    def read_block(self, location: dict) -> dict:
+        key = (location["file"], location["offset"])
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                self.cache_hits += 1
+                return block
+
+        with open(os.path.join(self.directory, location["file"]), "rb") as f:
+            f.seek(location["offset"])
+            data = decompress(f.read(location["length"]), location["codec"])
+
+        block = {}
+        for line in data.decode().split("\n"):
+            # Lines are kept as text and parsed again by load(), so callers
+            # never share (and modify) the cached documents
+            block[str(json_util.loads(line)["_id"])] = line
+
+        with self._lock:
+            self.cache_misses += 1
+            self._blocks[key] = block
+            self._blocks.move_to_end(key)
+            while len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+        return block
+
+    def load(self, location: dict, report_id):
+        """Full archived report, or None if its block does not hold it"""
+        line = self.read_block(location).get(str(report_id))
+        if line is None:
+            return None
+        return json_util.loads(line)
+
+    async def delete_report(self, report_id, projection: dict):
+        """
+        Delete an archived report's stub and remove the report from its block
+
+        The other reports of the block are appended to the same file as a new
+        block and their stubs pointed to it, then the stub is deleted and the
+        old block overwritten with zeros, so the report is left nowhere in the
+        archive. Until the stub is deleted the old block stays intact, so an
+        interrupted delete can simply be retried. Deletes run one at a time,
+        as two reports of one block would otherwise each rewrite it.
+
+        Returns:
+            The deleted stub (``projection`` fields), or None if there was none
+        """
+        loop = asyncio.get_running_loop()
+        async with self._delete_lock:
+            stub = await collection.find_one({"_id": report_id}, {"archive": 1})
+            if stub is None or not stub.get("archive"):
+                return await collection.find_one_and_delete({"_id": report_id}, projection=projection)
+            location = stub["archive"]
+
+            block = await loop.run_in_executor(None, self.read_block, location)
+            lines = [line for doc_id, line in block.items() if doc_id != str(report_id)]
+            if lines:
+                new_location = await loop.run_in_executor(
+                    None, self.append_block, location["file"], lines, location["codec"]
+                )
+                await collection.update_many(
+                    {"_id": {"$ne": report_id},
+                     "archive.file": location["file"], "archive.offset": location["offset"]},
+                    {"$set": {"archive": new_location}}
+                )
+
+            deleted = await collection.find_one_and_delete({"_id": report_id}, projection=projection)
+            await loop.run_in_executor(None, self.wipe_block, location)
+            return deleted
+
+    def cache_status(self) -> dict:
+        with self._lock:
+            return {
+                "blocks_cached": len(self._blocks),
+                "max_blocks": self.cache_blocks,
+                "hits": self.cache_hits,
+                "misses": self.cache_misses
+            }
+
+    async def archive_reports(self, older_than_days: float, batch_size: int = 1000, dry_run: bool = False) -> dict:
+        """
+        Move reports created more than ``older_than_days`` ago into the archive
+
+        Full reports (with their alerts from the alert buckets) are written
+        block by block; after each block is on disk its reports are replaced
+        by stubs and their alert buckets are deleted. Re-running after an
+        interruption is safe: already archived reports are skipped, and a
+        block whose stubs were never written is just unused space.
+        """
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        query = {"created_at": {"$lt": cutoff}, "archive": {"$exists": False}}
+
+        if dry_run:
+            return {"dry_run": True, "cutoff": cutoff.isoformat(),
+                    "reports": await collection.count_documents(query), "blocks": 0}
+
+        alert_store = AlertStore()
+        archived = 0
+        blocks = 0
+        loop = asyncio.get_running_loop()
+        while True:
+            docs = await collection.find(query).sort("created_at", 1).limit(batch_size).to_list(length=batch_size)
+            if not docs:
+                break
+
+            by_day = OrderedDict()
+            for doc in docs:
+                by_day.setdefault(doc["created_at"].date(), []).append(doc)
+
+            for day_docs in by_day.values():
+                for first in range(0, len(day_docs), self.block_reports):
+                    block_docs = day_docs[first:first + self.block_reports]
+                    for doc in block_docs:
+                        if "alerts" not in doc:
+                            doc["alerts"] = await alert_store.load(doc["_id"])
+
+                    location = await loop.run_in_executor(
+                        None, self.write_block, block_docs[0]["created_at"], block_docs
+                    )
+
+                    for doc in block_docs:
+                        stub = {field: doc[field] for field in STUB_FIELDS if field in doc}
+                        stub["archive"] = location
+                        stub["archived_at"] = datetime.now()
+                        await collection.replace_one({"_id": doc["_id"]}, stub)
+                    await alert_buckets_collection.delete_many(
+                        {"report_id": {"$in": [doc["_id"] for doc in block_docs]}}
+                    )
+
+                    archived += len(block_docs)
+                    blocks += 1
+            print(f"Archived {archived} reports in {blocks} blocks")
+
+        return {"dry_run": False, "cutoff": cutoff.isoformat(), "reports": archived, "blocks": blocks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old reports into compressed archive files")
+    parser.add_argument("command", choices=["run"], help="run: archive reports older than --older-than-days")
+    parser.add_argument("--older-than-days", type=float,
+                        default=float(os.environ.get("ARCHIVE_AFTER_DAYS", "90")),
+                        help="Archive reports created more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Reports read per batch")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the reports that would be archived")
+    args = parser.parse_args()
+
+    archive = ReportArchive(
+        directory=os.environ.get("ARCHIVE_DIR", "archive"),
+        block_reports=int(os.environ.get("ARCHIVE_BLOCK_REPORTS", "200"))
+    )
+    result = asyncio.run(archive.archive_reports(args.older_than_days, args.batch_size, args.dry_run))
+    if result["dry_run"]:
+        print(f"{result['reports']} reports created before {result['cutoff']} would be archived")
+    else:
+        print(f"Archived {result['reports']} reports created before {result['cutoff']} "
+              f"in {result['blocks']} {archive.codec} blocks under {archive.directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
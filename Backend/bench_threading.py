@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import subprocess
+
+import numpy as np
+
+# Configurations compared by default; "cpus" stands for the number of available CPUs
+DEFAULT_CONFIGS = {
+    "library-defaults": {"workers": "cpus", "opencv_threads": None, "tf_intra_op_threads": 0, "tf_inter_op_threads": 0},
+    "budgeted": {"workers": "cpus", "opencv_threads": 1, "tf_intra_op_threads": 1, "tf_inter_op_threads": 1},
+    "budgeted-pinned": {"workers": "cpus", "opencv_threads": 1, "tf_intra_op_threads": 1, "tf_inter_op_threads": 1,
+                        "pin_workers": True},
+    "half-workers-2-threads": {"workers": "cpus/2", "opencv_threads": 2, "tf_intra_op_threads": 2,
+                               "tf_inter_op_threads": 1},
+}
+
+
+def resolve_workers(value, cpus):
+    if value == "cpus":
+        return cpus
+    if value == "cpus/2":
+        return max(cpus // 2, 1)
+    return value
+
+
+def run_child(config, sessions, duration, corpus):
+    """Analyze ``sessions`` concurrent streams for ``duration`` seconds under one configuration"""
+    from threading_config import ThreadBudget, available_cpus
+
+    config = dict(config, workers=resolve_workers(config.get("workers"), len(available_cpus())))
+    budget = ThreadBudget(**config)
+    budget.apply()
+    executor = budget.make_executor()
+
+    import cv2
+    from realtime_detector import CheatDetectionSystem
+    from loadtest import generate_frames, load_corpus
+
+    frames = load_corpus(corpus) if corpus else generate_frames()
+    detectors = []
+    for _ in range(sessions):
+        detector = CheatDetectionSystem(
+            model_path='ssd_mobilenet_v2_coco_2018_03_29/saved_model',
+            detection_threshold=0.3,
+            mobile_threshold=0.05
+        )
+        detector.draw_annotations = False
+        detector.real_time_alerts = False
+        detectors.append(detector)
+
+    def analyze(detector, frame_bytes):
+        started = time.perf_counter()
+        frame = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+        detector.process_frame(frame)
+        return time.perf_counter() - started
+
+    async def stream(detector, latencies):
+        loop = asyncio.get_running_loop()
+        deadline = time.perf_counter() + duration
+        i = 0
+        while time.perf_counter() < deadline:
+            latencies.append(await loop.run_in_executor(executor, analyze, detector, frames[i % len(frames)]))
+            i += 1
+
+    async def run_all():
+        latencies = []
+        await asyncio.gather(*(stream(detector, latencies) for detector in detectors))
+        return latencies
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.perf_counter()
+    latencies = asyncio.run(run_all())
+    elapsed = time.perf_counter() - started
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    executor.shutdown()
+
+    cpu_seconds = (usage_after.ru_utime + usage_after.ru_stime) - (usage_before.ru_utime + usage_before.ru_stime)
+    context_switches = (usage_after.ru_nvcsw + usage_after.ru_nivcsw) - (usage_before.ru_nvcsw + usage_before.ru_nivcsw)
+    return {
+        "threads": budget.describe(),
+        "frames": len(latencies),
+        "frames_per_second": round(len(latencies) / elapsed, 1),
+        "analyzed_per_second": round(sum(d.total_frames_analyzed for d in detectors) / elapsed, 1),
+        "frame_latency_ms_p50": round(float(np.percentile(latencies, 50)) * 1000, 2) if latencies else None,
+        "frame_latency_ms_p99": round(float(np.percentile(latencies, 99)) * 1000, 2) if latencies else None,
+        "cpu_percent": round(cpu_seconds / elapsed * 100, 1),
+        "context_switches_per_second": round(context_switches / elapsed)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare analysis throughput under thread budget configurations")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent simulated sessions")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per configuration")
+    parser.add_argument("--corpus", default=None, help="Directory of .jpg frames or a session recording path prefix")
+    parser.add_argument("--configs", default=None,
+                        help=f"Comma separated subset of: {', '.join(DEFAULT_CONFIGS)}")
+    parser.add_argument("--output", default=None, help="File for the JSON results")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # TensorFlow threading can only be set once per process, so each configuration runs in its own
+        print(json.dumps(run_child(json.loads(args.child), args.sessions, args.duration, args.corpus)))
+        return 0
+
+    names = args.configs.split(",") if args.configs else list(DEFAULT_CONFIGS)
+    unknown = [name for name in names if name not in DEFAULT_CONFIGS]
+    if unknown:
+        parser.error(f"Unknown configurations: {', '.join(unknown)}")
+
+    results = {}
+    for name in names:
+        print(f"Running {name} ({args.sessions} sessions, {args.duration}s)...")
+        command = [sys.executable, os.path.abspath(__file__), "--child", json.dumps(DEFAULT_CONFIGS[name]),
+                   "--sessions", str(args.sessions), "--duration", str(args.duration)]
+        if args.corpus:
+            command += ["--corpus", args.corpus]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"  failed: {completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else completed.returncode}")
+            continue
+        results[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    print("\n" + "=" * 90)
+    print(f"{'configuration':<24}{'workers':>8}{'frames/s':>10}{'analyzed/s':>12}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'CPU %':>8}{'ctx sw/s':>10}")
+    print("=" * 90)
+    for name, result in results.items():
+        print(f"{name:<24}{result['threads']['workers']:>8}{result['frames_per_second']:>10}"
+              f"{result['analyzed_per_second']:>12}{result['frame_latency_ms_p50']:>9}"
+              f"{result['frame_latency_ms_p99']:>9}{result['cpu_percent']:>8}{result['context_switches_per_second']:>10}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
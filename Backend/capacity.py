@@ -0,0 +1,138 @@
+import time
+
+
+class CapacityTracker:
+    """
+    Estimates how many more proctoring sessions this process can analyze.
+
+    Every analyzed frame records its cost (decode + analysis seconds), per
+    session and on average. The average cost per frame, times the minimum
+    frame rate a session needs, gives the compute a new session requires.
+    Once ``min_measured_frames`` frames have been measured, a session is
+    admitted if that still fits in ``cores`` next to the measured load of the
+    live sessions (cost / frame interval of each; sessions without a recent
+    measurement count with the requirement). Until then, ``cores`` is simply
+    divided by the requirement.
+    """
+
+    def __init__(self, cores=1.0, min_session_fps=3.0, default_frame_cost=0.03, smoothing=0.05,
+                 min_measured_frames=50, stale_after=10.0):
+        """
+        Args:
+            cores: CPU cores available for frame analysis
+            min_session_fps: Frames per second each session must still get
+            default_frame_cost: Assumed seconds per frame before any is measured
+            smoothing: Weight of a new sample in the moving averages
+            min_measured_frames: Frames measured before admission uses the measured load
+            stale_after: Seconds without a frame after which a session's measured
+                load is no longer trusted
+        """
+        self.cores = cores
+        self.min_session_fps = min_session_fps
+        self.smoothing = smoothing
+        self.min_measured_frames = min_measured_frames
+        self.stale_after = stale_after
+
+        self.frame_cost = default_frame_cost
+        self.frames_measured = 0
+        self.sessions = {}  # session_id -> {"cost", "interval", "last_frame"}
+
+        self.last_cpu_sample = (time.monotonic(), time.process_time())
+        self.process_cpu_percent = 0.0
+
+    def ewma(self, average, sample):
+        return average + self.smoothing * (sample - average)
+
+    def record_frame(self, session_id, seconds):
+        """Record the processing time of one frame of a session"""
+        now = time.monotonic()
+
+        self.frame_cost = self.ewma(self.frame_cost, seconds)
+        self.frames_measured += 1
+
+        session = self.sessions.get(session_id)
+        if session is None:
+            self.sessions[session_id] = {"cost": seconds, "interval": None, "last_frame": now}
+            return
+
+        session["cost"] = self.ewma(session["cost"], seconds)
+        interval = now - session["last_frame"]
+        session["interval"] = interval if session["interval"] is None else self.ewma(session["interval"], interval)
+        session["last_frame"] = now
+
+    def forget(self, session_id):
+        self.sessions.pop(session_id, None)
+
+    @property
+    def session_requirement(self):
+        """Cores one session needs to be analyzed at min_session_fps"""
+        return self.frame_cost * self.min_session_fps
+
+    def max_sessions(self):
+        """Sessions ``cores`` can analyze at min_session_fps, from the average frame cost alone"""
+        return int(self.cores / max(self.session_requirement, 1e-9))
+
+    @property
+    def load_measured(self):
+        return self.frames_measured >= self.min_measured_frames
+
+    def can_admit(self, live_sessions):
+        if not self.load_measured:
+            return live_sessions + 1 <= self.max_sessions()
+        return self.expected_load(live_sessions) + self.session_requirement <= self.cores
+
+    def current_load(self):
+        """Cores currently used by session frames, from measured cost and frame rate"""
+        return self.measured_load()[0]
+
+    def measured_load(self):
+        """(cores used by sessions with a recent measured frame rate, number of those sessions)"""
+        now = time.monotonic()
+        load = 0.0
+        sessions = 0
+        for session in self.sessions.values():
+            if session["interval"] and now - session["last_frame"] <= self.stale_after:
+                load += session["cost"] / session["interval"]
+                sessions += 1
+        return load, sessions
+
+    def expected_load(self, live_sessions):
+        """Measured load plus the requirement of live sessions without a recent measurement"""
+        load, measured = self.measured_load()
+        return load + max(live_sessions - measured, 0) * self.session_requirement
+
+    def available_sessions(self, live_sessions):
+        """Further sessions that would be admitted now"""
+        if not self.load_measured:
+            return max(self.max_sessions() - live_sessions, 0)
+        free = self.cores - self.expected_load(live_sessions)
+        return max(int(free / max(self.session_requirement, 1e-9)), 0)
+
+    def sample_process_cpu(self):
+        """CPU use of this process since the previous sample, in percent of one core"""
+        wall, cpu = time.monotonic(), time.process_time()
+        last_wall, last_cpu = self.last_cpu_sample
+        if wall - last_wall >= 1.0:
+            self.process_cpu_percent = (cpu - last_cpu) / (wall - last_wall) * 100
+            self.last_cpu_sample = (wall, cpu)
+        return self.process_cpu_percent
+
+    def status(self, live_sessions):
+        """Capacity figures, e.g. for a load balancer"""
+        load = self.current_load()
+        available = self.available_sessions(live_sessions)
+        max_sessions = live_sessions + available
+        return {
+            "live_sessions": live_sessions,
+            "max_sessions": max_sessions,
+            "available_sessions": available,
+            "headroom": round(max(1.0 - live_sessions / max(max_sessions, 1), 0.0), 3),
+            "admission": "measured-load" if self.load_measured else "frame-cost-model",
+            "cores": self.cores,
+            "min_session_fps": self.min_session_fps,
+            "frame_cost_seconds": round(self.frame_cost, 5),
+            "frames_measured": self.frames_measured,
+            "load_cores": round(load, 3),
+            "process_cpu_percent": round(self.sample_process_cpu(), 1)
+        }
+
@@ -5,7 +5,25 @@ from dotenv import load_dotenv
 load_dotenv() 
 
 MONGO_URL = os.environ["MONGO_URL"]
-client = AsyncIOMotorClient(MONGO_URL)
+
+if MONGO_URL == "memory":
+    # In-process stand-in for load tests and local runs (pip install mongomock-motor)
+    from mongomock_motor import AsyncMongoMockClient
+    client = AsyncMongoMockClient()
+else:
+    client = AsyncIOMotorClient(MONGO_URL)
 
 db = client["tutedude"] 
-collection = db["reports"]
\ No newline at end of file
+collection = db["reports"]
+stats_collection = db["report_stats"]
+alert_buckets_collection = db["alert_buckets"]
+
+
+async def ensure_indexes():
+    """Create the indexes the report queries rely on"""
+    # Keyset pagination of /api/reports walks (created_at, _id) in descending order
+    await collection.create_index([("created_at", -1), ("_id", -1)])
+    # Alert buckets are read per report, and queried by session, alert type and time
+    await alert_buckets_collection.create_index([("report_id", 1), ("bucket_start", 1)])
+    await alert_buckets_collection.create_index([("session_id", 1), ("bucket_start", 1)])
+    await alert_buckets_collection.create_index([("alerts.type", 1), ("bucket_start", 1)])
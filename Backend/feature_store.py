@@ -0,0 +1,133 @@
+import os
+import re
+import json
+import hashlib
+import numpy as np
+
+from session_timeline import TIMELINE_DTYPE
+
+FEATURE_STORE_VERSION = 1
+
+
+class FeatureStore:
+    """
+    On-disk store of per-frame detector outputs, one compressed columnar
+    ``.npz`` file per stored report (one array per TIMELINE_DTYPE field plus
+    a JSON metadata entry). Files are keyed by the report id, since clients
+    may reuse session ids; reports saved earlier used the session id.
+    """
+
+    def __init__(self, directory='feature_store'):
+        self.directory = directory
+
+    def path_for(self, key):
+        """File path of a key; older keys are client session ids, so keys are sanitized"""
+        safe_id = re.sub(r'[^A-Za-z0-9_-]', '_', key)[:64]
+        digest = hashlib.sha1(key.encode()).hexdigest()[:8]
+        return os.path.join(self.directory, f"{safe_id}_{digest}.npz")
+
+    def save(self, key, rows, metadata):
+        """
+        Write the timeline rows of a session
+
+        Args:
+            key: Id of the report the rows belong to
+            rows: Structured array with TIMELINE_DTYPE
+            metadata: JSON serializable session facts (session id, thresholds, captured frames, ...)
+
+        Returns:
+            Path of the written file
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(key)
+
+        metadata = dict(metadata, feature_key=key, version=FEATURE_STORE_VERSION)
+        columns = {name: rows[name] for name in TIMELINE_DTYPE.names}
+
+        # Write to a temporary file first so readers never see a partial file
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(f, metadata=np.array(json.dumps(metadata)), **columns)
+        os.replace(temp_path, path)
+        return path
+
+    def exists(self, key):
+        return os.path.exists(self.path_for(key))
+
+    def load(self, key):
+        """
+        Read the timeline rows stored under a key
+
+        Returns:
+            (rows, metadata) tuple, rows being a structured array with TIMELINE_DTYPE
+        """
+        with np.load(self.path_for(key)) as data:
+            metadata = json.loads(str(data['metadata']))
+            rows = np.zeros(len(data['t']), dtype=TIMELINE_DTYPE)
+            for name in TIMELINE_DTYPE.names:
+                if name in data:
+                    rows[name] = data[name]
+        return rows, metadata
+
+
+def rescore_features(rows, metadata, detection_threshold=None, mobile_threshold=None):
+    """
+    Recompute the statistics part of a detection report from stored features
+
+    Mirrors the counters of CheatDetectionSystem.process_frame and the report
+    of generate_report. Mobile detections are recounted from the stored best
+    cell phone scores, so at most PHONE_SCORE_SLOTS detections per frame count.
+
+    Args:
+        rows: Structured array with TIMELINE_DTYPE
+        metadata: Metadata saved with the features
+        detection_threshold: Threshold for cheating_detected, defaults to the recorded one
+        mobile_threshold: Mobile phone confidence threshold, defaults to the recorded one
+
+    Returns:
+        Report dictionary with the same statistics keys as generate_report
+    """
+    if detection_threshold is None:
+        detection_threshold = metadata['detection_threshold']
+    if mobile_threshold is None:
+        mobile_threshold = metadata['mobile_threshold']
+
+    analyzed = max(len(rows), 1)
+    faces = rows['faces']
+
+    # Compare in float16 like the stored scores, so the recorded threshold reproduces the live counts
+    phone_scores = rows['phone_scores']
+    mobile_frames = int(np.count_nonzero((phone_scores > 0) & (phone_scores >= np.float16(mobile_threshold))))
+
+    counts = {
+        'looking_away': int(rows['looking_away'].sum(dtype=np.int64)),
+        'mobile': mobile_frames,
+        'multiple_people': int(np.count_nonzero(faces > 1)),
+        'no_face': int(np.count_nonzero(faces == 0)),
+        'suspicious': int(rows['suspicious'].sum(dtype=np.int64))
+    }
+    face_detected = int(np.count_nonzero(faces > 0))
+
+    return {
+        'session_duration': metadata.get('session_duration', 0.0),
+        'total_frames_captured': metadata.get('total_frames_captured', len(rows)),
+        'total_frames_analyzed': len(rows),
+        'face_detection_rate': (face_detected / analyzed) * 100,
+        'statistics': {
+            'looking_away_percentage': (counts['looking_away'] / analyzed) * 100,
+            'mobile_detection_percentage': (counts['mobile'] / analyzed) * 100,
+            'multiple_people_percentage': (counts['multiple_people'] / analyzed) * 100,
+            'no_face_percentage': (counts['no_face'] / analyzed) * 100,
+            'suspicious_behavior_percentage': (counts['suspicious'] / analyzed) * 100
+        },
+        'cheating_detected': {
+            'gaze_based': (counts['looking_away'] / analyzed) > detection_threshold,
+            'mobile_based': (counts['mobile'] / analyzed) > detection_threshold,
+            'multiple_people': (counts['multiple_people'] / analyzed) > detection_threshold,
+            'suspicious_behavior': (counts['suspicious'] / analyzed) > detection_threshold
+        },
+        'thresholds': {
+            'detection_threshold': detection_threshold,
+            'mobile_threshold': mobile_threshold
+        }
+    }
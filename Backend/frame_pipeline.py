@@ -0,0 +1,124 @@
+import asyncio
+
+# Marks the end of the stream in the stage queues
+_STOP = object()
+
+
+class StopPipeline(Exception):
+    """Raised by a stage to close the pipeline after the frames already queued for sending"""
+
+
+class FailedFrame:
+    """A frame whose decode or analysis raised; it keeps its place in the stream"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class FramePipeline:
+    """
+    Receive -> decode -> analyze -> send stages of one WebSocket connection.
+
+    Each stage is a single task connected to the next one by a bounded queue,
+    so frame N+1 can be received and decoded while frame N is analyzed and
+    frame N-1 is sent, without reordering results. Full queues block the
+    previous stage, which in the end stops reading from the socket.
+    """
+
+    def __init__(self, receive, decode, analyze, send, on_error, depth=2, executor=None):
+        """
+        Args:
+            receive: Coroutine function returning the next message, or None at the end
+            decode: Blocking function turning a message into a frame item, or
+                None to drop it; runs in ``executor``
+            analyze: Coroutine function turning a frame item into a response,
+                or None to send nothing
+            send: Coroutine function sending a response
+            on_error: Function building the response for a FailedFrame's error
+            depth: Capacity of each queue between stages
+            executor: Executor for decode, None for the event loop default
+        """
+        self.receive = receive
+        self.decode = decode
+        self.analyze = analyze
+        self.send = send
+        self.on_error = on_error
+        self.depth = depth
+        self.executor = executor
+
+    async def receive_stage(self, output):
+        while True:
+            message = await self.receive()
+            if message is None:
+                break
+            await output.put(message)
+        await output.put(_STOP)
+
+    async def decode_stage(self, source, output):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await source.get()
+            if message is _STOP:
+                break
+            try:
+                item = await loop.run_in_executor(self.executor, self.decode, message)
+            except Exception as e:
+                item = FailedFrame(e)
+            if item is not None:
+                await output.put(item)
+        await output.put(_STOP)
+
+    async def analyze_stage(self, source, output):
+        while True:
+            item = await source.get()
+            if item is _STOP:
+                break
+            if not isinstance(item, FailedFrame):
+                try:
+                    item = await self.analyze(item)
+                except StopPipeline:
+                    break
+                except Exception as e:
+                    item = FailedFrame(e)
+            if item is not None:
+                await output.put(item)
+        await output.put(_STOP)
+
+    async def send_stage(self, source):
+        while True:
+            response = await source.get()
+            if response is _STOP:
+                break
+            if isinstance(response, FailedFrame):
+                response = self.on_error(response.error)
+            await self.send(response)
+
+    async def run(self):
+        """
+        Run until the client stops sending, a stage raises StopPipeline or sending fails
+
+        Exceptions of receive and send propagate to the caller.
+        """
+        decode_queue = asyncio.Queue(self.depth)
+        analyze_queue = asyncio.Queue(self.depth)
+        send_queue = asyncio.Queue(self.depth)
+
+        sender = asyncio.create_task(self.send_stage(send_queue))
+        stages = [
+            asyncio.create_task(self.receive_stage(decode_queue)),
+            asyncio.create_task(self.decode_stage(decode_queue, analyze_queue)),
+            asyncio.create_task(self.analyze_stage(analyze_queue, send_queue)),
+        ]
+
+        try:
+            # The sender finishes last on a clean stop; a failing stage ends the run early
+            pending = set(stages + [sender])
+            while sender in pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        raise task.exception()
+        finally:
+            for task in stages + [sender]:
+                task.cancel()
+            await asyncio.gather(*stages, sender, return_exceptions=True)
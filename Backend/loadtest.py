@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import glob
+import base64
+import asyncio
+import argparse
+import itertools
+import statistics
+import urllib.error
+import urllib.request
+from collections import deque
+from datetime import datetime
+
+import cv2
+import numpy as np
+import websockets
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def generate_frames(count=30, width=640, height=480, quality=80):
+    """Synthetic JPEG frames: a noisy background with a moving face-sized ellipse"""
+    rng = np.random.default_rng(0)
+    background = rng.integers(40, 200, (height, width, 3), dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        image = background.copy()
+        center = (width // 2 + int(width * 0.15 * np.sin(2 * np.pi * i / count)), height // 2)
+        cv2.ellipse(image, center, (width // 8, height // 5), 0, 0, 360, (180, 200, 230), -1)
+        cv2.circle(image, (center[0] - width // 20, center[1] - height // 20), width // 60, (40, 40, 40), -1)
+        cv2.circle(image, (center[0] + width // 20, center[1] - height // 20), width // 60, (40, 40, 40), -1)
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        frames.append(buffer.tobytes())
+    return frames
+
+
+def load_corpus(path, limit=300):
+    """JPEG frames from a directory of .jpg files or a session recording prefix"""
+    if os.path.exists(path + ".idx"):
+        from session_recorder import SessionRecording
+        with SessionRecording(path) as recording:
+            return [bytes(frame) for _, frame in itertools.islice(recording.frames(), limit)]
+
+    files = sorted(glob.glob(os.path.join(path, "*.jpg")) + glob.glob(os.path.join(path, "*.jpeg")))[:limit]
+    frames = []
+    for filename in files:
+        with open(filename, 'rb') as f:
+            frames.append(f.read())
+    return frames
+
+
+def http_json(method, url, body=None):
+    """Blocking JSON request; returns (status, parsed body)"""
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+async def http(method, url, body=None):
+    return await asyncio.get_running_loop().run_in_executor(None, http_json, method, url, body)
+
+
+class Candidate:
+    """One simulated exam candidate streaming frames over its session WebSocket"""
+
+    def __init__(self, index, args, frames):
+        self.session_id = f"loadtest-{os.getpid()}-{index}"
+        self.args = args
+        self.frames = frames
+        self.latencies = []
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+        self.rejected = False
+        self.frames_analyzed = 0
+        self.elapsed = 0.0
+
+    async def run(self):
+        base_url = self.args.url.rstrip("/")
+        status, _ = await http("POST", f"{base_url}/api/session/start", {
+            "session_id": self.session_id,
+            "candidate_name": "Load Test",
+            "exam_name": self.args.exam
+        })
+        if status != 200:
+            self.rejected = True
+            return
+
+        ws_url = base_url.replace("http", "ws", 1) + f"/ws/{self.session_id}?mode={self.args.mode}&encoding={self.args.encoding}"
+        try:
+            async with websockets.connect(ws_url, max_size=None) as websocket:
+                await self.stream(websocket)
+        finally:
+            status, body = await http("POST", f"{base_url}/api/session/{self.session_id}/end")
+            if status == 200 and body:
+                self.frames_analyzed = body["report"]["total_frames_analyzed"]
+
+    async def stream(self, websocket):
+        in_flight = deque()
+        interval = 1.0 / self.args.fps
+        payloads = [base64.b64encode(frame).decode() for frame in self.frames]
+
+        if self.args.mode != "full" or self.args.encoding != "json":
+            await websocket.recv()  # hello
+
+        async def receive():
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    message = msgpack.unpackb(message, raw=False)
+                else:
+                    message = json.loads(message)
+                if not in_flight:
+                    continue
+                sent_at = in_flight.popleft()
+                self.received += 1
+                if "error" in message:
+                    self.errors += 1
+                else:
+                    self.latencies.append(time.perf_counter() - sent_at)
+
+        receiver = asyncio.create_task(receive())
+        started = time.perf_counter()
+        next_send = started
+        try:
+            while time.perf_counter() - started < self.args.duration:
+                if len(in_flight) >= self.args.in_flight:
+                    # The server is behind: like the web client, this frame is never sent
+                    self.dropped += 1
+                else:
+                    in_flight.append(time.perf_counter())
+                    await websocket.send(json.dumps({
+                        "frame": payloads[self.sent % len(payloads)],
+                        "timestamp": int(time.time() * 1000)
+                    }))
+                    self.sent += 1
+                next_send += interval
+                await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+
+            # Give the last responses a moment to arrive
+            deadline = time.perf_counter() + 5
+            while in_flight and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+        finally:
+            self.elapsed = time.perf_counter() - started
+            receiver.cancel()
+
+
+async def sample_server(base_url, samples, stop):
+    """Poll /api/capacity for the server's CPU and RSS once per second"""
+    while not stop.is_set():
+        status, body = await http("GET", f"{base_url}/api/capacity")
+        if status == 200 and body:
+            samples.append(body)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+async def run_load(args, frames):
+    base_url = args.url.rstrip("/")
+    candidates = [Candidate(i, args, frames) for i in range(args.candidates)]
+
+    samples = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_server(base_url, samples, stop))
+
+    async def start(candidate, delay):
+        await asyncio.sleep(delay)
+        try:
+            await candidate.run()
+        except Exception as e:
+            print(f"{candidate.session_id}: {e}")
+            candidate.errors += 1
+
+    started = time.perf_counter()
+    ramp_step = args.ramp / max(args.candidates, 1)
+    await asyncio.gather(*(start(candidate, i * ramp_step) for i, candidate in enumerate(candidates)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await sampler
+
+    accepted = [candidate for candidate in candidates if not candidate.rejected]
+    latencies = [latency for candidate in accepted for latency in candidate.latencies]
+    sent = sum(candidate.sent for candidate in accepted)
+    cpu = [sample["process_cpu_percent"] for sample in samples]
+    rss = [sample["process_rss_bytes"] for sample in samples if sample.get("process_rss_bytes")]
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "config": {
+            "candidates": args.candidates,
+            "fps": args.fps,
+            "duration": args.duration,
+            "mode": args.mode,
+            "encoding": args.encoding,
+            "in_flight": args.in_flight,
+            "frame_bytes": int(statistics.mean(len(frame) for frame in frames))
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "sessions_accepted": len(accepted),
+        "sessions_rejected": len(candidates) - len(accepted),
+        "frames_sent": sent,
+        "responses": sum(candidate.received for candidate in accepted),
+        "frames_dropped": sum(candidate.dropped for candidate in accepted),
+        "errors": sum(candidate.errors for candidate in candidates),
+        "latency_ms": {
+            name: None if value is None else round(value * 1000, 1)
+            for name, value in (("p50", percentile(latencies, 50)), ("p90", percentile(latencies, 90)),
+                                ("p99", percentile(latencies, 99)), ("max", max(latencies, default=None)))
+        },
+        "sent_fps_per_session": round(statistics.mean(
+            candidate.sent / max(candidate.elapsed, 1e-9) for candidate in accepted), 2) if accepted else 0,
+        "analyzed_fps_per_session": round(statistics.mean(
+            candidate.frames_analyzed / max(candidate.elapsed, 1e-9) for candidate in accepted), 2) if accepted else 0,
+        "server": {
+            "cpu_percent_avg": round(statistics.mean(cpu), 1) if cpu else None,
+            "cpu_percent_max": max(cpu, default=None),
+            "rss_bytes_max": max(rss, default=None),
+            "frame_cost_seconds": samples[-1]["frame_cost_seconds"] if samples else None
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate exam candidates streaming frames to a proctoring server")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server base URL")
+    parser.add_argument("--candidates", type=int, default=10, help="Simulated candidates")
+    parser.add_argument("--fps", type=float, default=5.0, help="Frames per second each candidate sends")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds each candidate streams")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Seconds over which candidates join")
+    parser.add_argument("--mode", choices=["full", "delta"], default="delta", help="WebSocket response mode")
+    parser.add_argument("--encoding", choices=["json", "msgpack"], default="json", help="WebSocket response encoding")
+    parser.add_argument("--in-flight", type=int, default=2, help="Frames sent without a response before frames are dropped")
+    parser.add_argument("--corpus", default=None, help="Directory of .jpg frames or a session recording path prefix")
+    parser.add_argument("--width", type=int, default=640, help="Width of generated frames")
+    parser.add_argument("--height", type=int, default=480, help="Height of generated frames")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality of generated frames")
+    parser.add_argument("--exam", default="loadtest", help="Exam name of the simulated sessions")
+    parser.add_argument("--output", default=None, help="File for the JSON results")
+    args = parser.parse_args()
+
+    if args.encoding == "msgpack" and msgpack is None:
+        parser.error("--encoding msgpack needs the msgpack package")
+
+    frames = load_corpus(args.corpus) if args.corpus else generate_frames(
+        width=args.width, height=args.height, quality=args.quality)
+    if not frames:
+        parser.error(f"No frames found in {args.corpus}")
+
+    print(f"Starting {args.candidates} candidates at {args.fps} FPS for {args.duration}s against {args.url}...")
+    results = asyncio.run(run_load(args, frames))
+
+    print("\n" + "=" * 50)
+    print("LOAD TEST SUMMARY")
+    print("=" * 50)
+    print(f"Sessions: {results['sessions_accepted']} accepted, {results['sessions_rejected']} rejected")
+    print(f"Frames: {results['frames_sent']} sent, {results['responses']} answered, "
+          f"{results['frames_dropped']} dropped, {results['errors']} errors")
+    latency = results['latency_ms']
+    print(f"Latency (ms): p50 {latency['p50']}, p90 {latency['p90']}, p99 {latency['p99']}, max {latency['max']}")
+    print(f"Per session: {results['sent_fps_per_session']} FPS sent, {results['analyzed_fps_per_session']} FPS analyzed")
+    server = results['server']
+    rss = f"{server['rss_bytes_max'] / 1024 / 1024:.0f} MB" if server['rss_bytes_max'] else "n/a"
+    print(f"Server: CPU avg {server['cpu_percent_avg']}% / max {server['cpu_percent_max']}%, RSS max {rss}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import json
+import asyncio
+from datetime import datetime
+
+from alert_episodes import merge_alert_episodes
+
+
+class MonitorSubscriber:
+    """One proctor monitor connection: an exam filter and a bounded outgoing queue"""
+
+    def __init__(self, exam=None, max_queue=100):
+        self.exam = exam
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflows = 0
+
+
+class MonitorHub:
+    """
+    Fan-out of live session updates to proctor monitor connections.
+
+    Session code calls publish() on every change. Changes are merged per
+    session and flushed every ``flush_interval`` seconds by a single task,
+    which serializes each batch once per exam filter and hands the same
+    message to every subscriber using that filter. Integrity scores are
+    recomputed at most once per session and flush, whatever the number of
+    subscribers, and not at all while nobody is watching.
+    """
+
+    def __init__(self, score_fn=None, flush_interval=0.5, max_queue=100, max_alerts=20):
+        """
+        Args:
+            score_fn: Callable returning the current integrity score of a
+                session id (or None), called for sessions published with
+                score_dirty=True
+            flush_interval: Seconds between flushes
+            max_queue: Messages buffered per subscriber before it is resynced
+            max_alerts: Recent alerts kept per session for snapshots
+        """
+        self.score_fn = score_fn
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_alerts = max_alerts
+
+        self.sessions = {}        # session_id -> latest known state
+        self.pending = {}         # session_id -> fields changed since the last flush
+        self.stale_scores = set()
+        self.subscribers = set()
+
+    def publish(self, session_id, alerts=None, score_dirty=False, **fields):
+        """
+        Record a change of a session
+
+        Args:
+            session_id: Session that changed
+            alerts: New alerts of the session
+            score_dirty: Whether the integrity score may have changed
+            **fields: Changed state fields (status, connected, integrity_score, ...)
+        """
+        state = self.sessions.setdefault(session_id, {
+            "session_id": session_id,
+            "alert_count": 0,
+            "recent_alerts": []
+        })
+        pending = self.pending.setdefault(session_id, {})
+
+        state.update(fields)
+        pending.update(fields)
+
+        if alerts:
+            # Closing updates of alert episodes replace the episode instead of adding one
+            state["alert_count"] += sum(1 for alert in alerts if alert.get("status") != "closed")
+            state["recent_alerts"] = merge_alert_episodes(state["recent_alerts"], alerts, self.max_alerts)
+            pending["alerts"] = merge_alert_episodes(pending.get("alerts", []), alerts, self.max_alerts)
+            pending["alert_count"] = state["alert_count"]
+
+        if score_dirty:
+            self.stale_scores.add(session_id)
+
+    def remove(self, session_id):
+        """Forget a session and tell subscribers it is gone"""
+        state = self.sessions.pop(session_id, None)
+        self.stale_scores.discard(session_id)
+        if state is not None:
+            self.pending[session_id] = {"removed": True, "exam_name": state.get("exam_name", "")}
+
+    def subscribe(self, exam=None):
+        """Add a subscriber; its queue starts with a snapshot of the matching sessions"""
+        subscriber = MonitorSubscriber(exam, self.max_queue)
+        self.subscribers.add(subscriber)
+        subscriber.queue.put_nowait(self.snapshot_message(exam))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def refresh_score(self, session_id):
+        """Recompute a stale integrity score, returning True if it changed"""
+        if session_id not in self.stale_scores:
+            return False
+        self.stale_scores.discard(session_id)
+        if self.score_fn is None or session_id not in self.sessions:
+            return False
+
+        score = self.score_fn(session_id)
+        state = self.sessions[session_id]
+        if score is None or score == state.get("integrity_score"):
+            return False
+        state["integrity_score"] = score
+        return True
+
+    def snapshot_message(self, exam=None):
+        sessions = []
+        for session_id, state in self.sessions.items():
+            if exam is None or state.get("exam_name") == exam:
+                self.refresh_score(session_id)
+                sessions.append(state)
+
+        return json.dumps({
+            "type": "snapshot",
+            "sessions": sessions,
+            "timestamp": datetime.now().isoformat()
+        }, default=str)
+
+    def deliver(self, subscriber, message):
+        try:
+            subscriber.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A slow subscriber gets its backlog replaced by one fresh snapshot
+            subscriber.overflows += 1
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait(self.snapshot_message(subscriber.exam))
+
+    def flush(self):
+        """
+        Send the changes collected since the last flush
+
+        Returns:
+            Number of session updates sent
+        """
+        pending, self.pending = self.pending, {}
+        if not self.subscribers:
+            return 0
+
+        for session_id in list(self.stale_scores):
+            if self.refresh_score(session_id):
+                pending.setdefault(session_id, {})["integrity_score"] = self.sessions[session_id]["integrity_score"]
+
+        updates = []
+        for session_id, fields in pending.items():
+            if not fields:
+                continue
+            update = {"session_id": session_id, **fields}
+            if "exam_name" not in update:
+                update["exam_name"] = self.sessions.get(session_id, {}).get("exam_name", "")
+            updates.append(update)
+
+        if not updates:
+            return 0
+
+        groups = {}
+        for subscriber in self.subscribers:
+            groups.setdefault(subscriber.exam, []).append(subscriber)
+
+        timestamp = datetime.now().isoformat()
+        for exam, subscribers in groups.items():
+            batch = [update for update in updates if exam is None or update["exam_name"] == exam]
+            if not batch:
+                continue
+            message = json.dumps({"type": "update", "sessions": batch, "timestamp": timestamp}, default=str)
+            for subscriber in subscribers:
+                self.deliver(subscriber, message)
+
+        return len(updates)
+
+    async def run(self):
+        """Flush every ``flush_interval`` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in monitor flush: {e}")
+
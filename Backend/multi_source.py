@@ -0,0 +1,172 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from realtime_detector import CheatDetectionSystem
+
+
+def parse_source(value):
+    """Camera indices are given as integers, anything else is a video file path"""
+    return int(value) if value.isdigit() else value
+
+
+def source_name(source):
+    if isinstance(source, int):
+        return f"camera{source}"
+    name = os.path.splitext(os.path.basename(source))[0]
+    return re.sub(r'[^A-Za-z0-9_-]', '_', name) or "source"
+
+
+def analyze_source(source, index, output_dir, stop, model_path, detection_threshold, mobile_threshold,
+                   duration=None, verbose=False):
+    """
+    Analyze one camera or video file with its own detector state
+
+    Cameras are read until ``duration`` seconds have passed (or until stopped),
+    video files until their last frame.
+
+    Returns:
+        Throughput summary of the source, including the path of its report
+    """
+    detector = CheatDetectionSystem(
+        model_path=model_path,
+        detection_threshold=detection_threshold,
+        mobile_threshold=mobile_threshold
+    )
+    detector.draw_annotations = False
+    detector.real_time_alerts = verbose
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        print(f"Error: Cannot open source {source}")
+        return {"source": str(source), "error": "Cannot open source"}
+
+    if isinstance(source, int):
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    started = time.time()
+    try:
+        while not stop.is_set():
+            if duration is not None and time.time() - started >= duration:
+                break
+            ret, frame = cap.read()
+            if not ret:
+                break
+            detector.process_frame(frame)
+    finally:
+        cap.release()
+
+    elapsed = max(time.time() - started, 1e-6)
+    detector.close_alert_episodes()
+    report = detector.generate_report()
+    report['source'] = str(source)
+    report['throughput'] = {
+        'elapsed_seconds': round(elapsed, 2),
+        'frames_processed': detector.total_frames_captured,
+        'frames_analyzed': detector.total_frames_analyzed,
+        'processed_fps': round(detector.total_frames_captured / elapsed, 2),
+        'analyzed_fps': round(detector.total_frames_analyzed / elapsed, 2)
+    }
+
+    filename = os.path.join(output_dir, f"cheat_detection_report_{index}_{source_name(source)}.json")
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"{source}: {report['throughput']['frames_processed']} frames in {elapsed:.1f}s, report saved to {filename}")
+
+    return {"source": str(source), "report": filename, **report['throughput']}
+
+
+def run_sources(sources, output_dir, workers=None, model_path='ssd_mobilenet_v2_coco_2018_03_29/saved_model',
+                detection_threshold=0.3, mobile_threshold=0.05, duration=None, verbose=False):
+    """
+    Analyze several cameras and/or video files concurrently
+
+    Every source gets its own CheatDetectionSystem in its own thread; the
+    mobile detection model is loaded once and shared (OpenCV and TensorFlow
+    release the GIL, so the sources run on separate cores).
+
+    Returns:
+        Combined throughput summary, also written to ``output_dir/summary.json``
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    stop = threading.Event()
+    started = time.time()
+
+    with ThreadPoolExecutor(max_workers=workers or len(sources)) as pool:
+        futures = [
+            pool.submit(analyze_source, source, index, output_dir, stop, model_path,
+                        detection_threshold, mobile_threshold, duration, verbose)
+            for index, source in enumerate(sources)
+        ]
+        try:
+            results = [future.result() for future in futures]
+        except KeyboardInterrupt:
+            print("Stopping all sources...")
+            stop.set()
+            results = [future.result() for future in futures]
+
+    elapsed = max(time.time() - started, 1e-6)
+    total_frames = sum(result.get('frames_processed', 0) for result in results)
+    total_analyzed = sum(result.get('frames_analyzed', 0) for result in results)
+    summary = {
+        'timestamp': datetime.now().isoformat(),
+        'sources': results,
+        'elapsed_seconds': round(elapsed, 2),
+        'total_frames_processed': total_frames,
+        'total_frames_analyzed': total_analyzed,
+        'aggregate_processed_fps': round(total_frames / elapsed, 2),
+        'aggregate_analyzed_fps': round(total_analyzed / elapsed, 2)
+    }
+
+    with open(os.path.join(output_dir, "summary.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze several cameras and/or video files concurrently")
+    parser.add_argument("sources", nargs="+", help="Camera indices (e.g. 0 1) and/or video file paths")
+    parser.add_argument("--output-dir", default="reports", help="Directory for the per-source reports and summary")
+    parser.add_argument("--workers", type=int, default=None, help="Sources analyzed at once (default: all)")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds to record from cameras")
+    parser.add_argument("--model-path", default='ssd_mobilenet_v2_coco_2018_03_29/saved_model')
+    parser.add_argument("--detection-threshold", type=float, default=0.3)
+    parser.add_argument("--mobile-threshold", type=float, default=0.05)
+    parser.add_argument("--verbose", action="store_true", help="Print alerts as they are raised")
+    args = parser.parse_args()
+
+    sources = [parse_source(value) for value in args.sources]
+    if any(isinstance(source, int) for source in sources) and args.duration is None:
+        print("Cameras are recorded until Ctrl+C (use --duration to stop automatically)")
+
+    summary = run_sources(
+        sources, args.output_dir, workers=args.workers, model_path=args.model_path,
+        detection_threshold=args.detection_threshold, mobile_threshold=args.mobile_threshold,
+        duration=args.duration, verbose=args.verbose
+    )
+
+    print("\n" + "=" * 50)
+    print("MULTI-SOURCE SUMMARY")
+    print("=" * 50)
+    for result in summary['sources']:
+        if 'error' in result:
+            print(f"{result['source']}: {result['error']}")
+        else:
+            print(f"{result['source']}: {result['frames_processed']} frames, "
+                  f"{result['processed_fps']:.1f} FPS ({result['analyzed_fps']:.1f} analyzed)")
+    print(f"Total: {summary['total_frames_processed']} frames in {summary['elapsed_seconds']}s, "
+          f"{summary['aggregate_processed_fps']:.1f} FPS ({summary['aggregate_analyzed_fps']:.1f} analyzed)")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
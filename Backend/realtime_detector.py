@@ -1,5 +1,6 @@
 import cv2
 import os
+import sys
 import numpy as np
 import tensorflow as tf
 import time
@@ -8,11 +9,83 @@ from datetime import datetime
 import threading
 import queue
 
+from session_timeline import (
+    SessionTimeline, VoteRingBuffer, PHONE_SCORE_SLOTS, GAZE_LABELS, GAZE_CODES, EMOTION_LABELS, EMOTION_CODES,
+    FLAG_NO_FACE, FLAG_MULTIPLE_PEOPLE, FLAG_LOOKING_AWAY, FLAG_MOBILE_PHONE, FLAG_SUSPICIOUS
+)
+from alert_episodes import AlertEpisodes
+
 # Suppress TensorFlow logs
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 
+# Loaded detection models by path, shared between CheatDetectionSystem instances
+_detection_models = {}
+_detection_models_lock = threading.Lock()
+
+def load_detection_model(model_path):
+    """
+    Load a TensorFlow saved model once per process
+    
+    Args:
+        model_path: Path to the TensorFlow saved model
+        
+    Returns:
+        The loaded model, or None if it is missing or cannot be loaded
+    """
+    with _detection_models_lock:
+        if model_path in _detection_models:
+            return _detection_models[model_path]
+        
+        model = None
+        try:
+            if os.path.exists(model_path):
+                model = tf.saved_model.load(model_path)
+                print("Mobile detection model loaded successfully")
+        except Exception as e:
+            print(f"Warning: Could not load mobile detection model: {e}")
+            print("Mobile phone detection will be disabled to save memory")
+        
+        _detection_models[model_path] = model
+        return model
+
+class LatestFrame:
+    """
+    Single-slot hand-off between threads that always holds the newest frame;
+    frames nobody picked up before the next one arrives are dropped.
+    """
+    
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.sequence = 0
+        self.closed = False
+    
+    def put(self, frame):
+        with self.condition:
+            self.frame = frame
+            self.sequence += 1
+            self.condition.notify_all()
+    
+    def get(self, after, timeout=None):
+        """
+        Wait for a frame newer than sequence number ``after``
+        
+        Returns:
+            (sequence, frame) tuple, frame being None on timeout or once closed
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence > after or self.closed, timeout)
+            if self.sequence > after:
+                return self.sequence, self.frame
+            return after, None
+    
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
 class CheatDetectionSystem:
     def __init__(self, model_path='ssd_mobilenet_v2_coco_2018_03_29/saved_model', 
                  detection_threshold=0.3, mobile_threshold=0.05):
@@ -37,28 +110,38 @@ class CheatDetectionSystem:
             self.face_cascade = None
             self.eye_cascade = None
         
-        # Load mobile detection model
-        self.detection_model = None
-        try:
-            if os.path.exists(model_path):
-                self.detection_model = tf.saved_model.load(model_path)
-                print("Mobile detection model loaded successfully")
-        except Exception as e:
-            print(f"Warning: Could not load mobile detection model: {e}")
-            print("Mobile phone detection will be disabled to save memory")
+        # Load mobile detection model (shared by all detectors of this process)
+        self.detection_model = load_detection_model(model_path)
+        
+        # Smoothing windows (majority vote over the last N analyzed frames)
+        self.face_history_length = 5
+        self.emotion_history_length = 10
+        
+        # Alerts are coalesced into episodes (see alert_episodes.AlertEpisodes)
+        self.alert_episodes = AlertEpisodes(gap_frames=5, emit=self.generate_alert)
         
         # Tracking variables
         self.reset_counters()
         
+        # Cell phone scores of the last analyzed frame (see detect_mobile_phones)
+        self.last_phone_scores = []
+        
         # Configuration for performance optimization
         self.frame_skip = 3  # Process every 3rd frame for better performance
         self.frame_counter = 0
         self.input_width = 320  # Reduced resolution for processing
         self.input_height = 240
         
+        # Haar cascade parameters, in input_width x input_height pixels
+        # (sweep_settings.py charts their speed/accuracy trade-off)
+        self.face_scale_factor = 1.1
+        self.face_min_neighbors = 5
+        self.face_min_size = (30, 30)
+        self.eye_scale_factor = 1.1
+        self.eye_min_neighbors = 3
+        self.eye_min_size = (10, 10)
+        
         # Improved gaze tracking
-        self.face_center_history = []
-        self.face_history_length = 5
         self.baseline_face_center = None
         self.baseline_frames = 30
         self.baseline_counter = 0
@@ -71,9 +154,12 @@ class CheatDetectionSystem:
         self.consecutive_looking_away = 0
         self.looking_away_threshold = 5
         
-        # Simple emotion detection based on facial features 
-        self.emotion_history = []
-        self.emotion_history_length = 10
+        # Overlay primitives of the last analyzed frame (see overlay_shapes).
+        # draw_annotations=False skips rendering them into the frame, for
+        # callers that draw the overlay themselves (e.g. the browser).
+        self.draw_annotations = True
+        self.last_overlay = {'frame_size': [0, 0], 'shapes': []}
+        self.overlay_version = 0
         
     def reset_counters(self):
         """Reset all tracking counters"""
@@ -88,10 +174,50 @@ class CheatDetectionSystem:
         self.session_start_time = time.time()
         self.baseline_face_center = None
         self.baseline_counter = 0
-        self.face_center_history = []
+        self.face_center_history = VoteRingBuffer(self.face_history_length, len(GAZE_LABELS))
         self.consecutive_looking_away = 0
-        self.emotion_history = []
+        self.emotion_history = VoteRingBuffer(self.emotion_history_length, len(EMOTION_LABELS))
         
+        # Per analyzed frame signals, see session_timeline.TIMELINE_DTYPE
+        self.timeline = SessionTimeline()
+        self.alert_episodes.reset()
+        
+    def memory_usage(self):
+        """
+        Approximate memory held by this detector's per-session buffers
+        
+        Returns:
+            Dictionary of buffer sizes in bytes plus their total
+        """
+        pending_alerts = list(self.alert_queue.queue)
+        usage = {
+            'face_center_history_bytes': self.face_center_history.nbytes,
+            'emotion_history_bytes': self.emotion_history.nbytes,
+            'timeline_frames': len(self.timeline),
+            'timeline_bytes': self.timeline.nbytes,
+            'pending_alerts': len(pending_alerts),
+            'pending_alerts_bytes': sum(sys.getsizeof(alert) for alert in pending_alerts),
+            'alert_episodes': len(self.alert_episodes),
+        }
+        usage['total_bytes'] = sum(value for key, value in usage.items() if key.endswith('_bytes'))
+        usage['model_loaded'] = self.detection_model is not None
+        return usage
+    
+    def release(self):
+        """Drop the cascades, buffers and this detector's reference to the shared model"""
+        self.detection_model = None
+        self.face_cascade = None
+        self.eye_cascade = None
+        self.face_center_history.clear()
+        self.emotion_history.clear()
+        self.timeline = SessionTimeline()
+        self.alert_episodes.reset()
+        while not self.alert_queue.empty():
+            try:
+                self.alert_queue.get_nowait()
+            except queue.Empty:
+                break
+    
     def detect_mobile_phones(self, frame):
         """
         Detect mobile phones in the frame using TensorFlow model (if available)
@@ -102,6 +228,8 @@ class CheatDetectionSystem:
         Returns:
             List of detected mobile phone bounding boxes with confidence scores
         """
+        self.last_phone_scores = []
+        
         if self.detection_model is None:
             return []
         
@@ -118,12 +246,16 @@ class CheatDetectionSystem:
             classes = detections['detection_classes'][0].numpy().astype(int)
             scores = detections['detection_scores'][0].numpy()
             
+            # Best cell phone scores regardless of mobile_threshold, kept for re-scoring
+            phone_scores = scores[classes == 77]
+            self.last_phone_scores = sorted(phone_scores.tolist(), reverse=True)[:PHONE_SCORE_SLOTS]
+            
             mobile_detections = []
             for bbox, cls, score in zip(bboxes, classes, scores):
                 if cls == 77 and score >= self.mobile_threshold:  # Class 77 is cell phone in COCO
                     mobile_detections.append({
                         'bbox': bbox,
-                        'confidence': score
+                        'confidence': float(score)  # numpy scalars are not JSON/BSON serializable
                     })
             
             return mobile_detections
@@ -174,17 +306,14 @@ class CheatDetectionSystem:
                 confidence = 0.6
             
             # Add to emotion history for smoothing
-            self.emotion_history.append(emotion)
-            if len(self.emotion_history) > self.emotion_history_length:
-                self.emotion_history.pop(0)
+            self.emotion_history.push(EMOTION_CODES[emotion])
             
             # Use majority vote for smoothing
             if len(self.emotion_history) >= 3:
-                emotion_counts = {e: self.emotion_history.count(e) for e in set(self.emotion_history)}
-                most_common = max(emotion_counts, key=emotion_counts.get)
-                if emotion_counts[most_common] >= 2:
-                    emotion = most_common
-                    confidence = emotion_counts[most_common] / len(self.emotion_history)
+                most_common, count = self.emotion_history.majority()
+                if count >= 2:
+                    emotion = EMOTION_LABELS[most_common]
+                    confidence = count / len(self.emotion_history)
             
             return emotion, confidence
             
@@ -251,32 +380,55 @@ class CheatDetectionSystem:
                 confidence = 1.0 - abs(relative_position) * 2
         
         # Add smoothing with history
-        self.face_center_history.append(direction)
-        if len(self.face_center_history) > self.face_history_length:
-            self.face_center_history.pop(0)
+        self.face_center_history.push(GAZE_CODES[direction])
         
         # Use majority vote for smoothing
         if len(self.face_center_history) >= 3 and confidence < 0.8:
-            direction_counts = {d: self.face_center_history.count(d) for d in set(self.face_center_history)}
-            most_common = max(direction_counts, key=direction_counts.get)
-            if direction_counts[most_common] >= 2:
-                direction = most_common
-                confidence = direction_counts[most_common] / len(self.face_center_history)
+            most_common, count = self.face_center_history.majority()
+            if count >= 2:
+                direction = GAZE_LABELS[most_common]
+                confidence = count / len(self.face_center_history)
         
         return direction, confidence
     
-    def generate_alert(self, alert_type, details):
-        """Generate alert for suspicious behavior"""
-        alert = {
-            'timestamp': datetime.now().isoformat(),
-            'type': alert_type,
-            'details': details
-        }
-        
+    def generate_alert(self, episode):
+        """Queue an alert episode when it opens and again when it closes"""
         if self.real_time_alerts:
-            print(f"ALERT: {alert_type} - {details}")
+            if episode['status'] == 'open':
+                print(f"ALERT: {episode['type']} - {episode['details']}")
+            else:
+                print(f"ALERT ENDED: {episode['type']} after {episode['frame_count']} frames")
         
-        self.alert_queue.put(alert)
+        self.alert_queue.put(episode)
+    
+    def close_alert_episodes(self):
+        """Close the open alert episodes, e.g. when the session ends"""
+        self.alert_episodes.close_all()
+    
+    @staticmethod
+    def overlay_rect(kind, x, y, w, h, color, thickness):
+        """Rectangle overlay primitive; color is BGR like the cv2 drawing calls"""
+        return {'type': 'rect', 'kind': kind, 'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h),
+                'color': '#%02x%02x%02x' % (color[2], color[1], color[0]), 'thickness': thickness}
+    
+    @staticmethod
+    def overlay_text(kind, text, x, y, color, scale, thickness):
+        """Text overlay primitive; (x, y) is the bottom-left corner of the text like cv2.putText"""
+        return {'type': 'text', 'kind': kind, 'text': text, 'x': int(x), 'y': int(y),
+                'color': '#%02x%02x%02x' % (color[2], color[1], color[0]), 'scale': scale,
+                'thickness': thickness}
+    
+    def draw_overlay(self, frame, shapes):
+        """Render overlay primitives into the frame"""
+        for shape in shapes:
+            hex_color = shape['color']
+            color = (int(hex_color[5:7], 16), int(hex_color[3:5], 16), int(hex_color[1:3], 16))
+            if shape['type'] == 'rect':
+                cv2.rectangle(frame, (shape['x'], shape['y']),
+                              (shape['x'] + shape['w'], shape['y'] + shape['h']), color, shape['thickness'])
+            else:
+                cv2.putText(frame, shape['text'], (shape['x'], shape['y']),
+                            cv2.FONT_HERSHEY_SIMPLEX, shape['scale'], color, shape['thickness'])
     
     def draw_statistics(self, frame):
         """Draw real-time statistics on the frame"""
@@ -325,27 +477,71 @@ class CheatDetectionSystem:
             cv2.putText(frame, text, (15, 35 + i * 20), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
     
-    def process_frame(self, frame):
+    def count_frame(self):
+        """
+        Count a captured frame and decide whether it is analyzed
+        
+        Returns:
+            Index of the frame if it is due for analysis (every
+            ``frame_skip``-th frame), None if it is skipped
+        """
+        self.frame_counter += 1
+        self.total_frames_captured += 1
+        if self.frame_counter % self.frame_skip != 0:
+            return None
+        return self.frame_counter
+    
+    def requested_frame_size(self, scale=1.5):
+        """
+        Frame size worth sending to this detector
+        
+        Faces are detected at input_width x input_height and the phone model
+        resizes to 300x300, so larger frames mostly cost upload and decode time.
+        
+        Args:
+            scale: Size relative to the face detection input
+            
+        Returns:
+            (width, height)
+        """
+        return int(self.input_width * scale), int(self.input_height * scale)
+    
+    def process_frame(self, frame, frame_index=None):
         """
         Process a single frame for cheat detection using OpenCV Haar cascades
         
         Args:
             frame: Input frame from camera
+            frame_index: Index returned by count_frame() when the caller
+                already counted the frame (and skips frames itself); None to
+                count it here
             
         Returns:
             Processed frame with annotations
         """
-        self.frame_counter += 1
-        self.total_frames_captured += 1
-        
-        # Skip frames for performance
-        if self.frame_counter % self.frame_skip != 0:
-            self.draw_statistics(frame)
-            return frame
+        if frame_index is None:
+            frame_index = self.count_frame()
+            
+            # Skip frames for performance
+            if frame_index is None:
+                if self.draw_annotations:
+                    self.draw_statistics(frame)
+                return frame
         
         # This frame will be analyzed
         self.total_frames_analyzed += 1
-        original_frame = frame.copy()
+        original_frame = frame  # annotations are only rendered after detection
+        
+        # Signals of this frame for the timeline (primary face = first detected)
+        frame_flags = 0
+        frame_gaze = GAZE_CODES["Calibrating"]
+        frame_gaze_confidence = 0.0
+        frame_emotion = EMOTION_CODES["none"]
+        looking_away_before = self.looking_away_frames
+        suspicious_before = self.suspicious_emotion_frames
+        
+        # Annotations in original frame coordinates, rendered at the end
+        shapes = []
         
         # Resize frame for processing to save memory
         frame_small = cv2.resize(frame, (self.input_width, self.input_height))
@@ -356,9 +552,9 @@ class CheatDetectionSystem:
         if self.face_cascade is not None:
             detected_faces = self.face_cascade.detectMultiScale(
                 gray_frame, 
-                scaleFactor=1.1, 
-                minNeighbors=5, 
-                minSize=(30, 30),
+                scaleFactor=self.face_scale_factor, 
+                minNeighbors=self.face_min_neighbors, 
+                minSize=self.face_min_size,
                 flags=cv2.CASCADE_SCALE_IMAGE
             )
             faces = detected_faces
@@ -370,17 +566,17 @@ class CheatDetectionSystem:
         # Handle face detection results
         if len(faces) == 0:
             self.no_face_frames += 1
-            cv2.putText(frame, "No Face Detected", (50, 50), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+            frame_flags |= FLAG_NO_FACE
+            shapes.append(self.overlay_text('status', "No Face Detected", 50, 50, (0, 0, 255), 1, 2))
             self.consecutive_looking_away = 0
         else:
             self.face_detected_frames += 1
             
             if len(faces) > 1:
                 self.multiple_people_frames += 1
-                self.generate_alert("Multiple People", f"Detected {len(faces)} faces")
-                cv2.putText(frame, f"Multiple People: {len(faces)}", (50, 50), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                frame_flags |= FLAG_MULTIPLE_PEOPLE
+                self.alert_episodes.observe("Multiple People", details=f"Detected {len(faces)} faces")
+                shapes.append(self.overlay_text('status', f"Multiple People: {len(faces)}", 50, 50, (0, 0, 255), 1, 2))
         
         # Process each detected face
         for i, (x, y, w, h) in enumerate(faces):
@@ -392,7 +588,7 @@ class CheatDetectionSystem:
             
             face_center = (x_orig + w_orig // 2, y_orig + h_orig // 2)
             
-            cv2.rectangle(frame, (x_orig, y_orig), (x_orig + w_orig, y_orig + h_orig), (255, 0, 0), 2)
+            shapes.append(self.overlay_rect('face', x_orig, y_orig, w_orig, h_orig, (255, 0, 0), 2))
             
             # Detect eyes within the face region for emotion analysis
             face_gray = gray_frame[y:y+h, x:x+w]
@@ -400,9 +596,9 @@ class CheatDetectionSystem:
             if self.eye_cascade is not None:
                 detected_eyes = self.eye_cascade.detectMultiScale(
                     face_gray,
-                    scaleFactor=1.1,
-                    minNeighbors=3,
-                    minSize=(10, 10)
+                    scaleFactor=self.eye_scale_factor,
+                    minNeighbors=self.eye_min_neighbors,
+                    minSize=self.eye_min_size
                 )
                 eyes = detected_eyes
             
@@ -413,14 +609,15 @@ class CheatDetectionSystem:
             # Track suspicious emotions
             if emotion in ['suspicious', 'alert']:
                 self.suspicious_emotion_frames += 1
+                frame_flags |= FLAG_SUSPICIOUS
             
             # Color code emotions
             emotion_color = (0, 255, 0) if emotion == 'neutral' else (0, 165, 255)
             if emotion == 'suspicious':
                 emotion_color = (0, 0, 255)
             
-            cv2.putText(frame, f"{emotion}: {emotion_confidence:.2f}", 
-                       (x_orig, y_orig - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, emotion_color, 2)
+            shapes.append(self.overlay_text('emotion', f"{emotion}: {emotion_confidence:.2f}",
+                                            x_orig, y_orig - 10, emotion_color, 0.6, 2))
             
             # Draw detected eyes
             for (ex, ey, ew, eh) in eyes:
@@ -428,31 +625,37 @@ class CheatDetectionSystem:
                 eye_y = y_orig + int(ey * scale_y)
                 eye_w = int(ew * scale_x)
                 eye_h = int(eh * scale_y)
-                cv2.rectangle(frame, (eye_x, eye_y), (eye_x + eye_w, eye_y + eye_h), (0, 255, 255), 1)
+                shapes.append(self.overlay_rect('eye', eye_x, eye_y, eye_w, eye_h, (0, 255, 255), 1))
             
             # Gaze direction calculation
             gaze_direction, gaze_confidence = self.calculate_gaze_direction(
                 face_center, w_orig, frame.shape[1])
             
+            if i == 0:
+                frame_emotion = EMOTION_CODES[emotion]
+                frame_gaze = GAZE_CODES[gaze_direction]
+                frame_gaze_confidence = gaze_confidence
+            
             if gaze_direction != "Calibrating":
                 # Color code gaze direction
                 gaze_color = (0, 255, 0) if gaze_direction == "Forward" else (0, 165, 255)
-                cv2.putText(frame, f"Gaze: {gaze_direction} ({gaze_confidence:.2f})", 
-                           (x_orig, y_orig + h_orig + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, gaze_color, 2)
+                shapes.append(self.overlay_text('gaze', f"Gaze: {gaze_direction} ({gaze_confidence:.2f})",
+                                                x_orig, y_orig + h_orig + 25, gaze_color, 0.6, 2))
                 
                 # Looking away detection
                 if gaze_direction in ["Left", "Right"] and gaze_confidence > 0.4:
                     self.consecutive_looking_away += 1
                     if self.consecutive_looking_away >= self.looking_away_threshold:
                         self.looking_away_frames += 1
-                        if self.looking_away_frames % 20 == 0:
-                            self.generate_alert("Looking Away", 
-                                              f"Direction: {gaze_direction}, Confidence: {gaze_confidence:.2f}")
+                        frame_flags |= FLAG_LOOKING_AWAY
+                        self.alert_episodes.observe(
+                            "Looking Away", gaze_confidence,
+                            f"Direction: {gaze_direction}, Confidence: {gaze_confidence:.2f}")
                 else:
                     self.consecutive_looking_away = 0
             else:
-                cv2.putText(frame, f"Gaze: {gaze_direction}", 
-                           (x_orig, y_orig + h_orig + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+                shapes.append(self.overlay_text('gaze', f"Gaze: {gaze_direction}",
+                                                x_orig, y_orig + h_orig + 25, (255, 255, 0), 0.6, 2))
         
         # Detect mobile phones
         mobile_detections = self.detect_mobile_phones(original_frame)
@@ -461,25 +664,49 @@ class CheatDetectionSystem:
             self.mobile_detected_frames += 1
             bbox = detection['bbox']
             confidence = detection['confidence']
+            frame_flags |= FLAG_MOBILE_PHONE
             
             y_min, x_min, y_max, x_max = bbox
             start_point = (int(x_min * frame.shape[1]), int(y_min * frame.shape[0]))
             end_point = (int(x_max * frame.shape[1]), int(y_max * frame.shape[0]))
             
-            cv2.rectangle(frame, start_point, end_point, (0, 255, 0), 2)
-            cv2.putText(frame, f'Mobile: {confidence:.2f}', 
-                       (start_point[0], start_point[1] - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            shapes.append(self.overlay_rect('phone', start_point[0], start_point[1],
+                                            end_point[0] - start_point[0], end_point[1] - start_point[1],
+                                            (0, 255, 0), 2))
+            shapes.append(self.overlay_text('phone', f'Mobile: {confidence:.2f}',
+                                            start_point[0], start_point[1] - 10, (0, 255, 0), 0.6, 2))
             
-            self.generate_alert("Mobile Phone", f"Confidence: {confidence:.2f}")
+            self.alert_episodes.observe("Mobile Phone", confidence, f"Confidence: {confidence:.2f}")
         
-        # Draw statistics overlay
-        self.draw_statistics(frame)
+        self.alert_episodes.end_frame()
+        
+        self.timeline.append(
+            time.time() - self.session_start_time, frame_index, len(faces),
+            frame_gaze, frame_gaze_confidence, frame_emotion,
+            self.looking_away_frames - looking_away_before,
+            self.suspicious_emotion_frames - suspicious_before,
+            self.last_phone_scores, frame_flags
+        )
+        
+        self.last_overlay = {'frame_size': [frame.shape[1], frame.shape[0]], 'shapes': shapes}
+        self.overlay_version += 1
+        
+        if self.draw_annotations:
+            self.draw_overlay(frame, shapes)
+            self.draw_statistics(frame)
         
         return frame
     
-    def generate_report(self):
-        """Generate a comprehensive detection report"""
+    def generate_report(self, include_timeline=True):
+        """
+        Generate a comprehensive detection report
+        
+        Args:
+            include_timeline: Whether to add the event segments of the timeline
+            
+        Returns:
+            Report dictionary
+        """
         session_time = time.time() - self.session_start_time
         
         report = {
@@ -500,19 +727,32 @@ class CheatDetectionSystem:
                 'multiple_people': (self.multiple_people_frames / max(self.total_frames_analyzed, 1)) > self.detection_threshold,
                 'suspicious_behavior': (self.suspicious_emotion_frames / max(self.total_frames_analyzed, 1)) > self.detection_threshold
             },
-            'alerts': []
+            'alerts': self.alert_episodes.snapshot(),
+            'alert_summary': self.alert_episodes.summary()
         }
         
-        # Collect all alerts
-        while not self.alert_queue.empty():
-            try:
-                alert = self.alert_queue.get_nowait()
-                report['alerts'].append(alert)
-            except queue.Empty:
-                break
+        if include_timeline:
+            report['timeline'] = {
+                'frames_recorded': len(self.timeline),
+                'frames_dropped': self.timeline.dropped_frames,
+                'bytes': self.timeline.nbytes,
+                'segments': self.timeline.segments(session_start_time=self.session_start_time)
+            }
         
         return report
     
+    def feature_metadata(self):
+        """Session facts stored next to the timeline for later re-scoring"""
+        return {
+            'detection_threshold': self.detection_threshold,
+            'mobile_threshold': self.mobile_threshold,
+            'looking_away_threshold': self.looking_away_threshold,
+            'frame_skip': self.frame_skip,
+            'session_duration': time.time() - self.session_start_time,
+            'total_frames_captured': self.total_frames_captured,
+            'frames_dropped': self.timeline.dropped_frames
+        }
+    
     def run_detection(self, save_report=True, camera_index=0):
         """
         Run the main detection loop with optimized performance
@@ -548,32 +788,85 @@ class CheatDetectionSystem:
         cap.set(cv2.CAP_PROP_FPS, 15)  # Lower FPS for better performance
         cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reduce buffer to save memory
         
-        try:
-            while True:
+        # Capture thread -> newest frame slot -> analysis thread; this thread
+        # displays the newest frame with the latest overlay and handles keys
+        latest = LatestFrame()
+        stop = threading.Event()
+        state_lock = threading.Lock()
+        counts = {'read': 0, 'processed': 0, 'analyzed': 0}
+        
+        def capture_loop():
+            while not stop.is_set():
                 ret, frame = cap.read()
                 if not ret:
                     print("Error: Cannot read frame")
                     break
+                counts['read'] += 1
+                latest.put(frame)
+            latest.close()
+        
+        def analysis_loop():
+            sequence = 0
+            while not stop.is_set():
+                sequence, frame = latest.get(sequence, timeout=0.5)
+                if frame is None:
+                    if latest.closed:
+                        break
+                    continue
+                with state_lock:
+                    analyzed_before = self.total_frames_analyzed
+                    self.process_frame(frame)
+                    counts['analyzed'] += self.total_frames_analyzed != analyzed_before
+                counts['processed'] += 1
+        
+        # The display thread draws the overlay itself, on newer frames
+        draw_annotations = self.draw_annotations
+        self.draw_annotations = False
+        
+        threads = [
+            threading.Thread(target=capture_loop, name='capture', daemon=True),
+            threading.Thread(target=analysis_loop, name='analysis', daemon=True)
+        ]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        
+        try:
+            display_sequence = 0
+            while True:
+                display_sequence, frame = latest.get(display_sequence, timeout=0.1)
+                if frame is None and latest.closed:
+                    break
                 
-                # Process frame
-                processed_frame = self.process_frame(frame)
-                
-                # Display frame
-                cv2.imshow('Optimized Cheat Detection System', processed_frame)
+                if frame is not None:
+                    display = frame.copy()
+                    self.draw_overlay(display, self.last_overlay['shapes'])
+                    self.draw_statistics(display)
+                    
+                    elapsed = max(time.time() - started, 1e-6)
+                    cv2.putText(display, f"Capture: {counts['read'] / elapsed:.1f} FPS  "
+                                         f"Analyzed: {counts['analyzed'] / elapsed:.1f} FPS",
+                                (15, display.shape[0] - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                    
+                    # Display frame
+                    cv2.imshow('Optimized Cheat Detection System', display)
                 
                 # Handle key presses
                 key = cv2.waitKey(1) & 0xFF
                 if key == ord('q'):
                     break
                 elif key == ord('r'):
-                    self.reset_counters()
+                    with state_lock:
+                        self.reset_counters()
                     print("Counters reset")
                 elif key == ord('c'):
-                    self.baseline_face_center = None
-                    self.baseline_counter = 0
+                    with state_lock:
+                        self.baseline_face_center = None
+                        self.baseline_counter = 0
                     print("Recalibrating gaze baseline...")
                 elif key == ord('s'):
-                    report = self.generate_report()
+                    with state_lock:
+                        report = self.generate_report()
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                     filename = f"cheat_detection_report_{timestamp}.json"
                     with open(filename, 'w') as f:
@@ -581,10 +874,27 @@ class CheatDetectionSystem:
                     print(f"Report saved to {filename}")
         
         finally:
+            stop.set()
+            for thread in threads:
+                thread.join(timeout=5)
             cap.release()
             cv2.destroyAllWindows()
+            self.draw_annotations = draw_annotations
+        
+        elapsed = max(time.time() - started, 1e-6)
+        throughput = {
+            'elapsed_seconds': round(elapsed, 2),
+            'frames_read': counts['read'],
+            'frames_processed': counts['processed'],
+            'frames_skipped_stale': counts['read'] - counts['processed'],
+            'capture_fps': round(counts['read'] / elapsed, 2),
+            'processed_fps': round(counts['processed'] / elapsed, 2),
+            'analyzed_fps': round(counts['analyzed'] / elapsed, 2)
+        }
         
+        self.close_alert_episodes()
         final_report = self.generate_report()
+        final_report['throughput'] = throughput
         
         if save_report:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -611,6 +921,8 @@ class CheatDetectionSystem:
         print(f"  Multiple people: {final_report['cheating_detected']['multiple_people']}")
         print(f"  Suspicious behavior: {final_report['cheating_detected']['suspicious_behavior']}")
         print(f"Total Alerts: {len(final_report['alerts'])}")
+        print(f"Capture FPS: {throughput['capture_fps']:.1f}, Processed FPS: {throughput['processed_fps']:.1f}, "
+              f"Analyzed FPS: {throughput['analyzed_fps']:.1f} ({throughput['frames_skipped_stale']} stale frames skipped)")
         
         return final_report
 
@@ -0,0 +1,76 @@
+import time
+import hashlib
+from collections import OrderedDict
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag of a serialized representation"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Whether an If-None-Match header value matches an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class ReportCache:
+    """
+    LRU cache of serialized report responses, bounded by their total size.
+
+    Stored reports only change when they are rescored, archived or deleted;
+    the server invalidates entries for its own changes, and ``ttl`` bounds how
+    long a change made by another process (rescore_reports.py, archive.py)
+    can go unnoticed.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 300.0):
+        """
+        Args:
+            max_bytes: Total size of the cached bodies
+            ttl: Seconds an entry is served before it is read from the database again
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # report id -> (body, etag, stored at)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, report_id: str):
+        """(body, etag) of a cached report, or None"""
+        entry = self.entries.get(report_id)
+        if entry is None or time.monotonic() - entry[2] > self.ttl:
+            if entry is not None:
+                self.invalidate(report_id)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(report_id)
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def put(self, report_id: str, body: bytes, etag: str):
+        self.invalidate(report_id)
+        if len(body) > self.max_bytes:
+            return
+        self.entries[report_id] = (body, etag, time.monotonic())
+        self.bytes += len(body)
+        while self.bytes > self.max_bytes:
+            _, (evicted, _, _) = self.entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def invalidate(self, report_id: str):
+        entry = self.entries.pop(report_id, None)
+        if entry is not None:
+            self.bytes -= len(entry[0])
+
+    def status(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
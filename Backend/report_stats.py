@@ -0,0 +1,265 @@
+import sys
+import time
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from database import collection, stats_collection, alert_buckets_collection
+
+# Document holding the running totals
+SUMMARY_DOC_ID = "summary"
+
+# One document per calendar day of created_at, e.g. "daily:2025-01-31"
+DAILY_DOC_PREFIX = "daily:"
+
+RECENT_DAYS = 7
+TOP_ALERT_TYPES = 5
+
+
+def counter_key(name) -> str:
+    """Make a status or alert type usable as a Mongo field name"""
+    key = str(name if name is not None else "unknown").replace(".", "_")
+    if key.startswith("$"):
+        key = "_" + key[1:]
+    return key or "unknown"
+
+
+def daily_doc_id(day: datetime) -> str:
+    return f"{DAILY_DOC_PREFIX}{day.strftime('%Y-%m-%d')}"
+
+
+class ReportStats:
+    """
+    Summary counters for the reports collection, maintained incrementally.
+
+    Every report insert/delete applies a small $inc to the summary document and
+    to the daily bucket of the report, so reading the summary never scans the
+    reports. Reads are served from an in-process cache for ``cache_ttl`` seconds.
+    """
+
+    def __init__(self, cache_ttl: float = 10.0):
+        self.cache_ttl = cache_ttl
+        self._cached_summary: Optional[dict] = None
+        self._cached_at = 0.0
+
+    def invalidate(self):
+        self._cached_summary = None
+
+    def _summary_increments(self, report: dict, sign: int) -> dict:
+        increments = {
+            "total_reports": sign,
+            f"by_status.{counter_key(report.get('status'))}": sign
+        }
+
+        score = report.get("integrity_score")
+        if isinstance(score, (int, float)):
+            increments["integrity_sum"] = sign * score
+            increments["integrity_count"] = sign
+
+        alert_types = (report.get("alert_summary") or {}).get("alert_types") or {}
+        for alert_type, count in alert_types.items():
+            increments[f"alert_types.{counter_key(alert_type)}"] = sign * count
+
+        return increments
+
+    async def _apply(self, report: dict, sign: int):
+        await stats_collection.update_one(
+            {"_id": SUMMARY_DOC_ID},
+            {"$inc": self._summary_increments(report, sign)},
+            upsert=True
+        )
+
+        created_at = report.get("created_at")
+        if isinstance(created_at, datetime):
+            await stats_collection.update_one(
+                {"_id": daily_doc_id(created_at)},
+                {"$inc": {"count": sign}},
+                upsert=True
+            )
+
+        self.invalidate()
+
+    async def record_insert(self, report: dict):
+        """Account for a report that was just inserted"""
+        await self._apply(report, 1)
+
+    async def record_delete(self, report: dict):
+        """Account for a report that was just deleted (needs status, integrity_score,
+        alert_summary and created_at of the deleted document)"""
+        await self._apply(report, -1)
+
+    async def record_score_change(self, score_delta: float):
+        """Account for integrity scores of stored reports changing by a total of score_delta"""
+        if score_delta:
+            await stats_collection.update_one(
+                {"_id": SUMMARY_DOC_ID},
+                {"$inc": {"integrity_sum": score_delta}},
+                upsert=True
+            )
+        self.invalidate()
+
+    async def get_summary(self) -> dict:
+        """Return the summary statistics, from cache when fresh"""
+        now = time.monotonic()
+        if self._cached_summary is not None and now - self._cached_at < self.cache_ttl:
+            return self._cached_summary
+
+        totals = await stats_collection.find_one({"_id": SUMMARY_DOC_ID})
+        if totals is None:
+            # Counters were never built for this database
+            await self.rebuild()
+            totals = await stats_collection.find_one({"_id": SUMMARY_DOC_ID}) or {}
+
+        today = datetime.now()
+        daily_ids = [daily_doc_id(today - timedelta(days=offset)) for offset in range(RECENT_DAYS)]
+        recent_reports = 0
+        async for doc in stats_collection.find({"_id": {"$in": daily_ids}}):
+            recent_reports += doc.get("count", 0)
+
+        integrity_count = totals.get("integrity_count", 0)
+        avg_integrity = 0
+        if integrity_count > 0:
+            avg_integrity = round(totals.get("integrity_sum", 0) / integrity_count, 2)
+
+        status_stats = [
+            {"status": status, "count": count}
+            for status, count in totals.get("by_status", {}).items()
+            if count > 0
+        ]
+
+        alert_counts = [
+            (alert_type, count)
+            for alert_type, count in totals.get("alert_types", {}).items()
+            if count > 0
+        ]
+        alert_counts.sort(key=lambda item: item[1], reverse=True)
+        top_alerts = [
+            {"type": alert_type, "count": count}
+            for alert_type, count in alert_counts[:TOP_ALERT_TYPES]
+        ]
+
+        summary = {
+            "total_reports": totals.get("total_reports", 0),
+            "recent_reports_7_days": recent_reports,
+            "average_integrity_score": avg_integrity,
+            "reports_by_status": status_stats,
+            "top_alert_types": top_alerts
+        }
+
+        self._cached_summary = summary
+        self._cached_at = now
+        return summary
+
+    async def _count_unmigrated_alerts(self, alert_types: dict, batch_size: int = 1000) -> int:
+        """
+        Add the alert_summary counts of reports with embedded alerts and no
+        alert buckets to ``alert_types``
+
+        Returns:
+            Number of such reports
+        """
+        query = {"archive": {"$exists": False},
+                 "$or": [{"alerts": {"$exists": True}}, {"detection_report.alerts": {"$exists": True}}]}
+        counted = 0
+        cursor = collection.find(query, {"alert_summary": 1})
+        while True:
+            docs = await cursor.to_list(length=batch_size)
+            if not docs:
+                break
+            # An interrupted migration may already have written buckets for some
+            bucketed = set(await alert_buckets_collection.distinct(
+                "report_id", {"report_id": {"$in": [d["_id"] for d in docs]}}
+            ))
+            for report in docs:
+                if report["_id"] in bucketed:
+                    continue
+                counted += 1
+                for alert_type, count in ((report.get("alert_summary") or {}).get("alert_types") or {}).items():
+                    key = counter_key(alert_type)
+                    alert_types[key] = alert_types.get(key, 0) + count
+        return counted
+
+    async def rebuild(self) -> dict:
+        """
+        Recompute every counter from the reports and alert buckets collections.
+
+        Alert counts come from the buckets, and from the alert_summary of
+        reports without buckets (archived, or not yet migrated by alert_store.py).
+
+        This scans all reports and is meant for maintenance (first deployment,
+        after manual edits). Writes made while it runs may be lost.
+        """
+        totals = {
+            "_id": SUMMARY_DOC_ID,
+            "total_reports": 0,
+            "by_status": {},
+            "integrity_sum": 0,
+            "integrity_count": 0,
+            "alert_types": {}
+        }
+
+        pipeline_status = [
+            {"$group": {
+                "_id": "$status",
+                "count": {"$sum": 1},
+                "integrity_sum": {"$sum": "$integrity_score"},
+                "integrity_count": {"$sum": {"$cond": [{"$isNumber": "$integrity_score"}, 1, 0]}}
+            }}
+        ]
+        async for doc in collection.aggregate(pipeline_status):
+            totals["total_reports"] += doc["count"]
+            totals["by_status"][counter_key(doc["_id"])] = doc["count"]
+            totals["integrity_sum"] += doc["integrity_sum"]
+            totals["integrity_count"] += doc["integrity_count"]
+
+        # Alert counts come from the per-type counts of the alert buckets
+        pipeline_alerts = [
+            {"$project": {"types": {"$objectToArray": "$types"}}},
+            {"$unwind": "$types"},
+            {"$group": {"_id": "$types.k", "count": {"$sum": "$types.v"}}}
+        ]
+        async for doc in alert_buckets_collection.aggregate(pipeline_alerts):
+            totals["alert_types"][counter_key(doc["_id"])] = doc["count"]
+        
+        # Archived reports (see archive.py) have no buckets left, only their alert_summary
+        pipeline_archived_alerts = [
+            {"$match": {"archive": {"$exists": True}}},
+            {"$project": {"alert_types": {"$objectToArray": {"$ifNull": ["$alert_summary.alert_types", {}]}}}},
+            {"$unwind": "$alert_types"},
+            {"$group": {"_id": "$alert_types.k", "count": {"$sum": "$alert_types.v"}}}
+        ]
+        async for doc in collection.aggregate(pipeline_archived_alerts):
+            key = counter_key(doc["_id"])
+            totals["alert_types"][key] = totals["alert_types"].get(key, 0) + doc["count"]
+        
+        # Reports saved before alerts were bucketed still embed them until
+        # alert_store.py migrate runs; like record_delete, count their alert_summary
+        unmigrated = await self._count_unmigrated_alerts(totals["alert_types"])
+        if unmigrated:
+            print(f"{unmigrated} reports still embed their alerts; run python alert_store.py migrate")
+
+        pipeline_daily = [
+            {"$match": {"created_at": {"$type": "date"}}},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                "count": {"$sum": 1}
+            }}
+        ]
+        daily_docs = []
+        async for doc in collection.aggregate(pipeline_daily):
+            daily_docs.append({"_id": f"{DAILY_DOC_PREFIX}{doc['_id']}", "count": doc["count"]})
+
+        await stats_collection.delete_many({})
+        await stats_collection.insert_many([totals] + daily_docs)
+
+        self.invalidate()
+        return totals
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] != "rebuild":
+        print("Usage: python report_stats.py rebuild")
+        sys.exit(1)
+
+    totals = asyncio.run(ReportStats().rebuild())
+    print(f"Rebuilt report statistics from {totals['total_reports']} reports")
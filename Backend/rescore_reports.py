@@ -0,0 +1,166 @@
+import sys
+import time
+import asyncio
+import argparse
+import numpy as np
+from pymongo import UpdateOne
+
+from database import collection
+from report_stats import ReportStats
+from scoring import calculate_integrity_scores
+
+STATISTIC_FIELDS = (
+    "looking_away_percentage",
+    "mobile_detection_percentage",
+    "multiple_people_percentage",
+    "no_face_percentage",
+)
+
+PROJECTION = {
+    "integrity_score": 1,
+    "detection_report.statistics": 1,
+    "detection_report.face_detection_rate": 1,
+}
+
+
+def score_batch(docs):
+    """
+    Recompute integrity scores for a batch of projected report documents
+
+    Returns:
+        (new_scores, old_scores) integer arrays aligned with docs
+    """
+    columns = {field: np.zeros(len(docs)) for field in STATISTIC_FIELDS}
+    face_detection_rate = np.zeros(len(docs))
+    old_scores = np.zeros(len(docs), dtype=np.int64)
+
+    for i, doc in enumerate(docs):
+        detection_report = doc.get("detection_report") or {}
+        stats = detection_report.get("statistics") or {}
+        for field in STATISTIC_FIELDS:
+            columns[field][i] = stats.get(field, 0) or 0
+        face_detection_rate[i] = detection_report.get("face_detection_rate", 0) or 0
+        old_scores[i] = doc.get("integrity_score") or 0
+
+    new_scores = calculate_integrity_scores(
+        columns["looking_away_percentage"],
+        columns["mobile_detection_percentage"],
+        columns["multiple_people_percentage"],
+        columns["no_face_percentage"],
+        face_detection_rate
+    )
+    return new_scores, old_scores
+
+
+async def rescore_reports(batch_size=5000, dry_run=False, show=10):
+    """
+    Re-score every stored report with the current scoring rules
+
+    Reports are read in batches through a projection, scored with the
+    vectorized rules and written back with unordered bulk updates (only the
+    ones whose score changed). In dry-run mode nothing is written and a diff
+    summary is returned instead.
+
+    Returns:
+        Summary dictionary with counts, score delta histogram and throughput
+    """
+    query_filter = {"detection_report.statistics": {"$exists": True}}
+
+    started = time.perf_counter()
+    scanned = 0
+    changed = 0
+    written = 0
+    total_delta = 0
+    delta_histogram = {}
+    samples = []
+
+    async def flush(docs):
+        nonlocal scanned, changed, written, total_delta
+
+        new_scores, old_scores = score_batch(docs)
+        differs = np.flatnonzero(new_scores != old_scores)
+
+        scanned += len(docs)
+        changed += len(differs)
+
+        deltas = new_scores[differs] - old_scores[differs]
+        total_delta += int(deltas.sum())
+        for delta, count in zip(*np.unique(deltas, return_counts=True)):
+            delta_histogram[int(delta)] = delta_histogram.get(int(delta), 0) + int(count)
+
+        for i in differs[:max(show - len(samples), 0)]:
+            samples.append({
+                "_id": str(docs[i]["_id"]),
+                "old_score": int(old_scores[i]),
+                "new_score": int(new_scores[i])
+            })
+
+        if not dry_run and len(differs):
+            operations = [
+                UpdateOne({"_id": docs[i]["_id"]}, {"$set": {"integrity_score": int(new_scores[i])}})
+                for i in differs
+            ]
+            result = await collection.bulk_write(operations, ordered=False)
+            written += result.modified_count
+
+        elapsed = time.perf_counter() - started
+        print(f"  {scanned} reports scanned, {changed} changed ({scanned / max(elapsed, 1e-9):.0f} reports/s)")
+
+    batch = []
+    async for doc in collection.find(query_filter, PROJECTION, batch_size=batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    if not dry_run and total_delta:
+        await ReportStats().record_score_change(total_delta)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "dry_run": dry_run,
+        "scanned": scanned,
+        "changed": changed,
+        "written": written,
+        "score_delta_histogram": dict(sorted(delta_histogram.items())),
+        "samples": samples,
+        "elapsed_seconds": round(elapsed, 3),
+        "reports_per_second": round(scanned / max(elapsed, 1e-9), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored reports with the current integrity rules")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Reports read and written per batch")
+    parser.add_argument("--show", type=int, default=10, help="Number of changed reports to list")
+    args = parser.parse_args()
+
+    if args.batch_size < 1:
+        parser.error("--batch-size must be positive")
+
+    print(f"Re-scoring reports{' (dry run)' if args.dry_run else ''}...")
+    summary = asyncio.run(rescore_reports(args.batch_size, args.dry_run, args.show))
+
+    print("\n" + "=" * 50)
+    print("RE-SCORING SUMMARY")
+    print("=" * 50)
+    print(f"Reports scanned: {summary['scanned']}")
+    print(f"Scores changed: {summary['changed']}")
+    if not summary["dry_run"]:
+        print(f"Reports updated: {summary['written']}")
+    print(f"Throughput: {summary['reports_per_second']} reports/s in {summary['elapsed_seconds']}s")
+    if summary["score_delta_histogram"]:
+        print("Score delta histogram:")
+        for delta, count in summary["score_delta_histogram"].items():
+            print(f"  {delta:+d}: {count}")
+    for sample in summary["samples"]:
+        print(f"  {sample['_id']}: {sample['old_score']} -> {sample['new_score']}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import numpy as np
+
+# Scoring rules shared by live sessions, stored report re-scoring and the bulk
+# re-scoring job. calculate_integrity_scores must stay in step with
+# calculate_integrity_score.
+
+
+def calculate_integrity_score(report: dict) -> int:
+    """Calculate integrity score based on detection results"""
+    base_score = 100
+
+    # Get statistics
+    stats = report.get("statistics", {})
+
+    # Looking away deductions
+    looking_away_pct = stats.get("looking_away_percentage", 0)
+    if looking_away_pct > 20:
+        base_score -= min(30, int(looking_away_pct))
+    elif looking_away_pct > 10:
+        base_score -= min(15, int(looking_away_pct / 2))
+
+    # Mobile phone deductions
+    mobile_pct = stats.get("mobile_detection_percentage", 0)
+    if mobile_pct > 5:
+        base_score -= min(25, int(mobile_pct * 2))
+    elif mobile_pct > 2:
+        base_score -= min(10, int(mobile_pct))
+
+    # Multiple people deductions
+    multiple_people_pct = stats.get("multiple_people_percentage", 0)
+    if multiple_people_pct > 2:
+        base_score -= min(20, int(multiple_people_pct * 5))
+
+    # No face deductions (less severe, could be technical issues)
+    no_face_pct = stats.get("no_face_percentage", 0)
+    if no_face_pct > 15:
+        base_score -= min(15, int(no_face_pct / 2))
+    elif no_face_pct > 30:
+        base_score -= min(25, int(no_face_pct / 3))
+
+    # Bonus for good face detection rate
+    face_detection_rate = report.get("face_detection_rate", 0)
+    if face_detection_rate > 90:
+        base_score += 5
+
+    return max(0, min(100, base_score))
+
+
+def calculate_integrity_scores(looking_away_pct, mobile_pct, multiple_people_pct,
+                               no_face_pct, face_detection_rate) -> np.ndarray:
+    """
+    Vectorized calculate_integrity_score over many reports
+
+    Args:
+        looking_away_pct: Array of statistics.looking_away_percentage
+        mobile_pct: Array of statistics.mobile_detection_percentage
+        multiple_people_pct: Array of statistics.multiple_people_percentage
+        no_face_pct: Array of statistics.no_face_percentage
+        face_detection_rate: Array of face_detection_rate
+
+    Returns:
+        Integer array of integrity scores
+    """
+    looking_away_pct = np.asarray(looking_away_pct, dtype=np.float64)
+    mobile_pct = np.asarray(mobile_pct, dtype=np.float64)
+    multiple_people_pct = np.asarray(multiple_people_pct, dtype=np.float64)
+    no_face_pct = np.asarray(no_face_pct, dtype=np.float64)
+    face_detection_rate = np.asarray(face_detection_rate, dtype=np.float64)
+
+    # int() truncates toward zero
+    def deduction(values, cap):
+        return np.minimum(cap, np.trunc(values))
+
+    scores = np.full(looking_away_pct.shape, 100.0)
+
+    # Looking away deductions
+    scores -= np.where(
+        looking_away_pct > 20, deduction(looking_away_pct, 30),
+        np.where(looking_away_pct > 10, deduction(looking_away_pct / 2, 15), 0)
+    )
+
+    # Mobile phone deductions
+    scores -= np.where(
+        mobile_pct > 5, deduction(mobile_pct * 2, 25),
+        np.where(mobile_pct > 2, deduction(mobile_pct, 10), 0)
+    )
+
+    # Multiple people deductions
+    scores -= np.where(multiple_people_pct > 2, deduction(multiple_people_pct * 5, 20), 0)
+
+    # No face deductions (the second branch is unreachable, as in the scalar rules)
+    scores -= np.where(
+        no_face_pct > 15, deduction(no_face_pct / 2, 15),
+        np.where(no_face_pct > 30, deduction(no_face_pct / 3, 25), 0)
+    )
+
+    # Bonus for good face detection rate
+    scores += np.where(face_detection_rate > 90, 5, 0)
+
+    return np.clip(scores, 0, 100).astype(np.int64)
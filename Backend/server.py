@@ -1,29 +1,122 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from starlette.websockets import WebSocketState
 import cv2
 import base64
+import csv
+import io
 import numpy as np
 import json
 import asyncio
+import time
 from datetime import datetime
 from typing import Dict, List, Optional
 import uvicorn
 from pydantic import BaseModel
-from database import collection
+from database import collection, ensure_indexes
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from realtime_detector import CheatDetectionSystem
+from report_stats import ReportStats
+from feature_store import FeatureStore, rescore_features
+from scoring import calculate_integrity_score
+from ws_protocol import ResponseEncoder, FrameControl
+from monitor import MonitorHub
+from capacity import CapacityTracker
+from frame_pipeline import FramePipeline, StopPipeline
+from session_recorder import SessionRecorder
+from threading_config import ThreadBudget
+from alert_episodes import merge_alert_episodes
+from alert_store import AlertStore
+from archive import ReportArchive
+from report_cache import ReportCache, make_etag, etag_matches
 
 
+# Upper bound for a single page of /api/reports
+MAX_REPORTS_PAGE_SIZE = 1000
+
+# Above this many matches, count="estimated" stops counting and reports the cap
+ESTIMATED_COUNT_CAP = 10000
+
+# Fields returned by the reports listing unless ?fields= says otherwise
+REPORT_SUMMARY_FIELDS = (
+    "session_id",
+    "candidate_name",
+    "exam_name",
+    "status",
+    "start_time",
+    "end_time",
+    "created_at",
+    "duration_seconds",
+    "integrity_score",
+    "stats",
+    "alert_summary",
+)
+
+# Fields a listing may select explicitly; full reports (alerts, whole
+# detection_report) are only served by /api/reports/{report_id}
+LISTABLE_REPORT_FIELDS = REPORT_SUMMARY_FIELDS + (
+    "detection_report.session_duration",
+    "detection_report.total_frames_captured",
+    "detection_report.total_frames_analyzed",
+    "detection_report.face_detection_rate",
+    "detection_report.statistics",
+    "detection_report.cheating_detected",
+)
+
+REPORT_DATETIME_FIELDS = ("start_time", "end_time", "created_at")
+
+# Streaming export: Mongo cursor batch size bounds and output chunk size
+DEFAULT_EXPORT_BATCH_SIZE = 500
+MAX_EXPORT_BATCH_SIZE = 5000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# Longest a session start may wait for capacity (?wait=<seconds>)
+MAX_ADMISSION_WAIT = 60
+
+def approximate_size(obj, depth: int = 0) -> int:
+    """Rough deep size in bytes of plain containers (dicts, lists, strings, numbers)"""
+    size = sys.getsizeof(obj)
+    if depth > 8:
+        return size
+    if isinstance(obj, dict):
+        size += sum(approximate_size(key, depth + 1) + approximate_size(value, depth + 1)
+                    for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(approximate_size(item, depth + 1) for item in obj)
+    return size
+
+def get_process_rss() -> Optional[int]:
+    """Current resident set size of this process in bytes, or None if unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # Peak, not current, RSS; ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
 class SessionStartRequest(BaseModel):
     session_id: str
     candidate_name: str = "Unknown"
     exam_name: str = ""
 
+class RescoreRequest(BaseModel):
+    detection_threshold: Optional[float] = None
+    mobile_threshold: Optional[float] = None
+    save: bool = False
+
 class ReportQueryParams(BaseModel):
     limit: Optional[int] = 10
     skip: Optional[int] = 0
@@ -49,23 +142,151 @@ class VideoProctorAPI:
         # Active sessions storage
         self.active_sessions: Dict[str, dict] = {}
         self.detection_systems: Dict[str, 'CheatDetectionSystem'] = {}
+        # Held while a frame of the session is analyzed, and while its detector
+        # is finalized or released, so neither happens in the middle of a frame
+        self.analysis_locks: Dict[str, asyncio.Lock] = {}
+        
+        # Session lifecycle: idle sessions are saved and freed, ended ones forgotten
+        self.session_idle_ttl = float(os.environ.get("SESSION_IDLE_TTL", "900"))
+        self.session_completed_ttl = float(os.environ.get("SESSION_COMPLETED_TTL", "1800"))
+        self.session_reap_interval = float(os.environ.get("SESSION_REAP_INTERVAL", "60"))
+        self.reaper_task: Optional[asyncio.Task] = None
+        
+        # One CPU budget for the analysis workers, OpenCV and TensorFlow threads;
+        # applied before any model is loaded
+        self.thread_budget = ThreadBudget.from_env()
+        self.thread_budget.apply()
+        self.executor = self.thread_budget.make_executor()
+        
+        # Admission control: a session is only started while it can still be
+        # analyzed at MIN_SESSION_FPS next to the measured load of the live ones
+        analysis_cores = min(self.thread_budget.workers, self.thread_budget.cpu_budget)
+        self.capacity = CapacityTracker(
+            cores=float(os.environ.get("CAPACITY_CORES", analysis_cores)),
+            min_session_fps=float(os.environ.get("MIN_SESSION_FPS", "3")),
+            default_frame_cost=float(os.environ.get("CAPACITY_DEFAULT_FRAME_COST", "0.03")),
+            min_measured_frames=int(os.environ.get("CAPACITY_MIN_MEASURED_FRAMES", "50"))
+        )
+        self.admission_retry_after = int(os.environ.get("ADMISSION_RETRY_AFTER", "30"))
+        
+        # Frame rate, size and JPEG quality clients are asked to send, from the
+        # analysis budget of each live session (see ws_protocol.FrameControl)
+        self.target_analysis_fps = float(os.environ.get("TARGET_ANALYSIS_FPS", "3.3"))
+        self.client_frame_scale = float(os.environ.get("CLIENT_FRAME_SCALE", "1.5"))
+        self.client_jpeg_quality = int(os.environ.get("CLIENT_JPEG_QUALITY", "75"))
+        self.control_interval = float(os.environ.get("CONTROL_INTERVAL", "5"))
+        
+        # Frames queued between the receive, decode, analysis and send stages of a connection
+        self.pipeline_depth = int(os.environ.get("FRAME_PIPELINE_DEPTH", "2"))
+        
+        # Optional recording of the raw received frames, for replay (session_recorder.py)
+        self.recorder: Optional[SessionRecorder] = None
+        if os.environ.get("RECORD_SESSIONS", "0") == "1":
+            self.recorder = SessionRecorder(
+                os.environ.get("RECORDINGS_DIR", "recordings"),
+                max_pending=int(os.environ.get("RECORDING_QUEUE_SIZE", "256"))
+            )
+        
+        # Live session updates pushed to proctors on /ws/monitor
+        self.monitor = MonitorHub(
+            score_fn=self.live_integrity_score,
+            flush_interval=float(os.environ.get("MONITOR_FLUSH_INTERVAL", "0.5")),
+            max_queue=int(os.environ.get("MONITOR_QUEUE_SIZE", "100"))
+        )
+        self.monitor_task: Optional[asyncio.Task] = None
+        
+        # Server-rendered JPEG frames (return_processed) are a debugging aid only;
+        # clients draw the overlay primitives sent with return_overlay instead
+        self.debug_frames = os.environ.get("PROCTOR_DEBUG_FRAMES", "0") == "1"
+        
+        # Per-frame detector outputs of ended sessions, used for re-scoring
+        self.feature_store = FeatureStore(os.environ.get("FEATURE_STORE_DIR", "feature_store"))
+        
+        # Incrementally maintained counters behind /api/reports/stats/summary
+        self.report_stats = ReportStats(
+            cache_ttl=float(os.environ.get("REPORT_STATS_CACHE_TTL", "10"))
+        )
+        
+        # Alerts of stored reports live in per-session time buckets, not in the report documents
+        self.alert_store = AlertStore(
+            bucket_seconds=int(os.environ.get("ALERT_BUCKET_SECONDS", "600"))
+        )
+        
+        # Old reports moved to compressed archive files by archive.py leave a stub behind
+        self.archive = ReportArchive(
+            directory=os.environ.get("ARCHIVE_DIR", "archive"),
+            block_reports=int(os.environ.get("ARCHIVE_BLOCK_REPORTS", "200")),
+            cache_blocks=int(os.environ.get("ARCHIVE_CACHE_BLOCKS", "32"))
+        )
+        
+        # Serialized responses of /api/reports/{report_id}, served with strong ETags
+        self.report_cache = ReportCache(
+            max_bytes=int(os.environ.get("REPORT_CACHE_BYTES", str(32 * 1024 * 1024))),
+            ttl=float(os.environ.get("REPORT_CACHE_TTL", "300"))
+        )
         
     
     def setup_routes(self):
+        @self.app.on_event("startup")
+        async def startup():
+            try:
+                await ensure_indexes()
+            except Exception as e:
+                print(f"Error creating database indexes: {e}")
+            
+            self.reaper_task = asyncio.create_task(self.run_session_reaper())
+            self.monitor_task = asyncio.create_task(self.monitor.run())
+        
+        @self.app.on_event("shutdown")
+        async def shutdown():
+            if self.reaper_task is not None:
+                self.reaper_task.cancel()
+            if self.monitor_task is not None:
+                self.monitor_task.cancel()
+            if self.recorder is not None:
+                await asyncio.get_running_loop().run_in_executor(None, self.recorder.stop)
+            self.executor.shutdown(wait=False)
+        
         @self.app.get("/")
         async def root():
             return {"message": "Video Proctoring API is running"}
         
         @self.app.get("/health")
         async def health_check():
-            return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+            capacity = self.capacity.status(len(self.detection_systems))
+            return {
+                "status": "healthy",
+                "available_sessions": capacity["available_sessions"],
+                "headroom": capacity["headroom"],
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        @self.app.get("/api/capacity")
+        async def get_capacity():
+            """Estimated session capacity of this node, for load balancing"""
+            return {
+                **self.capacity.status(len(self.detection_systems)),
+                "threads": self.thread_budget.describe(),
+                "process_rss_bytes": get_process_rss(),
+                "timestamp": datetime.now().isoformat()
+            }
         
         @self.app.post("/api/session/start")
-        async def start_session(session_data: SessionStartRequest):
-            """Start a new proctoring session"""
+        async def start_session(session_data: SessionStartRequest, wait: float = 0):
+            """Start a new proctoring session, waiting up to ``wait`` seconds for capacity"""
             session_id = session_data.session_id
             candidate_name = session_data.candidate_name
             
+            if session_id in self.active_sessions:
+                raise HTTPException(status_code=400, detail="Session already exists")
+            
+            if not await self.wait_for_capacity(min(max(wait, 0), MAX_ADMISSION_WAIT)):
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server is at capacity, retry later or on another node",
+                    headers={"Retry-After": str(self.admission_retry_after)}
+                )
+            
             if session_id in self.active_sessions:
                 raise HTTPException(status_code=400, detail="Session already exists")
             
@@ -79,11 +300,14 @@ class VideoProctorAPI:
                     detection_threshold=0.3,
                     mobile_threshold=0.05
                 )
+                # Annotations are only rendered for debug frames, see return_processed
+                detector.draw_annotations = False
                 
                 self.active_sessions[session_id] = {
                     "candidate_name": candidate_name,
                     "exam_name": session_data.exam_name,
                     "start_time": datetime.now(),
+                    "last_activity": datetime.now(),
                     "status": "active",
                     "alerts": [],
                     "stats": {
@@ -99,6 +323,18 @@ class VideoProctorAPI:
                 }
                 
                 self.detection_systems[session_id] = detector
+                if self.recorder is not None:
+                    self.recorder.start(session_id)
+                
+                self.monitor.publish(
+                    session_id,
+                    candidate_name=candidate_name,
+                    exam_name=session_data.exam_name,
+                    start_time=self.active_sessions[session_id]["start_time"].isoformat(),
+                    status="active",
+                    connected=False,
+                    integrity_score=100
+                )
                 
                 return {
                     "message": "Session started successfully", 
@@ -116,67 +352,51 @@ class VideoProctorAPI:
             if session_id not in self.active_sessions:
                 raise HTTPException(status_code=404, detail="Session not found")
             
+            if "final_report" in self.active_sessions[session_id]:
+                raise HTTPException(status_code=400, detail="Session already ended")
+            
             try:
-                session = self.active_sessions[session_id]
-                detector = self.detection_systems[session_id]
-                
-                # Generate final report
-                report = detector.generate_report()
-                
-                # Calculate integrity score
-                integrity_score = self.calculate_integrity_score(report)
-                
-                # Update session status
-                session["status"] = "completed"
-                session["end_time"] = datetime.now()
-                session["final_report"] = report
-                session["integrity_score"] = integrity_score
-                
-                # Prepare report data for database
-                report_data = {
-                    "session_id": session_id,
-                    "candidate_name": session["candidate_name"],
-                    "exam_name": session.get("exam_name", ""),
-                    "start_time": session["start_time"],
-                    "end_time": session["end_time"],
-                    "status": session["status"],
-                    "detection_report": report,
-                    "integrity_score": integrity_score,
-                    "alerts": session["alerts"],
-                    "stats": session["stats"],
-                    "alert_summary": {
-                        "total_alerts": len(session["alerts"]),
-                        "alert_types": self.get_alert_summary(session["alerts"])
-                    },
-                    "created_at": datetime.now(),
-                    "duration_seconds": (session["end_time"] - session["start_time"]).total_seconds()
-                }
-                
-                # Save to database
-                try:
-                    result = await collection.insert_one(report_data)
-                    database_id = str(result.inserted_id)
-                    print(f"Report saved to database with ID: {database_id}")
-                except Exception as db_error:
-                    print(f"Error saving to database: {db_error}")
-                    # Continue even if database save fails
-                    database_id = None
-                
-                # Clean up detector
-                del self.detection_systems[session_id]
-                
-                return {
-                    "message": "Session ended successfully",
-                    "session_id": session_id,
-                    "database_id": database_id,
-                    "report": report,
-                    "integrity_score": integrity_score,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
+                result = await self.finalize_session(session_id)
             except Exception as e:
                 print(f"Error ending session: {e}")
                 raise HTTPException(status_code=500, detail=f"Error ending session: {str(e)}")
+            
+            # Ended concurrently, e.g. by another request or the idle reaper
+            if result is None:
+                raise HTTPException(status_code=400, detail="Session already ended")
+            
+            return {
+                "message": "Session ended successfully",
+                "session_id": session_id,
+                "database_id": result["database_id"],
+                "report": result["report"],
+                "integrity_score": result["integrity_score"],
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        @self.app.websocket("/ws/monitor")
+        async def monitor_endpoint(websocket: WebSocket):
+            """Live session updates for proctors, optionally filtered with ?exam=<exam name>"""
+            await websocket.accept()
+            subscriber = self.monitor.subscribe(websocket.query_params.get("exam") or None)
+            
+            async def forward_updates():
+                while True:
+                    message = await subscriber.queue.get()
+                    await websocket.send_text(message)
+            
+            sender = asyncio.create_task(forward_updates())
+            try:
+                # Nothing is expected from the client; receiving detects the disconnect
+                while True:
+                    await websocket.receive_text()
+            except WebSocketDisconnect:
+                pass
+            except Exception as e:
+                print(f"Unexpected error in monitor WebSocket: {e}")
+            finally:
+                sender.cancel()
+                self.monitor.unsubscribe(subscriber)
         
         @self.app.websocket("/ws/{session_id}")
         async def websocket_endpoint(websocket: WebSocket, session_id: str):
@@ -195,103 +415,181 @@ class VideoProctorAPI:
                     pass
                 return
             
+            if session_id not in self.detection_systems:
+                try:
+                    await websocket.send_text(json.dumps({
+                        "error": "Session has ended",
+                        "session_id": session_id
+                    }))
+                    await websocket.close()
+                except:
+                    pass
+                return
+            
+            try:
+                encoder = ResponseEncoder.from_query(websocket.query_params)
+            except ValueError as e:
+                try:
+                    await websocket.send_text(json.dumps({"error": str(e), "session_id": session_id}))
+                    await websocket.close()
+                except:
+                    pass
+                return
+            
             detector = self.detection_systems[session_id]
             session = self.active_sessions[session_id]
+            overlay_version_sent = None
+            frame_control = FrameControl(interval=self.control_interval)
             
-            try:
-                while True:
-                    # Receive frame data from frontend
-                    try:
-                        data = await websocket.receive_text()
-                        frame_data = json.loads(data)
-                    except WebSocketDisconnect:
-                        print(f"WebSocket disconnected for session {session_id}")
-                        break
-                    except Exception as e:
-                        print(f"Error receiving WebSocket data: {e}")
-                        # If we can't receive data, the connection might be broken
-                        break
+            def current_integrity():
+                temp_report = detector.generate_report(include_timeline=False)
+                return self.calculate_integrity_score(temp_report)
+            
+            self.monitor.publish(session_id, connected=True)
+            
+            async def receive_message():
+                try:
+                    message = await websocket.receive_text()
+                    frame_control.observe_arrival()
+                    return message
+                except WebSocketDisconnect:
+                    print(f"WebSocket disconnected for session {session_id}")
+                except Exception as e:
+                    # If we can't receive data, the connection might be broken
+                    print(f"Error receiving WebSocket data: {e}")
+                return None
+            
+            def decode_frame(data):
+                """
+                Parse a frame message and decode its image (runs in a worker thread)
+                
+                Frames the detector skips are counted but not decoded; their
+                item carries no frame index and no image.
+                """
+                started = time.perf_counter()
+                frame_data = json.loads(data)
+                
+                # Analyze about analysis_fps frames per second, whatever rate the client sends at
+                detector.frame_skip = frame_control.frame_skip(self.analysis_fps_budget())
+                frame_index = detector.count_frame()
+                if frame_index is None and self.recorder is None:
+                    return frame_data, None, None, 0.0
+                
+                # Remove data URL prefix if present
+                frame_b64 = frame_data["frame"]
+                if frame_b64.startswith("data:image"):
+                    frame_b64 = frame_b64.split(",")[1]
+                
+                frame_bytes = base64.b64decode(frame_b64)
+                if self.recorder is not None:
+                    self.recorder.record(session_id, frame_bytes)
+                if frame_index is None:
+                    return frame_data, None, None, 0.0
+                
+                nparr = np.frombuffer(frame_bytes, np.uint8)
+                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                
+                if frame is None:
+                    print("Failed to decode frame")
+                    return None
+                return frame_data, frame, frame_index, time.perf_counter() - started
+            
+            async def analyze_frame(item):
+                nonlocal overlay_version_sent
+                frame_data, frame, frame_index, decode_seconds = item
+                
+                async with self.analysis_lock(session_id):
+                    # The session was ended or reaped while this socket stayed open
+                    if self.detection_systems.get(session_id) is not detector:
+                        print(f"Session {session_id} is no longer active, closing WebSocket")
+                        raise StopPipeline()
                     
-                    # Decode base64 frame
-                    try:
-                        # Remove data URL prefix if present
-                        frame_b64 = frame_data["frame"]
-                        if frame_b64.startswith("data:image"):
-                            frame_b64 = frame_b64.split(",")[1]
-                        
-                        frame_bytes = base64.b64decode(frame_b64)
-                        nparr = np.frombuffer(frame_bytes, np.uint8)
-                        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                        
-                        if frame is None:
-                            print("Failed to decode frame")
-                            continue
-                        
-                        # Process frame with your detection system
-                        processed_frame = detector.process_frame(frame)
-                        
-                        # Update session statistics
-                        self.update_session_stats(session_id, detector)
-                        
-                        # Get recent alerts
-                        alerts = self.get_recent_alerts(detector)
-                        
-                        # Add alerts to session history
-                        session["alerts"].extend(alerts)
-                        
-                        # Keep only recent alerts (last 100)
-                        if len(session["alerts"]) > 100:
-                            session["alerts"] = session["alerts"][-100:]
-                        
-                        # Encode processed frame for debugging (optional)
-                        processed_frame_b64 = None
-                        if frame_data.get("return_processed", False):
-                            _, buffer = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-                            processed_frame_b64 = base64.b64encode(buffer).decode()
-                        
-                        # Calculate current integrity score
-                        temp_report = detector.generate_report()
-                        current_integrity = self.calculate_integrity_score(temp_report)
-                        
-                        # Send response
-                        response = {
-                            "status": "success",
-                            "session_id": session_id,
-                            "alerts": alerts,
-                            "stats": session["stats"],
-                            "integrity_score": current_integrity,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        
-                        if processed_frame_b64:
-                            response["processed_frame"] = processed_frame_b64
-                        
-                        try:
-                            await websocket.send_text(json.dumps(response))
-                        except WebSocketDisconnect:
-                            print(f"WebSocket disconnected while sending response for session {session_id}")
-                            break
-                        except Exception as send_error:
-                            print(f"Error sending WebSocket response: {send_error}")
-                            break
-                        
-                    except Exception as e:
-                        print(f"Error processing frame: {e}")
-                        try:
-                            await websocket.send_text(json.dumps({
-                                "error": f"Frame processing error: {str(e)}",
-                                "timestamp": datetime.now().isoformat()
-                            }))
-                        except (WebSocketDisconnect, Exception):
-                            print(f"Cannot send error message, WebSocket likely disconnected")
-                            break
+                    session["last_activity"] = datetime.now()
+                    
+                    return_processed = self.debug_frames and frame_data.get("return_processed", False)
+                    detector.draw_annotations = return_processed
                     
+                    # Process frame with your detection system, off the event loop
+                    # (skipped frames were only counted)
+                    processed_frame = None
+                    if frame_index is not None:
+                        started = time.perf_counter()
+                        processed_frame = await asyncio.get_running_loop().run_in_executor(
+                            self.executor, detector.process_frame, frame, frame_index
+                        )
+                        self.capacity.record_frame(session_id, decode_seconds + time.perf_counter() - started)
+                
+                # Update session statistics
+                self.update_session_stats(session_id, detector)
+                
+                # Get recent alerts
+                alerts = self.get_recent_alerts(detector)
+                
+                # Add new alert episodes to session history and update closed ones
+                # (keep only the last 100)
+                session["alerts"] = merge_alert_episodes(session["alerts"], alerts, limit=100)
+                
+                self.monitor.publish(session_id, alerts=alerts, score_dirty=True)
+                
+                # Encode processed frame for debugging (PROCTOR_DEBUG_FRAMES=1 only)
+                processed_frame_b64 = None
+                if return_processed and processed_frame is not None:
+                    _, buffer = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
+                    processed_frame_b64 = base64.b64encode(buffer).decode()
+                
+                # Build response (the integrity score is only computed when it is sent)
+                response = encoder.build(session_id, alerts, session["stats"], current_integrity)
+                
+                if processed_frame_b64:
+                    response["processed_frame"] = processed_frame_b64
+                
+                # Overlay primitives, only when a newly analyzed frame changed them
+                if frame_data.get("return_overlay", False) and detector.overlay_version != overlay_version_sent:
+                    response["overlay"] = detector.last_overlay
+                    overlay_version_sent = detector.overlay_version
+                
+                # Frame rate, size and quality the client should send from now on
+                control = frame_control.update(*self.client_frame_settings(detector))
+                if control is not None:
+                    response["control"] = control
+                
+                return response
+            
+            async def send_response(response):
+                await encoder.send(websocket, response)
+            
+            def error_response(error):
+                print(f"Error processing frame: {error}")
+                return {
+                    "error": f"Frame processing error: {str(error)}",
+                    "timestamp": datetime.now().isoformat()
+                }
+            
+            # Receive, decode, analysis and send of consecutive frames overlap; decoding
+            # and analysis run on the budgeted pool, file I/O on the loop's default executor
+            pipeline = FramePipeline(
+                receive_message, decode_frame, analyze_frame, send_response, error_response,
+                depth=self.pipeline_depth, executor=self.executor
+            )
+            
+            try:
+                if encoder.sends_hello:
+                    await encoder.send(websocket, encoder.hello(session_id))
+                
+                await pipeline.run()
+                
+                # Stopped by the server (e.g. the session ended) while the client is still connected
+                if websocket.client_state == WebSocketState.CONNECTED:
+                    await websocket.close()
+                
             except WebSocketDisconnect:
                 print(f"WebSocket disconnected for session {session_id}")
             except Exception as e:
                 print(f"Unexpected error in WebSocket: {e}")
             finally:
                 print(f"Cleaning up WebSocket connection for session {session_id}")
+                if session_id in self.active_sessions:
+                    self.monitor.publish(session_id, connected=False)
         
         @self.app.get("/api/session/{session_id}/report")
         async def get_session_report(session_id: str):
@@ -324,7 +622,7 @@ class VideoProctorAPI:
                     },
                     "detection_report": report,
                     "integrity_score": integrity_score,
-                    "alerts_summary": {
+                    "alerts_summary": report.get("alert_summary") or {
                         "total_alerts": len(session["alerts"]),
                         "alert_types": self.get_alert_summary(session["alerts"])
                     }
@@ -338,69 +636,90 @@ class VideoProctorAPI:
         async def get_all_reports(
             limit: int = 10,
             skip: int = 0,
+            cursor: Optional[str] = None,
+            count: Optional[str] = None,
+            fields: Optional[str] = None,
             candidate_name: Optional[str] = None,
             exam_name: Optional[str] = None,
             start_date: Optional[str] = None,
             end_date: Optional[str] = None
         ):
-            """Get all saved reports with optional filtering"""
+            """Get all saved reports with optional filtering.
+
+            Pages can be walked either with skip/limit or with the opaque
+            ``next_cursor`` returned by the previous page. ``count`` selects how
+            the total is computed: "exact", "estimated" or "none". It defaults to
+            "exact" for skip/limit requests and "none" for cursor requests.
+            
+            Only summary fields are returned; ``fields`` is a comma separated
+            selection from LISTABLE_REPORT_FIELDS. Use /api/reports/{report_id}
+            for the full report.
+            """
             try:
-                # Build query filter
-                query_filter = {}
+                query_filter = self.build_report_filter(candidate_name, exam_name, start_date, end_date)
                 
-                if candidate_name:
-                    query_filter["candidate_name"] = {"$regex": candidate_name, "$options": "i"}
+                if limit < 1 or limit > MAX_REPORTS_PAGE_SIZE:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"limit must be between 1 and {MAX_REPORTS_PAGE_SIZE}"
+                    )
                 
-                if exam_name:
-                    query_filter["exam_name"] = {"$regex": exam_name, "$options": "i"}
+                projection = self.resolve_report_projection(fields)
                 
-                if start_date:
-                    try:
-                        start_datetime = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                        query_filter["start_time"] = {"$gte": start_datetime}
-                    except ValueError:
-                        raise HTTPException(status_code=400, detail="Invalid start_date format. Use ISO format.")
+                count_mode = count or ("none" if cursor else "exact")
+                if count_mode not in ("exact", "estimated", "none"):
+                    raise HTTPException(status_code=400, detail="count must be one of: exact, estimated, none")
+                
+                # Total count for pagination (optional, see count_mode)
+                total_count = await self.count_reports(query_filter, count_mode)
+                
+                # Keyset pagination: continue strictly after the last (created_at, _id) seen
+                page_filter = query_filter
+                if cursor:
+                    last_created_at, last_id = self.decode_report_cursor(cursor)
+                    page_filter = dict(query_filter)
+                    page_filter["$or"] = [
+                        {"created_at": {"$lt": last_created_at}},
+                        {"created_at": last_created_at, "_id": {"$lt": last_id}}
+                    ]
+                
+                # Fetch one extra document to know whether another page exists
+                results = collection.find(page_filter, projection).sort([("created_at", -1), ("_id", -1)])
+                if not cursor and skip:
+                    results = results.skip(skip)
+                results = results.limit(limit + 1)
                 
-                if end_date:
-                    try:
-                        end_datetime = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                        if "start_time" in query_filter:
-                            query_filter["start_time"]["$lte"] = end_datetime
-                        else:
-                            query_filter["start_time"] = {"$lte": end_datetime}
-                    except ValueError:
-                        raise HTTPException(status_code=400, detail="Invalid end_date format. Use ISO format.")
-                
-                # Get total count for pagination
-                total_count = await collection.count_documents(query_filter)
-                
-                # Get paginated results
-                cursor = collection.find(query_filter).sort("created_at", -1).skip(skip).limit(limit)
                 reports = []
+                next_cursor = None
+                last_created_at = last_object_id = None
                 
-                async for doc in cursor:
-                    # Convert ObjectId to string
-                    doc["_id"] = str(doc["_id"])
+                async for doc in results:
+                    if len(reports) == limit:
+                        next_cursor = self.encode_report_cursor(last_created_at, last_object_id)
+                        break
                     
-                    # Convert datetime objects to ISO strings
-                    if "start_time" in doc and isinstance(doc["start_time"], datetime):
-                        doc["start_time"] = doc["start_time"].isoformat()
-                    if "end_time" in doc and isinstance(doc["end_time"], datetime):
-                        doc["end_time"] = doc["end_time"].isoformat()
-                    if "created_at" in doc and isinstance(doc["created_at"], datetime):
-                        doc["created_at"] = doc["created_at"].isoformat()
+                    last_created_at = doc.get("created_at")
+                    last_object_id = doc["_id"]
                     
-                    reports.append(doc)
+                    reports.append(self.serialize_report_doc(doc))
+                
+                pagination = {
+                    "total": total_count,
+                    "total_is_estimate": count_mode == "estimated",
+                    "limit": limit,
+                    "next_cursor": next_cursor,
+                    "has_more": next_cursor is not None
+                }
+                if not cursor:
+                    pagination["skip"] = skip
+                    pagination["page"] = (skip // limit) + 1
+                    if total_count is not None:
+                        pagination["total_pages"] = (total_count + limit - 1) // limit
                 
                 return {
                     "reports": reports,
-                    "pagination": {
-                        "total": total_count,
-                        "limit": limit,
-                        "skip": skip,
-                        "page": (skip // limit) + 1,
-                        "total_pages": (total_count + limit - 1) // limit
-                    },
+                    "pagination": pagination,
+                    "fields": [field for field in projection if field != "_id"],
                     "filters_applied": {
                         "candidate_name": candidate_name,
                         "exam_name": exam_name,
@@ -410,13 +729,61 @@ class VideoProctorAPI:
                     "timestamp": datetime.now().isoformat()
                 }
                 
+            except HTTPException:
+                raise
             except Exception as e:
                 print(f"Error fetching reports: {e}")
                 raise HTTPException(status_code=500, detail=f"Error fetching reports: {str(e)}")
         
+        @self.app.get("/api/reports/export")
+        async def export_reports(
+            format: str = "ndjson",
+            fields: Optional[str] = None,
+            batch_size: int = DEFAULT_EXPORT_BATCH_SIZE,
+            candidate_name: Optional[str] = None,
+            exam_name: Optional[str] = None,
+            start_date: Optional[str] = None,
+            end_date: Optional[str] = None
+        ):
+            """Stream all matching reports as NDJSON or CSV.
+
+            Takes the same filters and ``fields`` selection as /api/reports. The
+            Motor cursor is read ``batch_size`` documents at a time and written out
+            as it goes, so memory stays flat regardless of the number of reports.
+            """
+            if format not in ("ndjson", "csv"):
+                raise HTTPException(status_code=400, detail="format must be one of: ndjson, csv")
+            
+            if batch_size < 1 or batch_size > MAX_EXPORT_BATCH_SIZE:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"batch_size must be between 1 and {MAX_EXPORT_BATCH_SIZE}"
+                )
+            
+            query_filter = self.build_report_filter(candidate_name, exam_name, start_date, end_date)
+            projection = self.resolve_report_projection(fields)
+            
+            cursor = collection.find(
+                query_filter, projection, batch_size=batch_size
+            ).sort([("created_at", -1), ("_id", -1)])
+            
+            if format == "csv":
+                body = self.export_reports_csv(cursor, list(projection))
+                media_type = "text/csv"
+            else:
+                body = self.export_reports_ndjson(cursor)
+                media_type = "application/x-ndjson"
+            
+            filename = f"reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+            return StreamingResponse(
+                body,
+                media_type=media_type,
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            )
+        
         @self.app.get("/api/reports/{report_id}")
-        async def get_report_by_id(report_id: str):
-            """Get a specific report by database ID"""
+        async def get_report_by_id(report_id: str, if_none_match: Optional[str] = Header(None)):
+            """Get a specific report by database ID (304 when If-None-Match has its ETag)"""
             try:
                 from bson import ObjectId
                 
@@ -424,27 +791,40 @@ class VideoProctorAPI:
                 if not ObjectId.is_valid(report_id):
                     raise HTTPException(status_code=400, detail="Invalid report ID format")
                 
+                cached = self.report_cache.get(report_id)
+                if cached is not None:
+                    return self.report_response(*cached, if_none_match)
+                
                 report = await collection.find_one({"_id": ObjectId(report_id)})
                 
                 if not report:
                     raise HTTPException(status_code=404, detail="Report not found")
                 
-                # Convert ObjectId to string
-                report["_id"] = str(report["_id"])
+                # Archived reports are read back from their archive block
+                if report.get("archive"):
+                    archived_at = report.get("archived_at")
+                    report = await asyncio.get_running_loop().run_in_executor(
+                        None, self.archive.load, report["archive"], report["_id"]
+                    )
+                    if report is None:
+                        raise HTTPException(status_code=500, detail="Archived report data is missing")
+                    report["archived_at"] = archived_at.isoformat() if archived_at else None
                 
-                # Convert datetime objects to ISO strings
-                if "start_time" in report and isinstance(report["start_time"], datetime):
-                    report["start_time"] = report["start_time"].isoformat()
-                if "end_time" in report and isinstance(report["end_time"], datetime):
-                    report["end_time"] = report["end_time"].isoformat()
-                if "created_at" in report and isinstance(report["created_at"], datetime):
-                    report["created_at"] = report["created_at"].isoformat()
+                # Reports saved before alert buckets still embed their alerts
+                if "alerts" not in report:
+                    report["alerts"] = await self.alert_store.load(report["_id"])
                 
-                return {
-                    "report": report,
-                    "timestamp": datetime.now().isoformat()
-                }
+                # The ETag covers the report only, so it survives cache refreshes
+                report_json = json.dumps(jsonable_encoder(self.serialize_report_doc(report))).encode()
+                etag = make_etag(report_json)
+                body = b'{"report": ' + report_json + b', "timestamp": ' + \
+                    json.dumps(datetime.now().isoformat()).encode() + b'}'
+                self.report_cache.put(report_id, body, etag)
                 
+                return self.report_response(body, etag, if_none_match)
+                
+            except HTTPException:
+                raise
             except Exception as e:
                 print(f"Error fetching report by ID: {e}")
                 raise HTTPException(status_code=500, detail=f"Error fetching report: {str(e)}")
@@ -459,11 +839,19 @@ class VideoProctorAPI:
                 if not ObjectId.is_valid(report_id):
                     raise HTTPException(status_code=400, detail="Invalid report ID format")
                 
-                result = await collection.delete_one({"_id": ObjectId(report_id)})
+                # An archived report is also removed from its archive block
+                deleted = await self.archive.delete_report(
+                    ObjectId(report_id),
+                    projection={"status": 1, "integrity_score": 1, "alert_summary": 1, "created_at": 1}
+                )
                 
-                if result.deleted_count == 0:
+                if deleted is None:
                     raise HTTPException(status_code=404, detail="Report not found")
                 
+                await self.report_stats.record_delete(deleted)
+                await self.alert_store.delete(deleted["_id"])
+                self.report_cache.invalidate(report_id)
+                
                 return {
                     "message": "Report deleted successfully",
                     "report_id": report_id,
@@ -474,52 +862,94 @@ class VideoProctorAPI:
                 print(f"Error deleting report: {e}")
                 raise HTTPException(status_code=500, detail=f"Error deleting report: {str(e)}")
         
+        @self.app.post("/api/reports/{report_id}/rescore")
+        async def rescore_report(report_id: str, request: RescoreRequest):
+            """Recompute a report's statistics and integrity score from its stored per-frame features"""
+            try:
+                from bson import ObjectId
+                
+                if not ObjectId.is_valid(report_id):
+                    raise HTTPException(status_code=400, detail="Invalid report ID format")
+                
+                report = await collection.find_one(
+                    {"_id": ObjectId(report_id)},
+                    {"session_id": 1, "features_key": 1, "integrity_score": 1, "detection_report.statistics": 1,
+                     "detection_report.cheating_detected": 1, "archive": 1}
+                )
+                if not report:
+                    raise HTTPException(status_code=404, detail="Report not found")
+                if report.get("archive"):
+                    raise HTTPException(status_code=409, detail="Archived reports cannot be rescored")
+                
+                # Reports saved before features were keyed by report id used the session id
+                features_key = report.get("features_key") or report.get("session_id", "")
+                if not self.feature_store.exists(features_key):
+                    raise HTTPException(status_code=404, detail="No stored features for this report")
+                
+                started = time.perf_counter()
+                rows, metadata = await asyncio.get_running_loop().run_in_executor(
+                    None, self.feature_store.load, features_key
+                )
+                rescored = rescore_features(
+                    rows, metadata,
+                    detection_threshold=request.detection_threshold,
+                    mobile_threshold=request.mobile_threshold
+                )
+                integrity_score = self.calculate_integrity_score(rescored)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                
+                if request.save:
+                    await collection.update_one(
+                        {"_id": report["_id"]},
+                        {"$set": {
+                            "detection_report.face_detection_rate": rescored["face_detection_rate"],
+                            "detection_report.statistics": rescored["statistics"],
+                            "detection_report.cheating_detected": rescored["cheating_detected"],
+                            "integrity_score": integrity_score,
+                            "rescored_at": datetime.now(),
+                            "rescore_thresholds": rescored["thresholds"]
+                        }}
+                    )
+                    await self.report_stats.record_score_change(
+                        integrity_score - (report.get("integrity_score") or 0)
+                    )
+                    self.report_cache.invalidate(report_id)
+                
+                previous = report.get("detection_report", {})
+                return {
+                    "report_id": report_id,
+                    "session_id": report.get("session_id", ""),
+                    "frames": len(rows),
+                    "previous": {
+                        "integrity_score": report.get("integrity_score"),
+                        "statistics": previous.get("statistics"),
+                        "cheating_detected": previous.get("cheating_detected")
+                    },
+                    "rescored": {
+                        "integrity_score": integrity_score,
+                        "statistics": rescored["statistics"],
+                        "cheating_detected": rescored["cheating_detected"],
+                        "thresholds": rescored["thresholds"]
+                    },
+                    "saved": request.save,
+                    "elapsed_ms": round(elapsed_ms, 3),
+                    "timestamp": datetime.now().isoformat()
+                }
+                
+            except HTTPException:
+                raise
+            except Exception as e:
+                print(f"Error rescoring report: {e}")
+                raise HTTPException(status_code=500, detail=f"Error rescoring report: {str(e)}")
+        
         @self.app.get("/api/reports/stats/summary")
         async def get_reports_summary():
             """Get summary statistics of all reports"""
             try:
-                # Get total reports count
-                total_reports = await collection.count_documents({})
-                
-                # Get reports by status
-                pipeline_status = [
-                    {"$group": {"_id": "$status", "count": {"$sum": 1}}}
-                ]
-                status_stats = []
-                async for doc in collection.aggregate(pipeline_status):
-                    status_stats.append({"status": doc["_id"], "count": doc["count"]})
-                
-                # Get average integrity score
-                pipeline_integrity = [
-                    {"$group": {"_id": None, "avg_integrity": {"$avg": "$integrity_score"}}}
-                ]
-                avg_integrity = 0
-                async for doc in collection.aggregate(pipeline_integrity):
-                    avg_integrity = round(doc["avg_integrity"], 2)
-                
-                # Get recent reports (last 7 days)
-                seven_days_ago = datetime.now() - timedelta(days=7)
-                recent_reports = await collection.count_documents({"created_at": {"$gte": seven_days_ago}})
-                
-                # Get top alert types
-                pipeline_alerts = [
-                    {"$unwind": "$alerts"},
-                    {"$group": {"_id": "$alerts.type", "count": {"$sum": 1}}},
-                    {"$sort": {"count": -1}},
-                    {"$limit": 5}
-                ]
-                top_alerts = []
-                async for doc in collection.aggregate(pipeline_alerts):
-                    top_alerts.append({"type": doc["_id"], "count": doc["count"]})
+                summary = await self.report_stats.get_summary()
                 
                 return {
-                    "summary": {
-                        "total_reports": total_reports,
-                        "recent_reports_7_days": recent_reports,
-                        "average_integrity_score": avg_integrity,
-                        "reports_by_status": status_stats,
-                        "top_alert_types": top_alerts
-                    },
+                    "summary": summary,
                     "timestamp": datetime.now().isoformat()
                 }
                 
@@ -555,6 +985,19 @@ class VideoProctorAPI:
                 "timestamp": datetime.now().isoformat()
             }
         
+        @self.app.get("/api/sessions/memory")
+        async def sessions_memory():
+            """Approximate per-session memory and the process resident set size"""
+            sessions = [self.session_memory_usage(session_id) for session_id in list(self.active_sessions)]
+            
+            return {
+                "sessions": sessions,
+                "total_session_bytes": sum(item["total_bytes"] for item in sessions),
+                "live_detectors": len(self.detection_systems),
+                "process_rss_bytes": get_process_rss(),
+                "timestamp": datetime.now().isoformat()
+            }
+        
         @self.app.delete("/api/session/{session_id}")
         async def delete_session(session_id: str):
             """Delete a session"""
@@ -563,11 +1006,12 @@ class VideoProctorAPI:
             
             try:
                 # Clean up detection system if still active
-                if session_id in self.detection_systems:
-                    del self.detection_systems[session_id]
+                async with self.analysis_lock(session_id):
+                    self.release_detector(session_id)
                 
                 # Remove session
                 del self.active_sessions[session_id]
+                self.monitor.remove(session_id)
                 
                 return {
                     "message": "Session deleted successfully",
@@ -578,6 +1022,401 @@ class VideoProctorAPI:
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Error deleting session: {str(e)}")
     
+    def analysis_lock(self, session_id: str) -> asyncio.Lock:
+        """Lock serializing frame analysis and finalization of a session's detector"""
+        return self.analysis_locks.setdefault(session_id, asyncio.Lock())
+    
+    async def finalize_session(self, session_id: str, status: str = "completed") -> Optional[dict]:
+        """
+        Generate the final report of a session, save it and free its detector
+        
+        Returns:
+            Report, integrity score and database id, or None if the session was
+            ended (or removed) by someone else in the meantime
+        """
+        # Wait for a frame still being analyzed; frames after it find the detector gone
+        async with self.analysis_lock(session_id):
+            session = self.active_sessions.get(session_id)
+            if session is None or "final_report" in session or session_id not in self.detection_systems:
+                return None
+            return await self.finalize_locked_session(session_id, status)
+    
+    async def finalize_locked_session(self, session_id: str, status: str) -> dict:
+        """finalize_session, with the session's analysis lock held"""
+        session = self.active_sessions[session_id]
+        detector = self.detection_systems[session_id]
+        
+        # Close the open alert episodes and pass their final state on
+        detector.close_alert_episodes()
+        closed_alerts = self.get_recent_alerts(detector)
+        session["alerts"] = merge_alert_episodes(session["alerts"], closed_alerts, limit=100)
+        self.monitor.publish(session_id, alerts=closed_alerts)
+        
+        # Generate final report
+        report = detector.generate_report()
+        
+        # Calculate integrity score
+        integrity_score = self.calculate_integrity_score(report)
+        
+        # The report id is chosen here, so its features and alerts can be stored under it
+        from bson import ObjectId
+        report_id = ObjectId()
+        
+        # Persist per-frame features off the event loop; session ids come from
+        # clients and can repeat, so the file is keyed by the report
+        features_key = None
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.feature_store.save,
+                str(report_id), detector.timeline.to_array(),
+                dict(detector.feature_metadata(), session_id=session_id)
+            )
+            features_key = str(report_id)
+        except Exception as e:
+            print(f"Error saving features for session {session_id}: {e}")
+        
+        # Update session status
+        session["status"] = status
+        session["end_time"] = datetime.now()
+        session["final_report"] = report
+        session["integrity_score"] = integrity_score
+        
+        # Prepare report data for database; the alerts are stored once, in alert buckets
+        report_data = {
+            "_id": report_id,
+            "session_id": session_id,
+            "candidate_name": session["candidate_name"],
+            "exam_name": session.get("exam_name", ""),
+            "start_time": session["start_time"],
+            "end_time": session["end_time"],
+            "status": session["status"],
+            "detection_report": {key: value for key, value in report.items() if key != "alerts"},
+            "integrity_score": integrity_score,
+            "stats": session["stats"],
+            "alert_summary": report["alert_summary"],
+            "created_at": datetime.now(),
+            "duration_seconds": (session["end_time"] - session["start_time"]).total_seconds(),
+            "features_saved": features_key is not None,
+            "features_key": features_key
+        }
+        
+        # Save to database
+        try:
+            result = await collection.insert_one(report_data)
+            database_id = str(result.inserted_id)
+            print(f"Report saved to database with ID: {database_id}")
+        except Exception as db_error:
+            print(f"Error saving to database: {db_error}")
+            # Continue even if database save fails
+            database_id = None
+        
+        if database_id is not None:
+            # The report is stored either way; report_stats.py rebuild repairs the counters
+            try:
+                await self.report_stats.record_insert(report_data)
+            except Exception as stats_error:
+                print(f"Error updating report statistics for {database_id}: {stats_error}")
+            
+            try:
+                await self.alert_store.save(report_id, session_id, report["alerts"])
+            except Exception as db_error:
+                print(f"Error saving alerts of report {database_id}: {db_error}")
+        
+        session["database_id"] = database_id
+        
+        self.monitor.publish(
+            session_id,
+            status=status,
+            end_time=session["end_time"].isoformat(),
+            integrity_score=integrity_score,
+            database_id=database_id
+        )
+        
+        # Clean up detector
+        self.release_detector(session_id)
+        
+        return {
+            "report": report,
+            "integrity_score": integrity_score,
+            "database_id": database_id
+        }
+    
+    def release_detector(self, session_id: str):
+        """
+        Drop the detection system of a session and the memory it holds
+        
+        Callers hold the session's analysis lock, so no frame is being analyzed.
+        """
+        detector = self.detection_systems.pop(session_id, None)
+        self.analysis_locks.pop(session_id, None)
+        if detector is not None:
+            detector.release()
+            if self.recorder is not None:
+                self.recorder.close(session_id)
+        self.capacity.forget(session_id)
+    
+    def analysis_fps_budget(self) -> float:
+        """Frames per second each live session can be analyzed at, at most TARGET_ANALYSIS_FPS"""
+        live_sessions = max(len(self.detection_systems), 1)
+        budget = self.capacity.cores / max(self.capacity.frame_cost * live_sessions, 1e-9)
+        return max(min(self.target_analysis_fps, budget), 1.0)
+    
+    def client_frame_settings(self, detector) -> tuple:
+        """
+        Frame rate, size and JPEG quality a session's client should send
+        
+        Returns:
+            (fps, width, height, quality); below the target rate frames are
+            sized to the face detector input and more strongly compressed
+        """
+        fps = self.analysis_fps_budget()
+        if fps < self.target_analysis_fps:
+            width, height = detector.requested_frame_size(scale=1.0)
+            return fps, width, height, min(self.client_jpeg_quality, 60)
+        width, height = detector.requested_frame_size(scale=self.client_frame_scale)
+        return fps, width, height, self.client_jpeg_quality
+    
+    async def wait_for_capacity(self, wait: float) -> bool:
+        """Whether a new session can be admitted, polling for up to ``wait`` seconds"""
+        deadline = time.monotonic() + wait
+        while not self.capacity.can_admit(len(self.detection_systems)):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(0.5, remaining))
+        return True
+    
+    async def reap_sessions(self):
+        """
+        Single reaper pass over active_sessions.
+        
+        Active sessions without a frame for ``session_idle_ttl`` seconds are
+        saved with status "abandoned" and their detector is freed. Ended
+        sessions are forgotten ``session_completed_ttl`` seconds after they end.
+        """
+        now = datetime.now()
+        
+        for session_id, session in list(self.active_sessions.items()):
+            if "final_report" not in session:
+                idle_seconds = (now - session.get("last_activity", session["start_time"])).total_seconds()
+                if idle_seconds > self.session_idle_ttl and session_id in self.detection_systems:
+                    print(f"Reaping idle session {session_id} (idle {idle_seconds:.0f}s)")
+                    try:
+                        await self.finalize_session(session_id, status="abandoned")
+                    except Exception as e:
+                        print(f"Error finalizing idle session {session_id}: {e}")
+                        async with self.analysis_lock(session_id):
+                            self.release_detector(session_id)
+            elif (now - session["end_time"]).total_seconds() > self.session_completed_ttl:
+                print(f"Removing ended session {session_id}")
+                async with self.analysis_lock(session_id):
+                    self.release_detector(session_id)
+                self.active_sessions.pop(session_id, None)
+                self.monitor.remove(session_id)
+                if self.recorder is not None:
+                    self.recorder.forget(session_id)
+    
+    async def run_session_reaper(self):
+        """Run reap_sessions every ``session_reap_interval`` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(self.session_reap_interval)
+            try:
+                await self.reap_sessions()
+            except Exception as e:
+                print(f"Error in session reaper: {e}")
+    
+    def live_integrity_score(self, session_id: str) -> Optional[int]:
+        """Current integrity score of a session, from its detector while it is running"""
+        detector = self.detection_systems.get(session_id)
+        if detector is not None:
+            return self.calculate_integrity_score(detector.generate_report(include_timeline=False))
+        session = self.active_sessions.get(session_id)
+        return session.get("integrity_score") if session else None
+    
+    def session_memory_usage(self, session_id: str) -> dict:
+        """Approximate memory held by one session (session record and detector buffers)"""
+        session = self.active_sessions[session_id]
+        usage = {
+            "session_id": session_id,
+            "status": session["status"],
+            "alerts_held": len(session.get("alerts", [])),
+            "session_bytes": approximate_size(session)
+        }
+        
+        detector = self.detection_systems.get(session_id)
+        if detector is not None:
+            usage["detector"] = detector.memory_usage()
+            usage["total_bytes"] = usage["session_bytes"] + usage["detector"]["total_bytes"]
+        else:
+            usage["detector"] = None
+            usage["total_bytes"] = usage["session_bytes"]
+        
+        return usage
+    
+    def build_report_filter(
+        self,
+        candidate_name: Optional[str] = None,
+        exam_name: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> dict:
+        """Build the Mongo filter shared by the report listing and export"""
+        query_filter = {}
+        
+        if candidate_name:
+            query_filter["candidate_name"] = {"$regex": candidate_name, "$options": "i"}
+        
+        if exam_name:
+            query_filter["exam_name"] = {"$regex": exam_name, "$options": "i"}
+        
+        if start_date:
+            try:
+                start_datetime = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+                query_filter["start_time"] = {"$gte": start_datetime}
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid start_date format. Use ISO format.")
+        
+        if end_date:
+            try:
+                end_datetime = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+                if "start_time" in query_filter:
+                    query_filter["start_time"]["$lte"] = end_datetime
+                else:
+                    query_filter["start_time"] = {"$lte": end_datetime}
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid end_date format. Use ISO format.")
+        
+        return query_filter
+    
+    def resolve_report_projection(self, fields: Optional[str]) -> dict:
+        """Build the Mongo projection for a report listing from a ?fields= value"""
+        if not fields:
+            selected = REPORT_SUMMARY_FIELDS
+        else:
+            selected = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = [field for field in selected if field not in LISTABLE_REPORT_FIELDS]
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown or non-listable fields: {', '.join(unknown)}"
+                )
+        
+        # created_at is always needed to build the pagination cursor
+        projection = {"_id": 1, "created_at": 1}
+        for field in selected:
+            projection[field] = 1
+        return projection
+    
+    def report_response(self, body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+        """Serialized report, or 304 Not Modified when the client already has this ETag"""
+        # no-cache: browsers keep the report but revalidate it, which costs a 304
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    def serialize_report_doc(self, doc: dict) -> dict:
+        """Make a stored report JSON friendly (ObjectId and top-level datetimes to strings)"""
+        doc["_id"] = str(doc["_id"])
+        for field in REPORT_DATETIME_FIELDS:
+            value = doc.get(field)
+            if isinstance(value, datetime):
+                doc[field] = value.isoformat()
+        return doc
+    
+    async def export_reports_ndjson(self, cursor):
+        """Yield reports from a Motor cursor as NDJSON chunks"""
+        chunk = io.StringIO()
+        exported = 0
+        try:
+            async for doc in cursor:
+                chunk.write(json.dumps(self.serialize_report_doc(doc), default=str))
+                chunk.write("\n")
+                exported += 1
+                
+                # Send the first report right away, then fill chunks
+                if exported == 1 or chunk.tell() >= EXPORT_CHUNK_BYTES:
+                    yield chunk.getvalue().encode()
+                    chunk = io.StringIO()
+            
+            if chunk.tell():
+                yield chunk.getvalue().encode()
+        except Exception as e:
+            print(f"Error exporting reports after {exported} documents: {e}")
+            raise
+    
+    async def export_reports_csv(self, cursor, columns: List[str]):
+        """Yield reports from a Motor cursor as CSV chunks, one column per projected field"""
+        chunk = io.StringIO()
+        writer = csv.writer(chunk)
+        writer.writerow(columns)
+        
+        # Header goes out before the first document is read
+        yield chunk.getvalue().encode()
+        chunk.seek(0)
+        chunk.truncate()
+        
+        exported = 0
+        try:
+            async for doc in cursor:
+                doc = self.serialize_report_doc(doc)
+                row = []
+                for column in columns:
+                    value = doc
+                    for part in column.split("."):
+                        value = value.get(part) if isinstance(value, dict) else None
+                    if isinstance(value, (dict, list)):
+                        value = json.dumps(value, default=str)
+                    row.append("" if value is None else value)
+                writer.writerow(row)
+                exported += 1
+                
+                if chunk.tell() >= EXPORT_CHUNK_BYTES:
+                    yield chunk.getvalue().encode()
+                    chunk.seek(0)
+                    chunk.truncate()
+            
+            if chunk.tell():
+                yield chunk.getvalue().encode()
+        except Exception as e:
+            print(f"Error exporting reports after {exported} documents: {e}")
+            raise
+    
+    async def count_reports(self, query_filter: dict, count_mode: str) -> Optional[int]:
+        """Count reports matching a filter according to the requested count mode"""
+        if count_mode == "none":
+            return None
+        if count_mode == "estimated":
+            if not query_filter:
+                # Answered from collection metadata, no scan
+                return await collection.estimated_document_count()
+            return await collection.count_documents(query_filter, limit=ESTIMATED_COUNT_CAP)
+        return await collection.count_documents(query_filter)
+    
+    def encode_report_cursor(self, created_at: datetime, object_id) -> str:
+        """Encode the (created_at, _id) position of the last listed report as an opaque cursor"""
+        position = {
+            "created_at": created_at.isoformat() if isinstance(created_at, datetime) else None,
+            "id": str(object_id)
+        }
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+    
+    def decode_report_cursor(self, cursor: str):
+        """Decode a cursor produced by encode_report_cursor into (created_at, ObjectId)"""
+        from bson import ObjectId
+        
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            created_at = position["created_at"]
+            if created_at is not None:
+                created_at = datetime.fromisoformat(created_at)
+            if not ObjectId.is_valid(position["id"]):
+                raise ValueError("invalid id")
+            return created_at, ObjectId(position["id"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    
     def update_session_stats(self, session_id: str, detector):
         """Update session statistics"""
         session = self.active_sessions[session_id]
@@ -610,7 +1449,7 @@ class VideoProctorAPI:
         return alerts
     
     def get_alert_summary(self, alerts: List[dict]) -> dict:
-        """Generate alert type summary"""
+        """Count alert episodes by type"""
         summary = {}
         for alert in alerts:
             alert_type = alert.get("type", "Unknown")
@@ -619,43 +1458,7 @@ class VideoProctorAPI:
     
     def calculate_integrity_score(self, report: dict) -> int:
         """Calculate integrity score based on detection results"""
-        base_score = 100
-        
-        # Get statistics
-        stats = report.get("statistics", {})
-        
-        # Looking away deductions
-        looking_away_pct = stats.get("looking_away_percentage", 0)
-        if looking_away_pct > 20:
-            base_score -= min(30, int(looking_away_pct))
-        elif looking_away_pct > 10:
-            base_score -= min(15, int(looking_away_pct / 2))
-        
-        # Mobile phone deductions
-        mobile_pct = stats.get("mobile_detection_percentage", 0)
-        if mobile_pct > 5:
-            base_score -= min(25, int(mobile_pct * 2))
-        elif mobile_pct > 2:
-            base_score -= min(10, int(mobile_pct))
-        
-        # Multiple people deductions
-        multiple_people_pct = stats.get("multiple_people_percentage", 0)
-        if multiple_people_pct > 2:
-            base_score -= min(20, int(multiple_people_pct * 5))
-        
-        # No face deductions (less severe, could be technical issues)
-        no_face_pct = stats.get("no_face_percentage", 0)
-        if no_face_pct > 15:
-            base_score -= min(15, int(no_face_pct / 2))
-        elif no_face_pct > 30:
-            base_score -= min(25, int(no_face_pct / 3))
-        
-        # Bonus for good face detection rate
-        face_detection_rate = report.get("face_detection_rate", 0)
-        if face_detection_rate > 90:
-            base_score += 5
-        
-        return max(0, min(100, base_score))
+        return calculate_integrity_score(report)
 
 # Initialize the API
 api = VideoProctorAPI()
@@ -666,12 +1469,15 @@ if __name__ == "__main__":
     print("Starting Video Proctoring API...")
     print("API will be available at: http://localhost:8000")
     print("WebSocket endpoint: ws://localhost:8000/ws/{session_id}")
+    print("Monitor endpoint: ws://localhost:8000/ws/monitor?exam={exam_name}")
     print("API docs: http://localhost:8000/docs")
     print("New endpoints:")
     print("  GET /api/reports - Get all reports with filtering")
     print("  GET /api/reports/{report_id} - Get specific report")
     print("  DELETE /api/reports/{report_id} - Delete specific report")
     print("  GET /api/reports/stats/summary - Get summary statistics")
+    print("  GET /api/reports/export - Stream reports as NDJSON or CSV")
+    print("  GET /api/capacity - Session capacity of this node")
     
     uvicorn.run(
         "server:app", 
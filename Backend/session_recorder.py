@@ -0,0 +1,277 @@
+import os
+import re
+import sys
+import mmap
+import time
+import json
+import queue
+import hashlib
+import argparse
+import threading
+import cv2
+import numpy as np
+
+# One index record per frame: receive time, byte offset and length in the segment file
+INDEX_DTYPE = np.dtype([
+    ('t', '<f8'),
+    ('offset', '<u8'),
+    ('length', '<u4'),
+])
+
+_CLOSE = object()
+_STOP = object()
+
+
+def recording_path(directory, session_id):
+    """Path prefix of a session's files; session ids come from clients, so they are sanitized"""
+    safe_id = re.sub(r'[^A-Za-z0-9_-]', '_', session_id)[:64]
+    digest = hashlib.sha1(session_id.encode()).hexdigest()[:8]
+    return os.path.join(directory, f"{safe_id}_{digest}")
+
+
+class SessionRecorder:
+    """
+    Records the raw JPEG frames received for each session.
+
+    Every session gets an append-only ``.seg`` file with the frame bytes back
+    to back and an ``.idx`` file of fixed-size INDEX_DTYPE records. All files
+    are written by one background thread; record() never blocks, and frames
+    arriving while ``max_pending`` frames are still queued are dropped (and
+    counted) instead. Frames of a session recorded after close() are ignored
+    until start() is called for it again.
+    """
+
+    def __init__(self, directory='recordings', max_pending=256):
+        self.directory = directory
+        self.max_pending = max_pending
+        # Unbounded so close/stop never block; record() enforces max_pending for frames
+        self.pending = queue.Queue()
+        self.dropped_frames = 0
+        self.recorded_frames = 0
+        self.files = {}  # session_id -> (segment file, index file, next offset)
+        # Sessions closed since their last start(); guarded by lock so no frame
+        # is queued behind a session's close and reopens its files
+        self.closed = set()
+        self.lock = threading.Lock()
+
+        self.writer = threading.Thread(target=self.write_loop, name='session-recorder', daemon=True)
+        self.writer.start()
+
+    def record(self, session_id, frame_bytes, t=None):
+        """Queue one frame of a session for writing; safe to call from any thread"""
+        with self.lock:
+            if session_id in self.closed:
+                return
+            if self.pending.qsize() >= self.max_pending:
+                self.dropped_frames += 1
+                return
+            self.pending.put_nowait((session_id, time.time() if t is None else t, frame_bytes))
+
+    def start(self, session_id):
+        """Accept frames of a session again after close(), e.g. when its id is reused"""
+        with self.lock:
+            self.closed.discard(session_id)
+
+    def close(self, session_id):
+        """Flush and close the files of a session once its queued frames are written"""
+        with self.lock:
+            self.closed.add(session_id)
+            self.pending.put((_CLOSE, session_id, None))
+
+    def forget(self, session_id):
+        """Drop the closed mark of a session no frame can arrive for anymore"""
+        with self.lock:
+            self.closed.discard(session_id)
+
+    def stop(self):
+        """Write everything queued, close all files and stop the writer thread"""
+        self.pending.put((_STOP, None, None))
+        self.writer.join()
+
+    def open_files(self, session_id):
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = recording_path(self.directory, session_id)
+        segment = open(prefix + ".seg", 'ab')
+        index = open(prefix + ".idx", 'ab')
+        entry = [segment, index, segment.tell()]
+        self.files[session_id] = entry
+        return entry
+
+    def close_files(self, session_id):
+        entry = self.files.pop(session_id, None)
+        if entry is not None:
+            entry[0].close()
+            entry[1].close()
+
+    def write_loop(self):
+        while True:
+            first, second, frame_bytes = self.pending.get()
+            if first is _STOP:
+                for session_id in list(self.files):
+                    self.close_files(session_id)
+                return
+            if first is _CLOSE:
+                self.close_files(second)
+                continue
+
+            session_id, t = first, second
+            try:
+                entry = self.files.get(session_id) or self.open_files(session_id)
+                segment, index, offset = entry
+                segment.write(frame_bytes)
+                # The segment bytes go first, so an index record never points past the data
+                segment.flush()
+                index.write(np.array([(t, offset, len(frame_bytes))], dtype=INDEX_DTYPE).tobytes())
+                index.flush()
+                entry[2] = offset + len(frame_bytes)
+                self.recorded_frames += 1
+            except Exception as e:
+                print(f"Error recording frame for session {session_id}: {e}")
+
+
+class SessionRecording:
+    """
+    Memory-mapped reader of a recorded session.
+
+    Index records whose bytes are not (yet) completely in the segment file,
+    e.g. after a crash, are ignored.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        index = np.fromfile(prefix + ".idx", dtype=INDEX_DTYPE)
+
+        self.segment_file = open(prefix + ".seg", 'rb')
+        size = os.fstat(self.segment_file.fileno()).st_size
+        self.segment = mmap.mmap(self.segment_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        self.index = index[index['offset'] + index['length'] <= size]
+        self.start_time = float(self.index['t'][0]) if len(self.index) else 0.0
+
+    @classmethod
+    def open(cls, directory, session_id):
+        return cls(recording_path(directory, session_id))
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def duration(self):
+        return float(self.index['t'][-1]) - self.start_time if len(self.index) else 0.0
+
+    def close(self):
+        if isinstance(self.segment, mmap.mmap):
+            try:
+                self.segment.close()
+            except BufferError:
+                # Frames from frames() are still referenced; the mapping is
+                # removed once the last of them is garbage collected
+                pass
+            self.segment = b""
+        self.segment_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def frames(self, start=None, end=None):
+        """
+        Yield (seconds since the first frame, JPEG bytes) of a time range
+
+        The JPEG bytes are memoryviews into the mapped segment file; copy
+        them (``bytes(frame)``) to keep a frame after the recording is closed.
+
+        Args:
+            start: First second to replay, default the beginning
+            end: Last second to replay, default the end
+        """
+        times = self.index['t'] - self.start_time
+        first = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        last = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+
+        view = memoryview(self.segment)
+        offsets = self.index['offset'][first:last].tolist()
+        lengths = self.index['length'][first:last].tolist()
+        try:
+            for t, offset, length in zip(times[first:last].tolist(), offsets, lengths):
+                yield t, view[offset:offset + length]
+        finally:
+            # Also when the caller stops iterating early
+            view.release()
+
+    def replay(self, detector, start=None, end=None):
+        """
+        Feed a time range through a detector as fast as possible
+
+        Returns:
+            (report, throughput) of the replay
+        """
+        started = time.perf_counter()
+        frames = 0
+        for _, frame_bytes in self.frames(start, end):
+            frame = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            detector.process_frame(frame)
+            frames += 1
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        throughput = {
+            'frames_replayed': frames,
+            'elapsed_seconds': round(elapsed, 3),
+            'replay_fps': round(frames / elapsed, 1)
+        }
+        detector.close_alert_episodes()
+        return detector.generate_report(), throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay recorded proctoring sessions")
+    parser.add_argument("command", choices=["info", "replay"])
+    parser.add_argument("session_id", help="Session id (or path prefix of the .seg/.idx files with --path)")
+    parser.add_argument("--dir", default=os.environ.get("RECORDINGS_DIR", "recordings"), help="Recordings directory")
+    parser.add_argument("--path", action="store_true", help="session_id is a path prefix")
+    parser.add_argument("--start", type=float, default=None, help="First second to replay")
+    parser.add_argument("--end", type=float, default=None, help="Last second to replay")
+    parser.add_argument("--output", default=None, help="File for the replay report")
+    args = parser.parse_args()
+
+    prefix = args.session_id if args.path else recording_path(args.dir, args.session_id)
+    if not os.path.exists(prefix + ".idx"):
+        print(f"Error: no recording at {prefix}")
+        return 1
+
+    with SessionRecording(prefix) as recording:
+        print(f"Recording {prefix}: {len(recording)} frames, {recording.duration:.1f}s")
+        if args.command == "info":
+            return 0
+
+        from realtime_detector import CheatDetectionSystem
+        detector = CheatDetectionSystem(
+            model_path='ssd_mobilenet_v2_coco_2018_03_29/saved_model',
+            detection_threshold=0.3,
+            mobile_threshold=0.05
+        )
+        detector.draw_annotations = False
+        detector.real_time_alerts = False
+
+        report, throughput = recording.replay(detector, args.start, args.end)
+        report['replay'] = throughput
+
+    print(f"Replayed {throughput['frames_replayed']} frames in {throughput['elapsed_seconds']}s "
+          f"({throughput['replay_fps']} FPS)")
+    print(f"Face Detection Rate: {report['face_detection_rate']:.1f}%")
+    for name, value in report['statistics'].items():
+        print(f"  {name}: {value:.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import numpy as np
+from datetime import datetime
+
+# Per analyzed frame flags
+FLAG_NO_FACE = 1
+FLAG_MULTIPLE_PEOPLE = 2
+FLAG_LOOKING_AWAY = 4
+FLAG_MOBILE_PHONE = 8
+FLAG_SUSPICIOUS = 16
+
+# Segment names match the alert types used by CheatDetectionSystem
+SEGMENT_TYPES = {
+    FLAG_NO_FACE: "No Face",
+    FLAG_MULTIPLE_PEOPLE: "Multiple People",
+    FLAG_LOOKING_AWAY: "Looking Away",
+    FLAG_MOBILE_PHONE: "Mobile Phone",
+    FLAG_SUSPICIOUS: "Suspicious Behavior",
+}
+
+# Codes stored in the gaze and emotion columns; the index is the code
+GAZE_LABELS = ["Calibrating", "Forward", "Left", "Right"]
+EMOTION_LABELS = ["none", "neutral", "alert", "suspicious", "unknown"]
+
+GAZE_CODES = {label: code for code, label in enumerate(GAZE_LABELS)}
+EMOTION_CODES = {label: code for code, label in enumerate(EMOTION_LABELS)}
+
+# Number of cell phone scores kept per frame (highest first)
+PHONE_SCORE_SLOTS = 4
+
+# One row per analyzed frame, 24 bytes
+TIMELINE_DTYPE = np.dtype([
+    ('t', '<f4'),                # seconds since session start
+    ('frame', '<u4'),            # index of the captured frame
+    ('faces', 'u1'),             # number of faces detected
+    ('gaze', 'u1'),              # GAZE_LABELS code of the primary face
+    ('gaze_confidence', '<f2'),
+    ('emotion', 'u1'),           # EMOTION_LABELS code of the primary face
+    ('looking_away', 'u1'),      # looking_away_frames added by this frame
+    ('suspicious', 'u1'),        # suspicious_emotion_frames added by this frame
+    ('phone_scores', '<f2', (PHONE_SCORE_SLOTS,)),  # best cell phone scores, before mobile_threshold
+    ('flags', 'u1'),             # FLAG_* bits
+])
+
+
+class VoteRingBuffer:
+    """
+    Fixed-size window of small integer codes with running per-code counts,
+    used for majority-vote smoothing in O(1) per update.
+    """
+
+    def __init__(self, size, num_codes):
+        self.size = size
+        self.codes = np.zeros(size, dtype=np.uint8)
+        self.counts = np.zeros(num_codes, dtype=np.int32)
+        self.position = 0
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.counts.nbytes
+
+    def push(self, code):
+        if self.length == self.size:
+            self.counts[self.codes[self.position]] -= 1
+        else:
+            self.length += 1
+        self.codes[self.position] = code
+        self.counts[code] += 1
+        self.position = (self.position + 1) % self.size
+
+    def majority(self):
+        """Return (code, count) of the most frequent code in the window"""
+        code = int(np.argmax(self.counts))
+        return code, int(self.counts[code])
+
+    def clear(self):
+        self.counts[:] = 0
+        self.position = 0
+        self.length = 0
+
+
+class SessionTimeline:
+    """
+    Per analyzed frame signal timeline of a session.
+
+    Rows are TIMELINE_DTYPE records kept in fixed-size chunks, so appending
+    never copies earlier rows. At 24 bytes per row a 3 hour exam analyzed at
+    ~3 FPS takes about 1 MB. Rows past ``max_frames`` are counted in
+    ``dropped_frames`` but not stored.
+    """
+
+    def __init__(self, chunk_size=4096, max_frames=500000):
+        self.chunk_size = chunk_size
+        self.max_frames = max_frames
+        self.chunks = []
+        self.fill = 0
+        self.length = 0
+        self.dropped_frames = 0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def nbytes(self):
+        """Allocated size of the timeline buffers in bytes"""
+        return len(self.chunks) * self.chunk_size * TIMELINE_DTYPE.itemsize
+
+    def append(self, t, frame, faces, gaze, gaze_confidence, emotion,
+               looking_away, suspicious, phone_scores, flags):
+        if self.length >= self.max_frames:
+            self.dropped_frames += 1
+            return
+
+        if not self.chunks or self.fill == self.chunk_size:
+            self.chunks.append(np.zeros(self.chunk_size, dtype=TIMELINE_DTYPE))
+            self.fill = 0
+
+        scores = np.zeros(PHONE_SCORE_SLOTS, dtype=np.float16)
+        top_scores = phone_scores[:PHONE_SCORE_SLOTS]
+        scores[:len(top_scores)] = top_scores
+
+        self.chunks[-1][self.fill] = (
+            t, frame, min(faces, 255), gaze, gaze_confidence, emotion,
+            min(looking_away, 255), min(suspicious, 255), scores, flags
+        )
+        self.fill += 1
+        self.length += 1
+
+    def to_array(self):
+        """Return all recorded rows as one contiguous structured array"""
+        if not self.chunks:
+            return np.zeros(0, dtype=TIMELINE_DTYPE)
+        parts = self.chunks[:-1] + [self.chunks[-1][:self.fill]]
+        return np.concatenate(parts)
+
+    def segments(self, merge_gap=2.0, session_start_time=None):
+        """
+        Contiguous episodes of each flag.
+
+        Args:
+            merge_gap: Runs of the same flag separated by at most this many
+                seconds are merged into one segment
+            session_start_time: Optional epoch time of t=0, adds ISO timestamps
+
+        Returns:
+            List of segments sorted by start time
+        """
+        rows = self.to_array()
+        if len(rows) == 0:
+            return []
+
+        times = rows['t']
+        segments = []
+
+        for flag, segment_type in SEGMENT_TYPES.items():
+            mask = (rows['flags'] & flag) != 0
+            if not mask.any():
+                continue
+
+            # Start/end indices (inclusive) of each run of set flags
+            padded = np.concatenate(([False], mask, [False]))
+            edges = np.flatnonzero(padded[1:] != padded[:-1])
+            starts = edges[0::2]
+            ends = edges[1::2] - 1
+
+            # Merge runs separated by short gaps
+            keep = np.concatenate(([True], times[starts[1:]] - times[ends[:-1]] > merge_gap))
+            merged_starts = starts[keep]
+            merged_ends = np.concatenate((ends[:-1][keep[1:]], ends[-1:]))
+
+            flagged_before = np.concatenate(([0], np.cumsum(mask)))
+            frame_counts = flagged_before[merged_ends + 1] - flagged_before[merged_starts]
+
+            for start, end, frames in zip(merged_starts, merged_ends, frame_counts):
+                segment = {
+                    'type': segment_type,
+                    'start': round(float(times[start]), 2),
+                    'end': round(float(times[end]), 2),
+                    'frames': int(frames)
+                }
+                if session_start_time is not None:
+                    segment['start_time'] = datetime.fromtimestamp(session_start_time + float(times[start])).isoformat()
+                    segment['end_time'] = datetime.fromtimestamp(session_start_time + float(times[end])).isoformat()
+                segments.append(segment)
+
+        segments.sort(key=lambda segment: segment['start'])
+        return segments
@@ -0,0 +1,439 @@
+import os
+import sys
+import time
+import queue
+import pickle
+import argparse
+import itertools
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+# Slot payloads
+JPEG = "jpeg"
+BGR = "bgr"
+
+# Frame data starts on a cache line boundary after the per-slot generation counters
+_HEADER_ALIGN = 64
+
+
+class FrameRing:
+    """
+    Fixed-size frame slots in one shared memory block.
+
+    The process that creates the ring (the API process) owns slot allocation:
+    it acquires a free slot, writes a JPEG or a decoded BGR frame into it and
+    passes only the small descriptor returned by write_jpeg()/write_frame() to
+    a worker process, which reads the slot in place. The slot is released once
+    the worker's result has arrived, so a slot is never rewritten while it is
+    being read. acquire() waits at most ``timeout`` seconds for a free slot,
+    which is the backpressure: when all slots are busy, callers drop frames
+    instead of queueing them.
+
+    Every write bumps the slot's generation counter in shared memory; readers
+    check it against the descriptor to detect a slot reused too early.
+    """
+
+    def __init__(self, slots=32, slot_bytes=640 * 480 * 3, name=None):
+        """
+        Args:
+            slots: Number of frame slots
+            slot_bytes: Capacity of each slot (a 640x480 BGR frame by default)
+            name: Shared memory block to attach to; a new block is created if None
+        """
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        header_bytes = -(-slots * 8 // _HEADER_ALIGN) * _HEADER_ALIGN
+
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_bytes + slots * slot_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.generations = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray((slots, slot_bytes), dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+
+        if self.owner:
+            self.generations[:] = 0
+            self.free = queue.Queue()
+            for slot in range(slots):
+                self.free.put_nowait(slot)
+
+    @property
+    def spec(self):
+        """Arguments that attach another process to this ring"""
+        return self.shm.name, self.slots, self.slot_bytes
+
+    @classmethod
+    def attach(cls, name, slots, slot_bytes):
+        return cls(slots=slots, slot_bytes=slot_bytes, name=name)
+
+    def acquire(self, timeout=0.0):
+        """Reserve a free slot; returns None if none frees up within timeout seconds"""
+        try:
+            return self.free.get(timeout=timeout) if timeout else self.free.get_nowait()
+        except queue.Empty:
+            return None
+
+    def release(self, slot):
+        self.free.put_nowait(slot)
+
+    def in_use(self):
+        return self.slots - self.free.qsize()
+
+    def write_jpeg(self, slot, frame_bytes):
+        """Copy still-encoded frame bytes into a slot and return its descriptor"""
+        length = len(frame_bytes)
+        if length > self.slot_bytes:
+            raise ValueError(f"Frame of {length} bytes does not fit a {self.slot_bytes} byte slot")
+        self.data[slot, :length] = np.frombuffer(frame_bytes, np.uint8)
+        return self._descriptor(slot, JPEG, (length,))
+
+    def write_frame(self, slot, frame):
+        """Copy a decoded uint8 frame into a slot and return its descriptor"""
+        if frame.dtype != np.uint8 or frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame {frame.shape} {frame.dtype} does not fit a {self.slot_bytes} byte slot")
+        self.data[slot, :frame.nbytes].reshape(frame.shape)[...] = frame
+        return self._descriptor(slot, BGR, frame.shape)
+
+    def _descriptor(self, slot, kind, shape):
+        self.generations[slot] += 1
+        return {"slot": slot, "generation": int(self.generations[slot]), "kind": kind, "shape": tuple(shape)}
+
+    def view(self, descriptor):
+        """Zero-copy view of a slot's payload: the JPEG bytes or the BGR frame"""
+        if self.generations[descriptor["slot"]] != descriptor["generation"]:
+            raise RuntimeError(f"Frame slot {descriptor['slot']} was reused before it was read")
+        shape = descriptor["shape"]
+        return self.data[descriptor["slot"], :int(np.prod(shape))].reshape(shape)
+
+    def read_frame(self, descriptor):
+        """Decoded BGR frame of a slot; JPEG slots are decoded straight from shared memory"""
+        payload = self.view(descriptor)
+        if descriptor["kind"] == BGR:
+            return payload
+        frame = cv2.imdecode(payload, cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Failed to decode frame")
+        return frame
+
+    def close(self):
+        """Detach; the owning process also frees the shared memory"""
+        # The numpy views must go before the buffer they point into
+        del self.generations, self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def frame_result(detector, alerts, seconds):
+    """Small, picklable summary of one analyzed frame"""
+    return {
+        "alerts": alerts,
+        "stats": {
+            "total_frames_analyzed": detector.total_frames_analyzed,
+            "total_frames_captured": detector.total_frames_captured,
+            "face_detected_frames": detector.face_detected_frames,
+            "looking_away_frames": detector.looking_away_frames,
+            "mobile_detected_frames": detector.mobile_detected_frames,
+            "multiple_people_frames": detector.multiple_people_frames,
+            "no_face_frames": detector.no_face_frames
+        },
+        "overlay": detector.last_overlay,
+        "overlay_version": detector.overlay_version,
+        "seconds": seconds
+    }
+
+
+def analysis_worker(ring_spec, tasks, results, detector_options):
+    """
+    Worker process: keeps one detector per session assigned to it and answers
+    ("frame", task_id, session_id, descriptor) and ("end", task_id, session_id)
+    tasks on the results queue as (task_id, result, error)
+    """
+    from threading_config import ThreadBudget
+    from realtime_detector import CheatDetectionSystem
+
+    # One busy thread per worker process; the pool size is the parallelism
+    ThreadBudget(workers=1).apply()
+    ring = FrameRing.attach(*ring_spec)
+    detectors = {}
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            kind, task_id, session_id = task[:3]
+            try:
+                if kind == "frame":
+                    detector = detectors.get(session_id)
+                    if detector is None:
+                        detector = CheatDetectionSystem(**detector_options)
+                        detector.draw_annotations = False
+                        detector.real_time_alerts = False
+                        detectors[session_id] = detector
+
+                    started = time.perf_counter()
+                    detector.process_frame(ring.read_frame(task[3]))
+                    alerts = []
+                    while not detector.alert_queue.empty():
+                        alerts.append(detector.alert_queue.get_nowait())
+                    results.put((task_id, frame_result(detector, alerts, time.perf_counter() - started), None))
+                elif kind == "end":
+                    detector = detectors.pop(session_id, None)
+                    report = None
+                    if detector is not None:
+                        detector.close_alert_episodes()
+                        report = detector.generate_report()
+                        detector.release()
+                    results.put((task_id, report, None))
+            except Exception as e:
+                results.put((task_id, None, f"{type(e).__name__}: {e}"))
+    finally:
+        ring.close()
+
+
+class AnalysisProcessPool:
+    """
+    Analysis worker processes fed through a FrameRing.
+
+    Each session sticks to one worker (the one with the fewest sessions when
+    its first frame arrives), since its detector state lives there. Only slot
+    descriptors go to the workers and only the small frame_result() dicts come
+    back; a collector thread resolves the futures returned by submit_frame()
+    and end_session() and releases the slots.
+    """
+
+    def __init__(self, workers=2, slots=32, slot_bytes=640 * 480 * 3, detector_options=None):
+        """
+        Args:
+            workers: Number of worker processes
+            slots: Frame slots shared by all workers (frames in flight at most)
+            slot_bytes: Capacity of each slot
+            detector_options: CheatDetectionSystem keyword arguments
+        """
+        detector_options = detector_options or {
+            "model_path": "ssd_mobilenet_v2_coco_2018_03_29/saved_model",
+            "detection_threshold": 0.3,
+            "mobile_threshold": 0.05
+        }
+        self.ring = FrameRing(slots=slots, slot_bytes=slot_bytes)
+
+        # Workers must not inherit TensorFlow/OpenCV state, so they are spawned rather than forked
+        context = mp.get_context("spawn")
+        self.results = context.Queue()
+        self.task_queues = [context.Queue() for _ in range(workers)]
+        self.processes = [
+            context.Process(target=analysis_worker, name=f"analysis-{i}", daemon=True,
+                            args=(self.ring.spec, self.task_queues[i], self.results, detector_options))
+            for i in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+        self.assignments = {}  # session_id -> worker index
+        self.pending = {}  # task_id -> (future, slot or None, worker index)
+        self.lock = threading.Lock()
+        self.task_ids = itertools.count()
+        self.closed = False
+        self.frames_dropped = 0
+
+        self.collector = threading.Thread(target=self.collect, name="analysis-results", daemon=True)
+        self.collector.start()
+
+    def worker_for(self, session_id):
+        worker = self.assignments.get(session_id)
+        if worker is None:
+            load = [0] * len(self.processes)
+            for assigned in self.assignments.values():
+                load[assigned] += 1
+            worker = self.assignments[session_id] = load.index(min(load))
+        return worker
+
+    def submit_frame(self, session_id, frame_bytes=None, frame=None, timeout=0.0):
+        """
+        Queue one frame of a session for analysis
+
+        Args:
+            session_id: Session the frame belongs to
+            frame_bytes: Still-encoded JPEG bytes (decoded by the worker)
+            frame: Already decoded BGR frame, if frame_bytes is None
+            timeout: Seconds to wait for a free slot
+
+        Returns:
+            Future of the frame_result() dict, or None if the frame was dropped
+            because every slot is in use
+        """
+        slot = self.ring.acquire(timeout)
+        if slot is None:
+            self.frames_dropped += 1
+            return None
+        try:
+            descriptor = self.ring.write_jpeg(slot, frame_bytes) if frame_bytes is not None \
+                else self.ring.write_frame(slot, frame)
+        except Exception:
+            self.ring.release(slot)
+            raise
+        return self._submit(session_id, slot, ("frame", descriptor))
+
+    def end_session(self, session_id):
+        """Future of the session's report; its detector is released in the worker"""
+        if session_id not in self.assignments:
+            future = Future()
+            future.set_result(None)
+            return future
+        return self._submit(session_id, None, ("end",))
+
+    def _submit(self, session_id, slot, task):
+        future = Future()
+        with self.lock:
+            worker = self.worker_for(session_id)
+            if task[0] == "end":
+                del self.assignments[session_id]
+            task_id = next(self.task_ids)
+            self.pending[task_id] = (future, slot, worker)
+        # Tasks of one session go through one queue, so they are analyzed in order
+        self.task_queues[worker].put((task[0], task_id, session_id) + task[1:])
+        return future
+
+    def collect(self):
+        while True:
+            try:
+                task_id, result, error = self.results.get(timeout=1.0)
+            except queue.Empty:
+                if self.closed:
+                    return
+                self.fail_dead_workers()
+                continue
+            except (EOFError, OSError):
+                return
+
+            with self.lock:
+                entry = self.pending.pop(task_id, None)
+            if entry is None:
+                continue
+            future, slot, _ = entry
+            # The worker is done with the slot either way
+            if slot is not None:
+                self.ring.release(slot)
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def fail_dead_workers(self):
+        """Fail the tasks of crashed workers so their callers and slots are not stuck"""
+        dead = {i for i, process in enumerate(self.processes) if not process.is_alive()}
+        if not dead:
+            return
+        with self.lock:
+            lost = [task_id for task_id, (_, _, worker) in self.pending.items() if worker in dead]
+            entries = [self.pending.pop(task_id) for task_id in lost]
+        for future, slot, worker in entries:
+            if slot is not None:
+                self.ring.release(slot)
+            future.set_exception(RuntimeError(f"Analysis worker {worker} exited"))
+
+    def status(self):
+        with self.lock:
+            in_flight = len(self.pending)
+        return {
+            "workers": len(self.processes),
+            "workers_alive": sum(process.is_alive() for process in self.processes),
+            "sessions": len(self.assignments),
+            "slots": self.ring.slots,
+            "slots_in_use": self.ring.in_use(),
+            "tasks_in_flight": in_flight,
+            "frames_dropped": self.frames_dropped
+        }
+
+    def close(self, timeout=10):
+        """Stop the workers after their queued tasks and free the shared memory"""
+        for tasks in self.task_queues:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.closed = True
+        self.collector.join()
+        self.ring.close()
+
+
+def _transport_worker(ring_spec, requests, responses):
+    """Benchmark worker: sums each frame it gets, either pickled or from the ring"""
+    ring = FrameRing.attach(*ring_spec)
+    try:
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            frame = ring.view(request) if isinstance(request, dict) else request
+            responses.put(int(frame[::64].sum()))
+    finally:
+        ring.close()
+
+
+def transport_benchmark(frames=500, width=640, height=480):
+    """
+    Round trips per second of a decoded frame to another process and back,
+    pickled through a multiprocessing queue versus a ring slot descriptor
+    """
+    frame = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    ring = FrameRing(slots=4, slot_bytes=frame.nbytes)
+    context = mp.get_context("spawn")
+    requests, responses = context.Queue(), context.Queue()
+    worker = context.Process(target=_transport_worker, args=(ring.spec, requests, responses), daemon=True)
+    worker.start()
+
+    def run(send):
+        started = time.perf_counter()
+        for _ in range(frames):
+            send()
+            responses.get()
+        return frames / (time.perf_counter() - started)
+
+    def send_shared():
+        slot = ring.acquire(timeout=1.0)
+        requests.put(ring.write_frame(slot, frame))
+        # One request in flight at a time, so the slot is free again once answered
+        ring.release(slot)
+
+    try:
+        run(lambda: requests.put(frame))  # warm up both paths
+        results = {
+            "frame_bytes": frame.nbytes,
+            "pickled_frame_bytes": len(pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL)),
+            "pickle_round_trips_per_second": round(run(lambda: requests.put(frame)), 1),
+            "shared_memory_round_trips_per_second": round(run(send_shared), 1)
+        }
+    finally:
+        requests.put(None)
+        worker.join(10)
+        ring.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared memory frame transport for analysis worker processes")
+    parser.add_argument("command", choices=["bench"], help="bench: compare pickled and shared memory frame transfer")
+    parser.add_argument("--frames", type=int, default=500, help="Round trips per transport")
+    parser.add_argument("--width", type=int, default=640, help="Frame width")
+    parser.add_argument("--height", type=int, default=480, help="Frame height")
+    args = parser.parse_args()
+
+    results = transport_benchmark(args.frames, args.width, args.height)
+    print(f"Frame: {results['frame_bytes']} bytes ({results['pickled_frame_bytes']} pickled)")
+    print(f"Pickled through a queue: {results['pickle_round_trips_per_second']} round trips/s")
+    print(f"Shared memory slot:      {results['shared_memory_round_trips_per_second']} round trips/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from session_timeline import FLAG_MOBILE_PHONE
+
+# Detector settings compared by default; every combination is one setting and
+# attributes left out keep their REFERENCE value
+DEFAULT_GRID = {
+    "input_size": ["240x180", "320x240", "480x360"],
+    "face_scale_factor": [1.1, 1.2, 1.3],
+    "face_min_neighbors": [3, 5],
+    "frame_skip": [1, 2, 3],
+    "mobile_threshold": [0.05, 0.1],
+}
+
+# The detector defaults, analyzing every frame; other settings are judged by
+# how often they reach the same outcome
+REFERENCE = {
+    "input_size": "320x240",
+    "face_scale_factor": 1.1,
+    "face_min_neighbors": 5,
+    "face_min_size": 30,
+    "eye_scale_factor": 1.1,
+    "eye_min_neighbors": 3,
+    "eye_min_size": 10,
+    "frame_skip": 1,
+    "mobile_threshold": 0.05,
+}
+
+OUTCOMES = ("face", "multi_face", "gaze", "phone")
+
+# Clips of this worker process, decoded once by init_worker
+_clips = None
+_model_path = None
+
+
+def parse_size(value):
+    width, height = str(value).lower().split("x")
+    return int(width), int(height)
+
+
+def apply_setting(detector, setting):
+    """Set the swept attributes of a CheatDetectionSystem"""
+    for name, value in setting.items():
+        if name == "input_size":
+            detector.input_width, detector.input_height = parse_size(value)
+        elif name in ("face_min_size", "eye_min_size"):
+            setattr(detector, name, (int(value), int(value)))
+        else:
+            setattr(detector, name, value)
+
+
+def load_clip(path, max_frames):
+    """Decoded frames of a video file, a directory of .jpg frames or a session recording prefix"""
+    import cv2
+
+    frames = []
+    if os.path.isfile(path):
+        cap = cv2.VideoCapture(path)
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    else:
+        from loadtest import load_corpus
+        for frame_bytes in load_corpus(path, limit=max_frames):
+            frame = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+            if frame is not None:
+                frames.append(frame)
+
+    if not frames:
+        raise ValueError(f"No frames in clip {path}")
+    return frames
+
+
+def clip_name(path):
+    return os.path.basename(os.path.normpath(path))
+
+
+def init_worker(clip_paths, max_frames, model_path):
+    """
+    Decode the clips and warm up the model of a worker process
+
+    OpenCV and TensorFlow run single-threaded, so settings analyzed in
+    parallel do not skew each other's timings.
+    """
+    global _clips, _model_path
+    from threading_config import ThreadBudget
+
+    ThreadBudget(workers=1).apply()
+    _clips = {clip_name(path): load_clip(path, max_frames) for path in clip_paths}
+    _model_path = model_path
+
+    # The first inference of a process builds the model's graph; keep it out of the timings
+    from realtime_detector import CheatDetectionSystem
+    detector = CheatDetectionSystem(model_path=model_path)
+    detector.draw_annotations = False
+    detector.real_time_alerts = False
+    detector.frame_skip = 1
+    detector.process_frame(next(iter(_clips.values()))[0])
+    detector.release()
+
+
+def run_setting(setting):
+    """
+    Analyze every clip with one setting
+
+    Returns:
+        (setting, {clip name: analysis seconds, frame count and per analyzed frame outcomes})
+    """
+    from realtime_detector import CheatDetectionSystem
+
+    results = {}
+    for name, frames in _clips.items():
+        detector = CheatDetectionSystem(model_path=_model_path)
+        detector.draw_annotations = False
+        detector.real_time_alerts = False
+        apply_setting(detector, setting)
+
+        started = time.perf_counter()
+        for frame in frames:
+            detector.process_frame(frame)
+        seconds = time.perf_counter() - started
+
+        rows = detector.timeline.to_array()
+        results[name] = {
+            "frames": len(frames),
+            "seconds": seconds,
+            "frame": rows["frame"].copy(),
+            "face": rows["faces"] > 0,
+            "multi_face": rows["faces"] > 1,
+            "gaze": rows["gaze"].copy(),
+            "phone": (rows["flags"] & FLAG_MOBILE_PHONE) != 0,
+        }
+        detector.release()
+    return setting, results
+
+
+def count_matches(reference, candidate):
+    """
+    Reference frames on which a candidate reaches the same outcomes
+
+    Between two analyzed frames a session keeps reporting the last result, so
+    the candidate's outcome at a reference frame is that of its last analyzed
+    frame at or before it; frames before its first analysis never match.
+
+    Returns:
+        {outcome: matching frames}
+    """
+    position = np.searchsorted(candidate["frame"], reference["frame"], side="right") - 1
+    covered = position >= 0
+    matches = {}
+    for outcome in OUTCOMES:
+        matches[outcome] = int(np.count_nonzero(
+            reference[outcome][covered] == candidate[outcome][position[covered]]
+        ))
+    return matches
+
+
+def summarize(setting, results, reference_results):
+    """FPS and agreement with the reference of one setting, over all clips and per clip"""
+    totals = {outcome: 0 for outcome in OUTCOMES}
+    reference_frames = 0
+    clips = {}
+    for name, result in results.items():
+        reference = reference_results[name]
+        matches = count_matches(reference, result)
+        frames = len(reference["frame"])
+        for outcome in OUTCOMES:
+            totals[outcome] += matches[outcome]
+        reference_frames += frames
+        clips[name] = {
+            "fps": round(result["frames"] / max(result["seconds"], 1e-9), 1),
+            "agreement": round(sum(matches.values()) / max(frames * len(OUTCOMES), 1), 4)
+        }
+
+    agreement = {outcome: round(totals[outcome] / max(reference_frames, 1), 4) for outcome in OUTCOMES}
+    frames = sum(result["frames"] for result in results.values())
+    seconds = sum(result["seconds"] for result in results.values())
+    return {
+        "setting": setting,
+        "fps": round(frames / max(seconds, 1e-9), 1),
+        "agreement": agreement,
+        "mean_agreement": round(sum(agreement.values()) / len(OUTCOMES), 4),
+        "clips": clips
+    }
+
+
+def pareto_front(summaries):
+    """Settings no other setting beats on both FPS and mean agreement, fastest first"""
+    front = []
+    best_agreement = -1.0
+    for summary in sorted(summaries, key=lambda s: (-s["fps"], -s["mean_agreement"])):
+        if summary["mean_agreement"] > best_agreement:
+            front.append(summary)
+            best_agreement = summary["mean_agreement"]
+    return front
+
+
+def grid_settings(grid, max_settings=None, seed=0):
+    """Settings of a grid (the reference first), optionally a random sample of them"""
+    names = list(grid)
+    settings = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        setting = dict(REFERENCE, **dict(zip(names, values)))
+        if setting != REFERENCE and setting not in settings:
+            settings.append(setting)
+    if max_settings is not None and len(settings) > max_settings - 1:
+        settings = random.Random(seed).sample(settings, max(max_settings - 1, 0))
+    return [dict(REFERENCE)] + settings
+
+
+def run_sweep(clip_paths, grid, workers=None, max_frames=300, max_settings=None,
+              model_path='ssd_mobilenet_v2_coco_2018_03_29/saved_model'):
+    """
+    Analyze the clips with every setting of the grid in parallel worker processes
+
+    Returns:
+        Sweep results: every setting's FPS and agreement with REFERENCE, and
+        the Pareto-optimal settings
+    """
+    settings = grid_settings(grid, max_settings)
+    context = multiprocessing.get_context("spawn")
+    outputs = []
+    started = time.time()
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context,
+                             initializer=init_worker, initargs=(clip_paths, max_frames, model_path)) as pool:
+        futures = [pool.submit(run_setting, setting) for setting in settings]
+        for done, future in enumerate(as_completed(futures), start=1):
+            outputs.append(future.result())
+            print(f"{done}/{len(settings)} settings analyzed")
+
+    reference_results = next(results for setting, results in outputs if setting == REFERENCE)
+    summaries = [summarize(setting, results, reference_results) for setting, results in outputs]
+    summaries.sort(key=lambda s: -s["fps"])
+    front = pareto_front(summaries)
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "elapsed_seconds": round(time.time() - started, 1),
+        "clips": {name: result["frames"] for name, result in reference_results.items()},
+        "reference": REFERENCE,
+        "settings": summaries,
+        "pareto": front
+    }
+
+
+def describe(setting):
+    """The attributes of a setting that differ from REFERENCE"""
+    changed = [f"{name}={value}" for name, value in setting.items() if REFERENCE.get(name) != value]
+    return ", ".join(changed) or "reference"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chart the speed/accuracy trade-off of detector settings")
+    parser.add_argument("clips", nargs="+",
+                        help="Video files, directories of .jpg frames and/or session recording path prefixes")
+    parser.add_argument("--grid", default=None,
+                        help="JSON file mapping detector settings to lists of values (default: DEFAULT_GRID)")
+    parser.add_argument("--workers", type=int, default=None, help="Settings analyzed at once (default: CPUs)")
+    parser.add_argument("--max-frames", type=int, default=300, help="Frames read per clip")
+    parser.add_argument("--max-settings", type=int, default=None, help="Analyze a random sample of the grid")
+    parser.add_argument("--model-path", default='ssd_mobilenet_v2_coco_2018_03_29/saved_model')
+    parser.add_argument("--output", default=None, help="File for the JSON results")
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    unknown = [name for name in grid if name not in REFERENCE]
+    if unknown:
+        parser.error(f"Unknown settings: {', '.join(unknown)} (known: {', '.join(REFERENCE)})")
+
+    result = run_sweep(args.clips, grid, workers=args.workers, max_frames=args.max_frames,
+                       max_settings=args.max_settings, model_path=args.model_path)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    print("\n" + "=" * 50)
+    print(f"PARETO-OPTIMAL SETTINGS ({len(result['pareto'])} of {len(result['settings'])})")
+    print("=" * 50)
+    for summary in result["pareto"]:
+        agreement = summary["agreement"]
+        print(f"{summary['fps']:8.1f} FPS  agreement {summary['mean_agreement']:.3f} "
+              f"(face {agreement['face']:.3f}, multi-face {agreement['multi_face']:.3f}, "
+              f"gaze {agreement['gaze']:.3f}, phone {agreement['phone']:.3f})  {describe(summary['setting'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
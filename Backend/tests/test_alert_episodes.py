@@ -0,0 +1,28 @@
+import os
+import sys
+import json
+
+import bson
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_episodes import AlertEpisodes
+
+
+def test_episodes_with_numpy_confidence_serialize():
+    emitted = []
+    episodes = AlertEpisodes(gap_frames=1, emit=emitted.append)
+
+    episodes.observe("Mobile Phone", np.float32(0.42), "Confidence: 0.42")
+    episodes.end_frame()
+    episodes.observe("Mobile Phone", np.float32(0.87), "Confidence: 0.87")
+    episodes.end_frame()
+    episodes.end_frame()
+
+    assert [episode["status"] for episode in emitted] == ["open", "closed"]
+    for episode in emitted + episodes.snapshot():
+        assert type(episode["peak_confidence"]) is float
+        json.dumps(episode)
+        bson.encode(episode)
+    assert abs(emitted[-1]["peak_confidence"] - 0.87) < 1e-6
@@ -0,0 +1,52 @@
+import os
+import sys
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The archive moves stubs in MongoDB; use the in-process stand-in
+pytest.importorskip("mongomock_motor")
+os.environ.setdefault("MONGO_URL", "memory")
+
+from archive import ReportArchive
+from database import collection
+
+
+def test_read_block_does_not_depend_on_field_order(tmp_path):
+    archive = ReportArchive(directory=str(tmp_path), codec="zlib")
+    ids = [ObjectId(), ObjectId()]
+    location = archive.write_block(datetime(2024, 1, 1), [
+        {"session_id": "s1", "previous_report": ObjectId(), "_id": ids[0]},
+        {"_id": ids[1], "session_id": "s2"},
+    ])
+
+    assert sorted(archive.read_block(location)) == sorted(str(_id) for _id in ids)
+    assert archive.load(location, ids[0])["session_id"] == "s1"
+
+
+def test_delete_report_removes_it_from_the_archive(tmp_path):
+    archive = ReportArchive(directory=str(tmp_path), codec="zlib")
+    ids = [ObjectId(), ObjectId()]
+    docs = [{"_id": _id, "session_id": f"s{i}", "secret": f"SECRET{i}"} for i, _id in enumerate(ids)]
+    location = archive.write_block(datetime(2024, 1, 1), docs)
+
+    async def delete():
+        await collection.delete_many({"_id": {"$in": ids}})
+        await collection.insert_many([{"_id": _id, "archive": location} for _id in ids])
+        deleted = await archive.delete_report(ids[0], projection={"archive": 1})
+        return deleted, await collection.find_one({"_id": ids[1]})
+
+    deleted, kept = asyncio.run(delete())
+
+    assert deleted["_id"] == ids[0]
+    assert kept["archive"] != location
+    assert archive.load(kept["archive"], ids[1])["secret"] == "SECRET1"
+    assert archive.load(kept["archive"], ids[0]) is None
+    with open(os.path.join(str(tmp_path), location["file"]), "rb") as f:
+        assert b"SECRET0" not in f.read()
+        f.seek(location["offset"])
+        assert f.read(location["length"]) == bytes(location["length"])
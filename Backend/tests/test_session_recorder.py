@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_recorder import SessionRecorder, SessionRecording, recording_path
+
+
+def test_frames_after_close_are_ignored(tmp_path):
+    recorder = SessionRecorder(str(tmp_path))
+    recorder.record("s1", b"first")
+    recorder.close("s1")
+    # e.g. a frame still being decoded when the session ended
+    recorder.record("s1", b"late")
+    recorder.stop()
+
+    assert recorder.files == {}
+    with SessionRecording(recording_path(str(tmp_path), "s1")) as recording:
+        assert [bytes(frame) for _, frame in recording.frames()] == [b"first"]
+
+
+def test_start_accepts_frames_again(tmp_path):
+    recorder = SessionRecorder(str(tmp_path))
+    recorder.close("s1")
+    recorder.start("s1")
+    recorder.record("s1", b"frame")
+    recorder.stop()
+
+    with SessionRecording(recording_path(str(tmp_path), "s1")) as recording:
+        assert [bytes(frame) for _, frame in recording.frames()] == [b"frame"]
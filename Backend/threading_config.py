@@ -0,0 +1,111 @@
+import os
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+def available_cpus():
+    """CPUs this process may run on"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+class ThreadBudget:
+    """
+    Per-node CPU budget shared out between the analysis worker pool, OpenCV's
+    internal thread pool and TensorFlow's intra-op/inter-op pools.
+
+    By default each frame is analyzed by one worker thread with single-threaded
+    OpenCV and TensorFlow, and there are as many workers as budgeted CPUs, so
+    concurrent sessions never run more busy threads than there are cores.
+    """
+
+    def __init__(self, cpu_budget=None, workers=None, opencv_threads=1, tf_intra_op_threads=1,
+                 tf_inter_op_threads=1, pin_workers=False):
+        """
+        Args:
+            cpu_budget: CPUs to use, default all available ones
+            workers: Analysis worker threads, default cpu_budget
+            opencv_threads: cv2.setNumThreads value (0 disables OpenCV's own threading,
+                None keeps OpenCV's default of all cores)
+            tf_intra_op_threads: TensorFlow intra-op threads (0 lets TensorFlow decide)
+            tf_inter_op_threads: TensorFlow inter-op threads (0 lets TensorFlow decide)
+            pin_workers: Pin each worker thread to one CPU of the budget (Linux only)
+        """
+        cpus = available_cpus()
+        self.cpu_budget = min(cpu_budget or len(cpus), len(cpus))
+        self.cpus = cpus[:self.cpu_budget]
+        self.workers = workers or self.cpu_budget
+        self.opencv_threads = opencv_threads
+        self.tf_intra_op_threads = tf_intra_op_threads
+        self.tf_inter_op_threads = tf_inter_op_threads
+        self.pin_workers = pin_workers and hasattr(os, "sched_setaffinity")
+        self.tf_applied = False
+
+    @classmethod
+    def from_env(cls):
+        """Budget from CPU_BUDGET, ANALYSIS_WORKERS, OPENCV_THREADS, TF_INTRA_OP_THREADS,
+        TF_INTER_OP_THREADS and PIN_WORKERS"""
+        def env_int(name, default):
+            value = os.environ.get(name)
+            return int(value) if value not in (None, "") else default
+
+        return cls(
+            cpu_budget=env_int("CPU_BUDGET", None),
+            workers=env_int("ANALYSIS_WORKERS", None),
+            opencv_threads=env_int("OPENCV_THREADS", 1),
+            tf_intra_op_threads=env_int("TF_INTRA_OP_THREADS", 1),
+            tf_inter_op_threads=env_int("TF_INTER_OP_THREADS", 1),
+            pin_workers=os.environ.get("PIN_WORKERS", "0") == "1"
+        )
+
+    def apply(self):
+        """
+        Configure OpenCV and TensorFlow threading for this process
+
+        TensorFlow only accepts its settings before it has run anything, so
+        call this before loading a model.
+        """
+        if self.opencv_threads is not None:
+            cv2.setNumThreads(self.opencv_threads)
+
+        import tensorflow as tf
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(self.tf_intra_op_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(self.tf_inter_op_threads)
+            self.tf_applied = True
+        except RuntimeError as e:
+            print(f"Warning: TensorFlow threading already initialized, settings not applied: {e}")
+
+    def make_executor(self):
+        """Thread pool for frame decoding and analysis, optionally pinning each worker to a CPU"""
+        if not self.pin_workers:
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis")
+
+        cpu_cycle = itertools.cycle(self.cpus)
+        lock = threading.Lock()
+
+        def pin_worker():
+            with lock:
+                cpu = next(cpu_cycle)
+            # pid 0 is the calling thread on Linux
+            os.sched_setaffinity(0, {cpu})
+
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis",
+                                  initializer=pin_worker)
+
+    def describe(self):
+        return {
+            "cpu_budget": self.cpu_budget,
+            "cpus": self.cpus,
+            "workers": self.workers,
+            "opencv_threads": cv2.getNumThreads(),
+            "tf_intra_op_threads": self.tf_intra_op_threads,
+            "tf_inter_op_threads": self.tf_inter_op_threads,
+            "tf_applied": self.tf_applied,
+            "pin_workers": self.pin_workers
+        }
@@ -0,0 +1,206 @@
+import json
+import time
+from datetime import datetime
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# "full": every response carries stats, score and timestamp (original protocol)
+# "delta": alerts go out immediately, stats/score only when they change
+RESPONSE_MODES = ("full", "delta")
+ENCODINGS = ("json", "msgpack")
+
+# Stats that move on (almost) every frame; in delta mode they are refreshed
+# every stats_interval seconds, while changes to the other stats go out at once
+PROGRESS_STATS = (
+    "total_frames_analyzed",
+    "total_frames_captured",
+    "face_detected_frames",
+    "face_detection_rate",
+)
+
+
+class ResponseEncoder:
+    """
+    Builds and encodes the per-frame responses of one WebSocket connection.
+
+    Options are negotiated at connect time from the query string, e.g.
+    ``/ws/{session_id}?mode=delta&encoding=msgpack&stats_interval=1``.
+    """
+
+    def __init__(self, mode="full", encoding="json", stats_interval=1.0):
+        if mode not in RESPONSE_MODES:
+            raise ValueError(f"mode must be one of: {', '.join(RESPONSE_MODES)}")
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of: {', '.join(ENCODINGS)}")
+
+        self.mode = mode
+        # Fall back to JSON when msgpack is not installed; the hello message tells the client
+        self.encoding = encoding if encoding == "json" or msgpack is not None else "json"
+        self.stats_interval = max(0.0, stats_interval)
+
+        self.last_stats = None
+        self.last_events = None
+        self.last_score = None
+        self.last_stats_sent = 0.0
+
+    @classmethod
+    def from_query(cls, query_params):
+        """Create an encoder from WebSocket query parameters, raising ValueError on bad values"""
+        try:
+            stats_interval = float(query_params.get("stats_interval", 1.0))
+        except ValueError:
+            raise ValueError("stats_interval must be a number of seconds")
+        return cls(
+            mode=query_params.get("mode", "full"),
+            encoding=query_params.get("encoding", "json"),
+            stats_interval=stats_interval
+        )
+
+    @property
+    def sends_hello(self):
+        # Original clients pace frames on every message, so they get no extra one
+        return self.mode != "full" or self.encoding != "json"
+
+    def hello(self, session_id):
+        return {
+            "type": "hello",
+            "session_id": session_id,
+            "mode": self.mode,
+            "encoding": self.encoding,
+            "stats_interval": self.stats_interval
+        }
+
+    def build(self, session_id, alerts, stats, score_fn):
+        """
+        Build the response for one processed frame
+
+        Args:
+            session_id: Session of the connection
+            alerts: Alerts raised by this frame
+            stats: Current session stats dictionary
+            score_fn: Callable returning the current integrity score, only
+                called when the score has to be sent
+
+        Returns:
+            Response dictionary
+        """
+        if self.mode == "full":
+            return {
+                "status": "success",
+                "session_id": session_id,
+                "alerts": alerts,
+                "stats": stats,
+                "integrity_score": score_fn(),
+                "timestamp": datetime.now().isoformat()
+            }
+
+        response = {"status": "success"}
+        if alerts:
+            response["alerts"] = alerts
+
+        now = time.monotonic()
+        events = {key: value for key, value in stats.items() if key not in PROGRESS_STATS}
+        events_changed = events != self.last_events
+        refresh_due = stats != self.last_stats and now - self.last_stats_sent >= self.stats_interval
+
+        if events_changed or refresh_due:
+            response["stats"] = stats
+            score = score_fn()
+            if score != self.last_score:
+                response["integrity_score"] = score
+                self.last_score = score
+            response["timestamp"] = datetime.now().isoformat()
+            self.last_stats = dict(stats)
+            self.last_events = events
+            self.last_stats_sent = now
+
+        return response
+
+    async def send(self, websocket, payload):
+        if self.encoding == "msgpack":
+            await websocket.send_bytes(msgpack.packb(payload, use_bin_type=True))
+        else:
+            await websocket.send_text(json.dumps(payload))
+
+
+class FrameControl:
+    """
+    Frame rate, size and JPEG quality one client is asked to send.
+
+    A session is analyzed at most ``analysis_fps`` frames per second, so any
+    faster upload only costs bandwidth and decode time. The server sends the
+    client a control whenever the settings change (at most every
+    ``interval`` seconds after the first one), and frame_skip() keeps clients
+    that ignore it, or have not adapted yet, at the analysis rate.
+    """
+
+    def __init__(self, interval=5.0, smoothing=0.2):
+        """
+        Args:
+            interval: Shortest time between two controls sent to the client
+            smoothing: Weight of a new sample in the frame interval average
+        """
+        self.interval = interval
+        self.smoothing = smoothing
+
+        self.arrival_interval = None
+        self.last_arrival = None
+        self.current = None
+        self.sent_at = None
+
+    def observe_arrival(self, now=None):
+        """Record the arrival of a frame message"""
+        now = time.monotonic() if now is None else now
+        if self.last_arrival is not None:
+            interval = now - self.last_arrival
+            if self.arrival_interval is None:
+                self.arrival_interval = interval
+            else:
+                self.arrival_interval += self.smoothing * (interval - self.arrival_interval)
+        self.last_arrival = now
+
+    @property
+    def incoming_fps(self):
+        """Average rate the client sends frames at, None until it is measured"""
+        if not self.arrival_interval:
+            return None
+        return 1.0 / self.arrival_interval
+
+    def frame_skip(self, analysis_fps):
+        """Analyze every n-th received frame so that about ``analysis_fps`` are analyzed"""
+        incoming = self.incoming_fps
+        if incoming is None or analysis_fps <= 0:
+            return 1
+        return max(1, round(incoming / analysis_fps))
+
+    def update(self, fps, width, height, quality, now=None):
+        """
+        Settings the client should switch to, or None if nothing is to be sent
+
+        Args:
+            fps: Frames per second to send
+            width: Largest frame width worth sending
+            height: Largest frame height worth sending
+            quality: JPEG quality, 1-100
+
+        Returns:
+            Control dictionary, sent to the client as the "control" field of a response
+        """
+        now = time.monotonic() if now is None else now
+        control = {
+            # Half-frame steps, so small budget changes do not produce a new control
+            "fps": round(fps * 2) / 2,
+            "width": int(width),
+            "height": int(height),
+            "quality": int(quality)
+        }
+        if control == self.current:
+            return None
+        if self.sent_at is not None and now - self.sent_at < self.interval:
+            return None
+        self.current = control
+        self.sent_at = now
+        return control
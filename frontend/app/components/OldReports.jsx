@@ -174,17 +174,20 @@ const OldReports = ({ setShowReport, downloadPDF, sessionReport, setSessionRepor
         return recommendations;
     };
 
+    const fetchFullReport = async (reportData) => {
+        // The listing only carries summary fields, fetch the full report on demand
+        if (reportData.detection_report) {
+            return reportData;
+        }
+        const response = await axios.get(
+            `${process.env.NEXT_PUBLIC_BACKEND_URL}/api/reports/${reportData._id}`
+        );
+        return response.data.report;
+    };
+
     const handleView = async (reportData) => {
         try {
-            // If we only have partial data, fetch the full report
-            let fullReportData = reportData;
-            if (!reportData.detection_report) {
-                const response = await axios.get(
-                    `${process.env.NEXT_PUBLIC_BACKEND_URL}/api/reports/${reportData.mongoID}`
-                );
-                fullReportData = response.data.report;
-            }
-
+            const fullReportData = await fetchFullReport(reportData);
             const transformedReport = transformReportForModal(fullReportData);
             setSessionReport(transformedReport);
             setShowReport(true);
@@ -196,7 +199,8 @@ const OldReports = ({ setShowReport, downloadPDF, sessionReport, setSessionRepor
 
     const handleDownload = async (reportData) => {
         try {
-            const transformedReport = transformReportForModal(reportData);
+            const fullReportData = await fetchFullReport(reportData);
+            const transformedReport = transformReportForModal(fullReportData);
             if (downloadPDF) {
                 await downloadPDF(transformedReport);
             } else {
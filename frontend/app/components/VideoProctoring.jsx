@@ -10,6 +10,12 @@ import { ToastContainer, toast } from 'react-toastify';
 import ReportModal from './ReportModal';
 import OldReports from './OldReports';
 
+// Frames sent before waiting for a response (the server pipelines them)
+const FRAMES_IN_FLIGHT = 2;
+
+// Delay before sending the next frame until the server sends a control
+const DEFAULT_FRAME_DELAY = 100;
+
 const VideoProctoring = () => {
     const [isSessionActive, setIsSessionActive] = useState(false);
     const [loading, setLoading] = useState(false);
@@ -30,9 +36,12 @@ const VideoProctoring = () => {
 
     const videoRef = useRef(null);
     const canvasRef = useRef(null);
+    const overlayRef = useRef(null);
     const wsRef = useRef(null);
     const intervalRef = useRef(null);
     const streamRef = useRef(null);
+    // Frame rate, size and JPEG quality requested by the server ({ fps, width, height, quality })
+    const controlRef = useRef(null);
 
 
     useEffect(() => {
@@ -89,25 +98,65 @@ const VideoProctoring = () => {
         }
     };
 
+    // Each in-flight slot sends its next frame after this delay, so that
+    // FRAMES_IN_FLIGHT slots together send about the requested frame rate
+    const frameDelay = () => {
+        const control = controlRef.current;
+        return control ? (FRAMES_IN_FLIGHT * 1000) / control.fps : DEFAULT_FRAME_DELAY;
+    };
+
     const startWebSocket = () => {
-        wsRef.current = new WebSocket(`${process.env.NEXT_PUBLIC_SOCKET_URL}/ws/${sessionId}`);
+        controlRef.current = null;
+        // Delta mode: stats and score are only sent when they change
+        wsRef.current = new WebSocket(`${process.env.NEXT_PUBLIC_SOCKET_URL}/ws/${sessionId}?mode=delta`);
 
         wsRef.current.onopen = () => {
             console.log('WebSocket connected');
-            captureAndSendFrame();
+            // Keep a few frames in flight so the server can decode one while analyzing another
+            for (let i = 0; i < FRAMES_IN_FLIGHT; i++) {
+                setTimeout(captureAndSendFrame, i * DEFAULT_FRAME_DELAY);
+            }
         };
 
         wsRef.current.onmessage = (event) => {
             const data = JSON.parse(event.data);
 
+            // Connection options acknowledgement, not a frame response
+            if (data.type === 'hello') {
+                return;
+            }
+
             if (data.error) {
                 console.error('WebSocket error:', data.error);
+                // A failed frame still frees its slot
+                setTimeout(captureAndSendFrame, frameDelay());
                 return;
             }
 
-            // Update alerts
+            // The server asks for a different frame rate, size or quality
+            if (data.control) {
+                controlRef.current = data.control;
+            }
+
+            // Detection boxes and labels, only sent when they changed
+            if (data.overlay) {
+                drawOverlay(data.overlay);
+            }
+
+            // Update alerts: a closing update replaces its episode
             if (data.alerts && data.alerts.length > 0) {
-                setAlerts(prev => [...prev, ...data.alerts].slice(-10)); // Keep last 10 alerts
+                setAlerts(prev => {
+                    const merged = [...prev];
+                    data.alerts.forEach(alert => {
+                        const index = merged.findIndex(known => known.episode_id === alert.episode_id);
+                        if (index === -1) {
+                            merged.push(alert);
+                        } else {
+                            merged[index] = alert;
+                        }
+                    });
+                    return merged.slice(-10); // Keep last 10 alerts
+                });
             }
 
             // Update stats
@@ -120,7 +169,7 @@ const VideoProctoring = () => {
             }
 
             // Continue capturing frames
-            setTimeout(captureAndSendFrame, 100); // 10 FPS
+            setTimeout(captureAndSendFrame, frameDelay());
         };
 
         wsRef.current.onerror = (error) => {
@@ -136,6 +185,42 @@ const VideoProctoring = () => {
         if (wsRef.current) {
             wsRef.current.close();
         }
+        drawOverlay(null);
+    };
+
+    // Draw the server's overlay primitives (frame coordinates) over the video element
+    const drawOverlay = (overlay) => {
+        const canvas = overlayRef.current;
+        const video = videoRef.current;
+        if (!canvas || !video) return;
+
+        canvas.width = video.clientWidth;
+        canvas.height = video.clientHeight;
+        const ctx = canvas.getContext('2d');
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+
+        if (!overlay || !overlay.frame_size[0] || !overlay.frame_size[1]) return;
+
+        // The video uses object-cover: scale to fill and crop the overflow evenly
+        const [frameWidth, frameHeight] = overlay.frame_size;
+        const scale = Math.max(canvas.width / frameWidth, canvas.height / frameHeight);
+        const offsetX = (canvas.width - frameWidth * scale) / 2;
+        const offsetY = (canvas.height - frameHeight * scale) / 2;
+
+        overlay.shapes.forEach((shape) => {
+            const x = offsetX + shape.x * scale;
+            const y = offsetY + shape.y * scale;
+            ctx.strokeStyle = shape.color;
+            ctx.fillStyle = shape.color;
+            ctx.lineWidth = shape.thickness;
+
+            if (shape.type === 'rect') {
+                ctx.strokeRect(x, y, shape.w * scale, shape.h * scale);
+            } else {
+                ctx.font = `bold ${Math.round(shape.scale * 24)}px sans-serif`;
+                ctx.fillText(shape.text, x, y);
+            }
+        });
     };
 
     const captureAndSendFrame = () => {
@@ -145,8 +230,13 @@ const VideoProctoring = () => {
         const video = videoRef.current;
         const ctx = canvas.getContext('2d');
 
-        canvas.width = video.videoWidth || 640;
-        canvas.height = video.videoHeight || 480;
+        // Downscale to the size requested by the server, keeping the aspect ratio
+        const control = controlRef.current;
+        const videoWidth = video.videoWidth || 640;
+        const videoHeight = video.videoHeight || 480;
+        const scale = control ? Math.min(1, control.width / videoWidth, control.height / videoHeight) : 1;
+        canvas.width = Math.round(videoWidth * scale);
+        canvas.height = Math.round(videoHeight * scale);
 
         ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
@@ -158,18 +248,20 @@ const VideoProctoring = () => {
                     if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
                         wsRef.current.send(JSON.stringify({
                             frame: base64,
-                            timestamp: Date.now()
+                            timestamp: Date.now(),
+                            return_overlay: true
                         }));
                     }
                 };
                 reader.readAsDataURL(blob);
             }
-        }, 'image/jpeg', 0.8);
+        }, 'image/jpeg', control ? control.quality / 100 : 0.8);
     };
 
     const calculateIntegrityScore = (currentStats) => {
         let score = 100;
-        const totalFrames = currentStats.total_frames_captured || 1;
+        // Detections are only counted on analyzed frames, and the server varies how many it skips
+        const totalFrames = currentStats.total_frames_analyzed || 1;
 
         const lookingAwayPct = (currentStats.looking_away_frames / totalFrames) * 100;
         const mobilePct = (currentStats.mobile_detected_frames / totalFrames) * 100;
@@ -235,6 +327,9 @@ const VideoProctoring = () => {
                     multiple_people_frames: 0,
                     no_face_frames: 0
                 });
+            } else if (response.status === 503) {
+                const retryAfter = response.headers.get('Retry-After');
+                toast.error(`Server is busy, please try again${retryAfter ? ` in ${retryAfter} seconds` : ' later'}`);
             } else {
                 toast.error('Failed to start session');
             }
@@ -739,6 +834,7 @@ const VideoProctoring = () => {
                                     className="w-full h-96 bg-gradient-to-br from-gray-100 to-gray-200 rounded-xl object-cover border border-purple-200/50 shadow-inner"
                                 />
                                 <canvas ref={canvasRef} className="hidden" />
+                                <canvas ref={overlayRef} className="absolute inset-0 w-full h-96 pointer-events-none rounded-xl" />
                                 {!isSessionActive && (
                                     <div className="absolute inset-0 flex items-center justify-center bg-white/90 backdrop-blur-sm rounded-xl">
                                         <div className="text-center">